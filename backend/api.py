@@ -1,10 +1,19 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from langchain_core.messages import HumanMessage
 from services.vector_store import vector_store_service
 from services.database import db_service
+from services.response_format import parse_fields, project_result
+from services.tracing import current_trace, end_trace, render_metrics, stage, start_trace
+from config.settings import GZIP_MINIMUM_SIZE, SEARCH_POOL_SIZE
 import os
 
 # Load environment variables from .env file if it exists
@@ -17,7 +26,26 @@ except ImportError:
 except Exception as e:
     print(f"⚠️ Could not load .env file: {e}")
 
-app = FastAPI(title="Kaggler API", version="1.0.0")
+# Searches block on Pinecone/OpenAI I/O: run them off the event loop, at most one per pooled connection
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_POOL_SIZE, thread_name_prefix="search")
+
+def warm_up_services():
+    """Create the Pinecone, OpenAI and Firestore clients ahead of the first request"""
+    try:
+        vector_store_service.connect()
+    except Exception as e:
+        # Not fatal: /ready stays 503 and the next search retries the connection
+        print(f"⚠️ Vector store warm-up failed: {e}")
+    db_service.db
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in a thread so the worker serves /health right away instead of blocking on network calls
+    app.state.warm_up = asyncio.create_task(asyncio.to_thread(warm_up_services))
+    yield
+    search_executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(title="Kaggler API", version="1.0.0", default_response_class=ORJSONResponse, lifespan=lifespan)
 print("CREDS PATH: ", os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"))
 # CORS middleware - Security: Restrict origins in production
 app.add_middleware(
@@ -32,12 +60,30 @@ app.add_middleware(
     allow_methods=["GET", "POST", "OPTIONS"],  # Restrict to necessary methods
     allow_headers=["*"],
 )
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Per-request trace: services record stages into it, latency goes to /metrics"""
+    trace, token = start_trace(request.method, request.url.path)
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        end_trace(trace, token, route.path if route else "unmatched", status_code)
+
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 
 # Request models
 class RagSearchRequest(BaseModel):
     embedding: list[float]
     competition_id: str
     k: int = 4
+    parent_documents: bool = False  # Return discussions (long ones trimmed around the match) instead of chunks
+    query: Optional[str] = None  # Raw query text; enables hybrid BM25 + vector search
+    rerank: bool = False  # Reorder over-fetched candidates by upvotes, medals and author ranks
+    diversify: bool = False  # MMR selection capping chunks per discussion
 
 class ChatRequest(BaseModel):
     query: str
@@ -48,29 +94,36 @@ class ConversationHistoryRequest(BaseModel):
     thread_id: str
     limit: int = 50
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy"}
-
 @app.post("/api/rag-search")
-async def rag_search(request: RagSearchRequest):
-    """Perform RAG search for relevant competition discussions"""
+async def rag_search(request: RagSearchRequest, fields: Optional[str] = None):
+    """Perform RAG search for relevant competition discussions.
+
+    fields (e.g. ?fields=content,url,title) limits each result to what the client renders.
+    """
+    trace = current_trace()
+    if trace:
+        # Body read and validation happen before the handler runs
+        trace.record("decode", trace.elapsed())
     try:
-        results = vector_store_service.search_by_embedding(
+        search = partial(
+            vector_store_service.search_by_embedding,
             embedding=request.embedding,
             competition_id=request.competition_id,
-            k=request.k
+            k=request.k,
+            parent_documents=request.parent_documents,
+            query=request.query,
+            rerank=request.rerank,
+            diversify=request.diversify
+        )
+        # Run in a copy of the request context so the search records its stages into this trace
+        results = await asyncio.get_running_loop().run_in_executor(
+            search_executor, contextvars.copy_context().run, search
         )
         # Format results for the response
-        formatted_results = []
-        for doc in results:
-            formatted_results.append({
-                "content": doc.page_content,
-                "metadata": doc.metadata
-            })
-        
-        return {"results": formatted_results}
+        with stage("serialize"):
+            field_set = parse_fields(fields)
+            formatted_results = [project_result(result.content, result.metadata, field_set) for result in results]
+            return ORJSONResponse({"results": formatted_results})
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -97,15 +150,48 @@ async def get_competition(competition_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/competition/{competition_id}/related")
+async def get_related_competitions(competition_id: str, k: int = 5):
+    """Get similar competitions and their top Gold discussions"""
+    try:
+        related = db_service.get_related_competitions(competition_id, k=k)
+        return {"competition_id": competition_id, "related": related}
+    
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint for deployment monitoring"""
+    """Liveness: the process is up and serving, whatever the state of its clients"""
     return {
         "status": "healthy",
         "service": "kaggler-backend",
         "version": "1.0.0"
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: search clients are connected (503 while warming up or after a failed connect)"""
+    checks = {
+        "vector_store": vector_store_service.ready,
+        "database": db_service.ready and db_service.db is not None,
+    }
+    status_code = 200 if checks["vector_store"] else 503
+    return ORJSONResponse(
+        {"ready": status_code == 200, "checks": checks, "pools": vector_store_service.pool_stats()},
+        status_code=status_code
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this worker: request/stage latency histograms and pool gauges"""
+    return PlainTextResponse(
+        render_metrics(vector_store_service.pool_stats(reset_peak=True)),
+        media_type="text/plain; version=0.0.4"
+    )
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -113,7 +199,9 @@ async def root():
         "message": "Kaggler API",
         "version": "1.0.0",
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "ready": "/ready",
+        "metrics": "/metrics"
     }
 
 if __name__ == "__main__":
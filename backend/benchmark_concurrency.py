@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for /api/rag-search against the live Pinecone index.
+
+Fires N simultaneous searches through the ASGI app (same executor and pooled
+clients as production) at each concurrency level and reports throughput,
+latency percentiles and peak connection pool utilization. The pool is not
+the bottleneck while peak utilization stays below 1.0:
+
+    python benchmark_concurrency.py --competition-id some-competition
+    SEARCH_POOL_SIZE=64 python benchmark_concurrency.py --competition-id some-competition --concurrency 100
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import httpx
+from api import app
+from services.vector_store import vector_store_service
+
+
+def random_embedding(dimension: int) -> list[float]:
+    vector = [random.gauss(0, 1) for _ in range(dimension)]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+
+async def run_level(client: httpx.AsyncClient, competition_id: str, dimension: int, concurrency: int, rounds: int) -> dict:
+    latencies, errors = [], 0
+
+    async def one_search():
+        nonlocal errors
+        start = time.perf_counter()
+        response = await client.post("/api/rag-search", json={
+            "embedding": random_embedding(dimension), "competition_id": competition_id, "k": 4,
+        })
+        latencies.append((time.perf_counter() - start) * 1000)
+        errors += response.status_code != 200
+
+    vector_store_service.pool_stats(reset_peak=True)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(one_search() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pools = vector_store_service.pool_stats()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2], 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)], 1),
+        "pinecone_peak_utilization": pools["pinecone"]["peak_utilization"],
+        "pool_saturated": pools["pinecone"]["peak_in_flight"] >= pools["pinecone"]["size"],
+    }
+
+
+async def main(args):
+    vector_store_service.connect()
+    dimension = vector_store_service.index.describe_index_stats().dimension
+    report = {"transport": vector_store_service.transport, "pool_size": vector_store_service.pinecone_pool.size, "levels": {}}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+        # Warm the pool so connection setup is not counted against the first level
+        await run_level(client, args.competition_id, dimension, 1, 3)
+        for concurrency in args.concurrency:
+            report["levels"][concurrency] = await run_level(client, args.competition_id, dimension, concurrency, args.rounds)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--competition-id", required=True)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--rounds", type=int, default=3, help="Bursts per concurrency level")
+    asyncio.run(main(parser.parse_args()))
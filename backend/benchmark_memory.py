@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Memory footprint of the search path: RSS per worker and allocations per request.
+
+RSS is the peak resident size of a fresh interpreter after importing the API
+and the client libraries a connected worker loads. "lean" is the current
+Pinecone + OpenAI client path; "langchain" adds the LangChain modules the
+backend used to load. Per-request allocations are measured with tracemalloc
+over converting k synthetic Pinecone matches to API response dicts, with
+LangChain Documents (before) and SearchResult (after):
+
+    python benchmark_memory.py --k 4 10 20
+"""
+import argparse
+import json
+import random
+import string
+import subprocess
+import sys
+import tracemalloc
+from types import SimpleNamespace
+from services.response_format import project_result
+from services.vector_store import vector_store_service
+
+WORKER_MODULES = {
+    "lean": ["api", "pinecone", "openai"],
+    "langchain": ["api", "pinecone", "openai", "langchain_core.documents", "langchain_openai", "langchain_pinecone"],
+}
+
+
+def worker_rss_mb(modules: list[str]) -> float | None:
+    """Peak RSS of a fresh interpreter after importing modules (None if one is not installed)"""
+    code = f"import resource, {', '.join(modules)}; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    # ru_maxrss is in KB on Linux
+    return round(int(result.stdout.strip().splitlines()[-1]) / 1024, 1)
+
+
+def synthetic_matches(k: int) -> list:
+    """Objects shaped like Pinecone query matches, with ~2000-character chunks"""
+    text = "".join(random.choices(string.ascii_lowercase + " ", k=2000))
+    return [
+        SimpleNamespace(id=f"discussion-{i}-0", score=random.random(), values=None, metadata={
+            "text": text, "type": "discussion", "id": str(i), "competition_id": "some-competition",
+            "title": "Gold solution write-up", "author": "kaggler", "upvotes": random.randint(10, 900),
+            "url": f"https://www.kaggle.com/competitions/some-competition/discussion/{i}",
+            "parent_id": str(i), "chunk_index": 0, "total_chunks": 1, "chunk_type": "complete_discussion",
+        })
+        for i in range(k)
+    ]
+
+
+def langchain_response(matches: list) -> list[dict]:
+    """The previous conversion: Document per match, then unpacked into response dicts"""
+    from langchain_core.documents import Document
+
+    docs = []
+    for match in matches:
+        metadata = {key: value for key, value in match.metadata.items() if key != 'text'}
+        metadata['score'] = match.score
+        docs.append(Document(page_content=match.metadata.get('text', ''), metadata=metadata))
+    return [project_result(doc.page_content, doc.metadata, None) for doc in docs]
+
+
+def lean_response(matches: list) -> list[dict]:
+    results = vector_store_service._to_results(matches)
+    return [project_result(result.content, result.metadata, None) for result in results]
+
+
+def allocations(convert, k: int, repeat: int) -> dict:
+    """Median bytes allocated (peak) and retained per request"""
+    peaks, retained = [], []
+    tracemalloc.start()
+    for _ in range(repeat):
+        # Matches are built before measuring: the Pinecone client allocates them either way
+        matches = synthetic_matches(k)
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        response = convert(matches)
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(current - before)
+        del response, matches
+    tracemalloc.stop()
+    peaks.sort()
+    retained.sort()
+    return {"peak_bytes": peaks[len(peaks) // 2], "retained_bytes": retained[len(retained) // 2]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, nargs="+", default=[4, 10, 20])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    try:
+        import langchain_core.documents  # noqa: F401
+        converters = {"langchain": langchain_response, "lean": lean_response}
+    except ImportError:
+        print("💡 langchain-core not installed - measuring the lean path only", file=sys.stderr)
+        converters = {"lean": lean_response}
+
+    report = {
+        "worker_rss_mb": {name: worker_rss_mb(modules) for name, modules in WORKER_MODULES.items()},
+        "per_request": {
+            f"k={k}": {name: allocations(convert, k, args.repeat) for name, convert in converters.items()}
+            for k in args.k
+        },
+    }
+    print(json.dumps(report, indent=2))
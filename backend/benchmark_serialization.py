@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark /api/rag-search response serialization: time and bytes on the wire.
+
+Compares FastAPI's default JSON encoding with orjson, with and without gzip,
+and with the fields=content,url projection the extension uses. Runs on
+synthetic results shaped like real matches, so no services are needed:
+
+    python benchmark_serialization.py --k 4 10 20
+"""
+import argparse
+import gzip
+import json
+import random
+import string
+import time
+import orjson
+from fastapi.encoders import jsonable_encoder
+from config.settings import GZIP_MINIMUM_SIZE
+from services.response_format import project_result
+
+
+def synthetic_results(k: int) -> list[dict]:
+    """Results with ~2000-character chunks and the metadata the sync writes"""
+    words = ["".join(random.choices(string.ascii_lowercase, k=random.randint(2, 10))) for _ in range(2000)]
+    return [
+        {
+            "content": " ".join(random.choices(words, k=320))[:2000],
+            "metadata": {
+                "type": "discussion", "id": str(random.randint(10**5, 10**6)), "competition_id": "some-competition",
+                "title": "Gold solution write-up", "author": "kaggler", "author_kaggle_rank": "Master",
+                "medal_type": "Gold", "author_competition_rank": random.randint(1, 50), "upvotes": random.randint(10, 900),
+                "url": "https://www.kaggle.com/competitions/some-competition/discussion/123456",
+                "post_date": "2025-01-01T00:00:00+00:00", "parent_id": "123456", "chunk_index": 0,
+                "total_chunks": 3, "chunk_type": "discussion_section", "score": random.random(),
+            },
+        }
+        for _ in range(k)
+    ]
+
+
+def time_it(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def compressed_size(body: bytes) -> int:
+    # Mirrors GZipMiddleware: small bodies go out as-is
+    return len(gzip.compress(body, compresslevel=9)) if len(body) >= GZIP_MINIMUM_SIZE else len(body)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, nargs="+", default=[4, 10, 20])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    report = {}
+    for k in args.k:
+        payload = {"results": synthetic_results(k)}
+        projected = {"results": [project_result(r["content"], r["metadata"], {"content", "url"}) for r in payload["results"]]}
+
+        default_body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode()
+        orjson_body = orjson.dumps(payload)
+        projected_body = orjson.dumps(projected)
+
+        report[f"k={k}"] = {
+            "serialize_us": {
+                "default_json": round(time_it(lambda: json.dumps(jsonable_encoder(payload)).encode(), args.repeat), 1),
+                "orjson": round(time_it(lambda: orjson.dumps(payload), args.repeat), 1),
+            },
+            "bytes": {
+                "default_json": len(default_body),
+                "orjson": len(orjson_body),
+                "orjson_gzip": compressed_size(orjson_body),
+                "projected": len(projected_body),
+                "projected_gzip": compressed_size(projected_body),
+            },
+        }
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Import-time budget check for the API module.
+
+Runs `python -X importtime -c "import api"` in a fresh interpreter and fails if
+importing the app takes longer than the budget, or if any module that must stay
+off the startup path (LangChain, Pinecone, OpenAI, Firestore, SQLite) is imported:
+
+    python check_import_time.py
+    IMPORT_TIME_BUDGET_MS=800 python check_import_time.py --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_BUDGET_MS = 1500
+# Loaded lazily by VectorStoreService.connect / DatabaseService.db / DocStore.conn
+FORBIDDEN_PREFIXES = ("langchain", "pinecone", "openai", "google.cloud.firestore", "tiktoken", "sqlite3")
+
+
+def profile_imports(module: str = "api") -> list[tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for every import, in import order"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"❌ Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=10, help="Show the slowest top-level imports")
+    args = parser.parse_args()
+
+    budget_ms = float(os.environ.get("IMPORT_TIME_BUDGET_MS", DEFAULT_BUDGET_MS))
+    rows = profile_imports()
+    total_ms = next(cumulative for name, _, cumulative in rows if name == "api") / 1000
+    forbidden = sorted({name for name, _, _ in rows if name.startswith(FORBIDDEN_PREFIXES)})
+
+    print(f"⏱️ import api: {total_ms:.0f}ms (budget {budget_ms:.0f}ms)")
+    # Top-level packages only: children are included in their parent's cumulative time
+    top_level = [row for row in rows if "." not in row[0]]
+    for name, _, cumulative in sorted(top_level, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    failed = False
+    if total_ms > budget_ms:
+        print(f"❌ Import time over budget by {total_ms - budget_ms:.0f}ms")
+        failed = True
+    if forbidden:
+        print(f"❌ Heavy modules imported at startup: {', '.join(forbidden[:10])}")
+        failed = True
+    if not failed:
+        print("✅ Import time within budget")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,18 @@
+import os
+
+# Responses smaller than this are sent uncompressed; gzip costs more than it saves on tiny bodies
+GZIP_MINIMUM_SIZE = 1024
+
+# Concurrent searches per worker, and the Pinecone/OpenAI connection pool size backing them.
+# Every uvicorn worker (WORKERS in start.sh) has its own pools: WORKERS * SEARCH_POOL_SIZE connections per upstream
+SEARCH_POOL_SIZE = int(os.environ.get("SEARCH_POOL_SIZE", 100))
+# Idle connections kept alive to the OpenAI API between text searches
+OPENAI_KEEPALIVE_CONNECTIONS = int(os.environ.get("OPENAI_KEEPALIVE_CONNECTIONS", 8))
+OPENAI_KEEPALIVE_EXPIRY_SECONDS = 60
+# Query Pinecone over gRPC (one multiplexed HTTP/2 channel) when pinecone[grpc] is installed
+PINECONE_USE_GRPC = os.environ.get("PINECONE_USE_GRPC", "1") == "1"
+# How often each worker re-reads the index alias that reindex.py switches (seconds between Firestore reads)
+VECTOR_ALIAS_REFRESH_SECONDS = int(os.environ.get("VECTOR_ALIAS_REFRESH_SECONDS", 60))
+# Parent-document results return at most this much of a discussion, centred on the matched chunk
+# (about two 512-token chunks), so a long write-up does not grow every hit tenfold
+PARENT_MAX_CHARS = int(os.environ.get("PARENT_MAX_CHARS", 4000))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Offline eval of the quality-prior reranker: quality and latency cost.
+
+Quality compares recall@k and MRR with and without reranking over the same
+over-fetched candidates, using the query sources of eval_retrieval.py.
+Latency times Reranker.rerank on synthetic candidate sets of growing size and
+counts the calls that hit the budget and fell back to retrieval order:
+
+    python eval_reranking.py --latency-only
+    python eval_reranking.py --queries eval_queries.jsonl
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from services.reranker import Candidate, Reranker, RERANK_MAX_CANDIDATES
+
+
+def synthetic_candidates(n: int) -> list:
+    """Candidates with realistic metadata spread for latency measurement"""
+    medals = ["Gold", "Silver", "Bronze", None]
+    ranks = ["Grandmaster", "Master", "Expert", "Contributor", "Novice"]
+    return [
+        Candidate(f"discussion-{i}-0", random.uniform(0.2, 0.9), {
+            "upvotes": random.randint(10, 2000),
+            "medal_type": random.choice(medals),
+            "author_kaggle_rank": random.choice(ranks),
+            "author_competition_rank": random.choice([random.randint(1, 3000), "Unranked"]),
+        })
+        for i in range(n)
+    ]
+
+
+def latency_report(reranker: Reranker, repeat: int = 200) -> dict:
+    report = {}
+    for n in (16, 64, RERANK_MAX_CANDIDATES):
+        candidates = synthetic_candidates(n)
+        timings = []
+        over_budget = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            reranker.rerank(candidates, k=4)
+            timings.append((time.perf_counter() - start) * 1000)
+            over_budget += not reranker.last_within_budget
+        timings.sort()
+        report[n] = {"p50_ms": round(timings[len(timings) // 2], 4), "p99_ms": round(timings[int(len(timings) * 0.99)], 4),
+                     "over_budget": over_budget}
+    return report
+
+
+def quality_report(args, reranker: Reranker) -> dict:
+    from eval_retrieval import load_queries, parent_of, recall
+    from services.vector_store import vector_store_service, PARENT_OVERFETCH
+
+    vector_store_service.connect()
+    target = vector_store_service._current_target()
+    metrics = {mode: {"mrr": [], **{f"recall@{k}": [] for k in args.k}} for mode in ("similarity", "reranked")}
+    for item in load_queries(args):
+        embedding = vector_store_service.embed_query(item["query"])
+        candidates = vector_store_service._dense_candidates(target, embedding, item["competition_id"],
+                                                           max(args.k) * PARENT_OVERFETCH)
+        for mode, ranked in (("similarity", candidates), ("reranked", reranker.rerank(candidates))):
+            ranking = list(dict.fromkeys(parent_of(candidate.id) for candidate in ranked))
+            for k in args.k:
+                metrics[mode][f"recall@{k}"].append(recall(ranking, item["relevant_ids"], k))
+            first_hit = next((i for i, parent in enumerate(ranking) if parent in item["relevant_ids"]), None)
+            metrics[mode]["mrr"].append(1.0 / (first_hit + 1) if first_hit is not None else 0.0)
+
+    return {mode: {name: round(statistics.fmean(values), 4) if values else None for name, values in by_name.items()}
+            for mode, by_name in metrics.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="JSONL file of labelled queries")
+    parser.add_argument("--from-titles", action="store_true", help="Use synced discussion titles as queries")
+    parser.add_argument("--latency-only", action="store_true", help="Skip the quality eval (no network needed)")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    reranker = Reranker()
+    report = {"weights": reranker.weights, "latency_by_candidates": latency_report(reranker)}
+    if not args.latency_only:
+        if not (args.queries or args.from_titles):
+            parser.error("pass --queries or --from-titles for the quality eval")
+        report["quality"] = quality_report(args, reranker)
+    print(json.dumps(report, indent=2))
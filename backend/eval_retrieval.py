@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval eval: recall@k for dense, keyword (BM25) and hybrid search.
+
+Queries come from a JSONL file of {"query", "competition_id", "relevant_ids"}
+(relevant_ids are discussion ids), or are generated from discussion titles,
+where each title's own discussion is the relevant result:
+
+    python eval_retrieval.py --queries eval_queries.jsonl --k 4 10
+    python eval_retrieval.py --from-titles --limit 200
+"""
+import argparse
+import json
+import statistics
+import time
+from services.database import db_service
+from services.keyword_index import keyword_index_service
+from services.vector_store import vector_store_service
+
+
+def load_queries(args) -> list[dict]:
+    if args.queries:
+        with open(args.queries) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    queries = []
+    for doc in db_service.db.collection("discussions").where("updated", "==", False).limit(args.limit).stream():
+        data = doc.to_dict()
+        if data.get("title") and data.get("competition_id"):
+            queries.append({"query": data["title"], "competition_id": data["competition_id"], "relevant_ids": [doc.id]})
+    return queries
+
+
+def parent_of(vector_id: str) -> str:
+    """Discussion id from a chunk's vector id (type-discussionid-chunkindex)"""
+    return vector_id.split("-", 1)[1].rsplit("-", 1)[0]
+
+
+def recall(retrieved: list[str], relevant: list[str], k: int) -> float:
+    top = set(retrieved[:k])
+    return len(top & set(relevant)) / len(relevant)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--queries", help="JSONL file of labelled queries")
+    source.add_argument("--from-titles", action="store_true", help="Use synced discussion titles as queries")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 4, 10])
+    args = parser.parse_args()
+
+    vector_store_service.connect()
+    queries = load_queries(args)
+    max_k = max(args.k)
+    # Resolved once, so the whole eval reads the same index even if the alias switches mid-run
+    target = vector_store_service._current_target()
+    recalls = {mode: {k: [] for k in args.k} for mode in ("dense", "keyword", "hybrid")}
+    keyword_latencies = []
+
+    for item in queries:
+        embedding = vector_store_service.embed_query(item["query"])
+        dense = [parent_of(c.id) for c in vector_store_service._dense_candidates(target, embedding, item["competition_id"], max_k * 4)]
+
+        start = time.perf_counter()
+        keyword_hits = keyword_index_service.search(item["competition_id"], item["query"], max_k * 4)
+        keyword_latencies.append((time.perf_counter() - start) * 1000)
+        keyword = [parent_of(vector_id) for vector_id, _ in keyword_hits]
+
+        hybrid = [parent_of(c.id) for c in vector_store_service._hybrid_candidates(
+            target, embedding, item["competition_id"], item["query"], max_k * 4)]
+
+        for mode, ranking in (("dense", dense), ("keyword", keyword), ("hybrid", hybrid)):
+            # Several chunks may share a parent: rank distinct discussions
+            ranking = list(dict.fromkeys(ranking))
+            for k in args.k:
+                recalls[mode][k].append(recall(ranking, item["relevant_ids"], k))
+
+    report = {
+        "queries": len(queries),
+        "recall": {mode: {f"@{k}": round(statistics.fmean(values), 4) if values else None for k, values in by_k.items()}
+                   for mode, by_k in recalls.items()},
+        # The first query per competition includes loading its index from Firestore
+        "keyword_latency_ms": {
+            "p50": round(statistics.median(keyword_latencies), 3) if keyword_latencies else None,
+            "max": round(max(keyword_latencies), 3) if keyword_latencies else None,
+        },
+    }
+    print(json.dumps(report, indent=2))
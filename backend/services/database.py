@@ -1,16 +1,38 @@
-from google.cloud import firestore
-from google.cloud.firestore_v1.base_query import FieldFilter
 import os
 import json
 import tempfile
-from google.oauth2 import service_account
+import threading
+import time
+
+# Written by the scraper's sync (scraper/src/related_competitions.py)
+RELATED_COLLECTION = "related_competitions"
+TOP_DISCUSSIONS_COLLECTION = "competition_top_discussions"
+# Related competitions change at most once per scrape run
+RELATED_CACHE_TTL_SECONDS = 30 * 60
 
 class DatabaseService:
     def __init__(self):
-        self.db = self._initialize_firestore_client()
+        # The Firestore client is created on first use (or by the API's startup warm-up), never at import
+        self._db = None
+        self.ready = False
+        self._connect_lock = threading.Lock()
+        self._related_cache = {}  # competition_id -> (cached_at, response)
+
+    @property
+    def db(self):
+        """Firestore client, or None if credentials are unavailable"""
+        if not self.ready:
+            with self._connect_lock:
+                if not self.ready:
+                    self._db = self._initialize_firestore_client()
+                    self.ready = True
+        return self._db
 
     def _initialize_firestore_client(self):
         """Initialize Firestore client with flexible credential handling"""
+        # Imported here: google-cloud-firestore pulls in grpc and credential discovery
+        from google.cloud import firestore
+        from google.oauth2 import service_account
         try:
             # Method 1: Try JSON credentials from environment variable (Render.com)
             creds_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_JSON')
@@ -59,6 +81,7 @@ class DatabaseService:
         if not self.db:
             raise ValueError("Database not available - check Google Cloud credentials")
         
+        from google.cloud.firestore_v1.base_query import FieldFilter
         try:
             docs = (
                 self.db.collection("competitions")
@@ -97,5 +120,33 @@ class DatabaseService:
             print(f"Database error in get_active_competitions: {e}")
             return []  # Return empty list on error
 
+    def get_related_competitions(self, competition_id: str, k: int = 5, discussions_per_competition: int = 3) -> list:
+        """Most similar competitions with their top Gold discussions, from the precomputed table"""
+        if not self.db:
+            raise ValueError("Database not available - check Google Cloud credentials")
+        
+        cached = self._related_cache.get(competition_id)
+        if cached and time.time() - cached[0] < RELATED_CACHE_TTL_SECONDS:
+            related, top_by_competition = cached[1]
+        else:
+            snapshot = self.db.collection(RELATED_COLLECTION).document(competition_id).get()
+            if not snapshot.exists:
+                raise ValueError(f"No related competitions for {competition_id}")
+            related = snapshot.to_dict().get("related", [])
+            
+            # The sync keeps each competition's most-upvoted Gold discussions: one batched read for all of them
+            top_ref = self.db.collection(TOP_DISCUSSIONS_COLLECTION)
+            refs = [top_ref.document(item["competition_id"]) for item in related]
+            top_by_competition = {
+                top.id: top.to_dict().get("discussions", [])
+                for top in (self.db.get_all(refs) if refs else []) if top.exists
+            }
+            self._related_cache[competition_id] = (time.time(), (related, top_by_competition))
+        
+        return [
+            {**item, "top_discussions": top_by_competition.get(item["competition_id"], [])[:discussions_per_competition]}
+            for item in related[:k]
+        ]
+
 # Singleton instance
 db_service = DatabaseService()
\ No newline at end of file
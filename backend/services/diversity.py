@@ -0,0 +1,63 @@
+import numpy as np
+
+# 1.0 = pure relevance, 0.0 = pure novelty
+DEFAULT_MMR_LAMBDA = 0.7
+# At most this many chunks of one discussion in a diversified result
+DEFAULT_PER_DISCUSSION_CAP = 2
+
+
+def mmr_select(query_embedding: list[float], candidates: list, k: int,
+               lambda_mult: float = DEFAULT_MMR_LAMBDA,
+               per_discussion_cap: int = DEFAULT_PER_DISCUSSION_CAP,
+               relevance: list | None = None) -> list:
+    """Pick k candidates by maximal marginal relevance over their embedding matrix.
+
+    relevance holds each candidate's upstream score (fused or reranked), min-max
+    normalized to [0, 1] so lambda_mult weighs it against cosine redundancy;
+    None entries (e.g. past the reranker's cap) get the lowest score. Without it,
+    or when every entry is None, a candidate's relevance is its query cosine.
+    Candidates need `values` (fetch them with include_values=True). Each step
+    costs one matrix-vector product, so the whole selection is O(k * n * dim).
+    """
+    if relevance is None:
+        relevance = [None] * len(candidates)
+    kept = [(candidate, score) for candidate, score in zip(candidates, relevance) if candidate.values]
+    if not kept or k <= 0:
+        return []
+    candidates = [candidate for candidate, _ in kept]
+
+    matrix = np.asarray([candidate.values for candidate in candidates], dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+
+    upstream = np.array([np.nan if score is None else score for _, score in kept], dtype=np.float32)
+    if np.isnan(upstream).all():
+        relevance = matrix @ query
+    else:
+        upstream = np.where(np.isnan(upstream), np.nanmin(upstream), upstream)
+        spread = float(upstream.max() - upstream.min())
+        relevance = (upstream - upstream.min()) / spread if spread > 0 else np.ones_like(upstream)
+    # Highest similarity of each candidate to anything already selected
+    redundancy = np.full(len(candidates), -np.inf, dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    parents = [candidate.metadata.get("parent_id") or candidate.metadata.get("id") for candidate in candidates]
+    _, parent_codes = np.unique(np.asarray(parents, dtype=object).astype(str), return_inverse=True)
+    picks_per_parent = np.zeros(parent_codes.max() + 1, dtype=np.int32)
+
+    selected = []
+    while len(selected) < k and available.any():
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * penalty
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+
+        selected.append(candidates[best])
+        available[best] = False
+        redundancy = np.maximum(redundancy, matrix @ matrix[best])
+
+        parent = parent_codes[best]
+        picks_per_parent[parent] += 1
+        if picks_per_parent[parent] >= per_discussion_cap:
+            available &= parent_codes != parent
+    return selected
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+import zlib
+from services.database import db_service
+
+DEFAULT_DOC_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "doc_store.sqlite3")
+# Discussions are re-scraped every 4 hours, so cached bodies older than this are refreshed
+DEFAULT_DOC_STORE_TTL_SECONDS = 6 * 60 * 60
+
+
+def format_parent_text(discussion: dict) -> str:
+    """Full discussion body returned for parent-document retrieval"""
+    title = (discussion.get("title") or "").strip()
+    content = (discussion.get("content") or "").strip()
+    parts = []
+    if title:
+        parts.append(f"Discussion Title: {title}")
+    if content:
+        parts.append(f"Discussion Content:\n{content}")
+    return "\n\n".join(parts)
+
+
+def parent_excerpt(parent: str, chunk_text: str, max_chars: int) -> tuple[str, bool]:
+    """The parent body, or a max_chars window of it around the matched chunk; and whether it was trimmed"""
+    if len(parent) <= max_chars:
+        return parent, False
+    # Chunks are cut from a differently formatted copy of the discussion, with a title header: locate
+    # the longest of their lines in the body and step back by its offset to where the chunk starts
+    lines = sorted((line for line in chunk_text.splitlines() if len(line.strip()) >= 20), key=len, reverse=True)
+    anchor = next((line for line in lines if line in parent), None)
+    position = max(0, parent.find(anchor) - chunk_text.find(anchor)) if anchor else 0
+    # Some context before the chunk, the rest after it
+    start = max(0, min(position - max_chars // 4, len(parent) - max_chars))
+    end = start + max_chars
+    return ("…" if start else "") + parent[start:end] + ("…" if end < len(parent) else ""), True
+
+
+class DocStore:
+    """Local compressed key-value store of full discussion bodies.
+
+    Pinecone only holds small chunks tagged with a parent_id. Parents are read
+    from this SQLite file; misses are fetched from Firestore in one bulk read
+    and stored zlib-compressed for next time.
+    """
+
+    def __init__(self, path: str = None, ttl_seconds: int = None):
+        self.path = path or os.environ.get("DOC_STORE_PATH", DEFAULT_DOC_STORE_PATH)
+        self.ttl_seconds = ttl_seconds or int(os.environ.get("DOC_STORE_TTL_SECONDS", DEFAULT_DOC_STORE_TTL_SECONDS))
+        # The SQLite file is opened on first use, never at import
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        """SQLite connection, creating the file and table on first use; use under self._lock"""
+        if self._conn is None:
+            import sqlite3
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("CREATE TABLE IF NOT EXISTS parents (id TEXT PRIMARY KEY, body BLOB NOT NULL, stored_at REAL NOT NULL)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, parent_ids: list[str]) -> dict[str, str]:
+        """Return {parent_id: full text} for every parent that could be found"""
+        parent_ids = list(dict.fromkeys(parent_ids))
+        if not parent_ids:
+            return {}
+
+        placeholders = ",".join("?" * len(parent_ids))
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT id, body FROM parents WHERE id IN ({placeholders}) AND stored_at > ?",
+                [*parent_ids, time.time() - self.ttl_seconds]
+            ).fetchall()
+        parents = {parent_id: zlib.decompress(body).decode("utf-8") for parent_id, body in rows}
+
+        missing = [parent_id for parent_id in parent_ids if parent_id not in parents]
+        if missing:
+            fetched = self._fetch_from_firestore(missing)
+            self.put_many(fetched)
+            parents.update(fetched)
+        return parents
+
+    def put_many(self, parents: dict[str, str]):
+        """Insert or replace parent bodies"""
+        if not parents:
+            return
+        now = time.time()
+        rows = [(parent_id, zlib.compress(text.encode("utf-8"), 6), now) for parent_id, text in parents.items()]
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO parents (id, body, stored_at) VALUES (?, ?, ?)", rows)
+            self.conn.commit()
+
+    def _fetch_from_firestore(self, parent_ids: list[str]) -> dict[str, str]:
+        """Bulk-read discussions that are not cached locally yet"""
+        db = db_service.db
+        if not db:
+            return {}
+        try:
+            refs = [db.collection("discussions").document(parent_id) for parent_id in parent_ids]
+            return {
+                snapshot.id: format_parent_text(snapshot.to_dict())
+                for snapshot in db.get_all(refs)
+                if snapshot.exists
+            }
+        except Exception as e:
+            print(f"❌ Error fetching parent discussions: {e}")
+            return {}
+
+
+# Singleton instance
+doc_store = DocStore()
@@ -0,0 +1,121 @@
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from services.database import db_service
+
+# Must match scraper/src/keyword_index.py
+TOKENIZER_VERSION = 1
+KEYWORD_INDEX_COLLECTION = "keyword_indexes"
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9_+#.\-]*[a-z0-9+#]|[a-z0-9]")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i if in into is it its of on or our so "
+    "that the their then there these this to was we were what when which while will with you your".split()
+)
+
+# Indexes change at most once per scrape run, so a short in-memory TTL is plenty
+INDEX_TTL_SECONDS = 15 * 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal-rank fusion constant from the original RRF paper
+RRF_K = 60
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased keyword tokens; must stay identical to the scraper's tokenizer"""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion_scores(*rankings: list[str], k: int = RRF_K) -> dict[str, float]:
+    """RRF score of every id in any of the ranked lists"""
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return scores
+
+
+def reciprocal_rank_fusion(*rankings: list[str], k: int = RRF_K) -> list[str]:
+    """Fuse ranked id lists; ids ranked high in any list float to the top"""
+    scores = reciprocal_rank_fusion_scores(*rankings, k=k)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class BM25Partition:
+    """In-memory BM25 postings for one competition"""
+
+    def __init__(self, docs: dict):
+        self.vector_ids = list(docs)
+        lengths = [entry[1] for entry in docs.values()]
+        n_docs = len(lengths)
+        avg_length = (sum(lengths) / n_docs) if n_docs else 0.0
+
+        # term -> [(doc position, precomputed tf weight)], so a query only sums floats
+        document_frequency = {}
+        for entry in docs.values():
+            for term in entry[2]:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+
+        self.postings = {}
+        for position, entry in enumerate(docs.values()):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * (entry[1] / avg_length if avg_length else 0))
+            for term, tf in entry[2].items():
+                df = document_frequency[term]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                self.postings.setdefault(term, []).append((position, idf * tf * (BM25_K1 + 1) / (tf + norm)))
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        scores = {}
+        for term in set(tokenize(query)):
+            for position, weight in self.postings.get(term, ()):
+                scores[position] = scores.get(position, 0.0) + weight
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.vector_ids[position], score) for position, score in best]
+
+
+class KeywordIndexService:
+    """Loads per-competition keyword indexes written by the sync and answers BM25 queries"""
+
+    def __init__(self):
+        self._partitions = {}  # competition_id -> (loaded_at, BM25Partition or None)
+        self._lock = threading.Lock()
+
+    def search(self, competition_id: str, query: str, k: int) -> list[tuple[str, float]]:
+        """Top-k (vector_id, bm25 score) for a query within one competition"""
+        partition = self._get_partition(competition_id)
+        if not partition or not query:
+            return []
+        return partition.search(query, k)
+
+    def _get_partition(self, competition_id: str):
+        cached = self._partitions.get(competition_id)
+        if cached and time.time() - cached[0] < INDEX_TTL_SECONDS:
+            return cached[1]
+
+        partition = self._load(competition_id)
+        with self._lock:
+            self._partitions[competition_id] = (time.time(), partition)
+        return partition
+
+    def _load(self, competition_id: str):
+        db = db_service.db
+        if not db:
+            return None
+        try:
+            snapshot = db.collection(KEYWORD_INDEX_COLLECTION).document(competition_id).get()
+            if not snapshot.exists:
+                return None
+            payload = json.loads(zlib.decompress(snapshot.to_dict()["index"]))
+            if payload.get("tokenizer_version") != TOKENIZER_VERSION:
+                print(f"⚠️ Keyword index for {competition_id} uses another tokenizer version; ignoring it")
+                return None
+            return BM25Partition(payload["docs"])
+        except Exception as e:
+            print(f"❌ Error loading keyword index for {competition_id}: {e}")
+            return None
+
+
+# Singleton instance
+keyword_index_service = KeywordIndexService()
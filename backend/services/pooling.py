@@ -0,0 +1,44 @@
+import threading
+from contextlib import contextmanager
+
+
+class PoolGauge:
+    """Counts in-flight requests against a connection pool of fixed size.
+
+    Peak utilization at or near 1.0 means callers queued for a connection and
+    the pool, not the upstream service, bounded throughput.
+    """
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak = 0
+        self._requests = 0
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self._in_flight += 1
+            self._requests += 1
+            self._peak = max(self._peak, self._in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def stats(self, reset_peak: bool = False) -> dict:
+        with self._lock:
+            stats = {
+                "size": self.size,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak,
+                "utilization": round(self._in_flight / self.size, 3),
+                "peak_utilization": round(self._peak / self.size, 3),
+                "requests": self._requests,
+            }
+            if reset_peak:
+                self._peak = self._in_flight
+        return stats
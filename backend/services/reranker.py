@@ -0,0 +1,119 @@
+import json
+import os
+import time
+from collections import namedtuple
+import numpy as np
+from services.tracing import budget_exceeded
+
+# Weight of each signal in the final score; similarity is cosine in [0, 1], priors are scaled to [0, 1]
+DEFAULT_RERANK_WEIGHTS = {
+    "similarity": 1.0,
+    "upvotes": 0.06,
+    "medal": 0.04,
+    "competition_rank": 0.05,
+    "kaggle_rank": 0.03,
+}
+MEDAL_PRIOR = {"Gold": 1.0, "Silver": 0.6, "Bronze": 0.3}
+KAGGLE_RANK_PRIOR = {"Grandmaster": 1.0, "Master": 0.75, "Expert": 0.5, "Contributor": 0.25}
+# Reranking must never cost more than this; past it the retrieval order is returned unchanged
+RERANK_LATENCY_BUDGET_MS = float(os.environ.get("RERANK_LATENCY_BUDGET_MS", "5"))
+# Hard cap on candidates scored per request, which bounds the worst-case latency; the rest keep retrieval order
+RERANK_MAX_CANDIDATES = 256
+# Candidates between deadline checks while extracting features
+RERANK_DEADLINE_CHECK_EVERY = 32
+
+# Pinecone-match-like search candidate, also used for keyword-only hits fetched by id;
+# values is only filled when the embedding was requested (diversification)
+Candidate = namedtuple("Candidate", ["id", "score", "metadata", "values"], defaults=(None,))
+
+
+def _load_weights() -> dict:
+    """Default weights, overridable with RERANK_WEIGHTS='{"upvotes": 0.1}'"""
+    weights = dict(DEFAULT_RERANK_WEIGHTS)
+    override = os.environ.get("RERANK_WEIGHTS")
+    if override:
+        weights.update(json.loads(override))
+    return weights
+
+
+class Reranker:
+    """Combine similarity with discussion quality priors written by the sync"""
+
+    def __init__(self, weights: dict = None, budget_ms: float = RERANK_LATENCY_BUDGET_MS):
+        self.weights = weights or _load_weights()
+        self.budget_ms = budget_ms
+        self.last_latency_ms = 0.0
+        self.last_within_budget = True
+
+    def features(self, candidates: list, deadline: float = None) -> np.ndarray | None:
+        """(n, 5) matrix of similarity, upvotes, medal, competition rank and Kaggle rank signals.
+
+        Returns None once time.perf_counter() passes deadline.
+        """
+        n = len(candidates)
+        similarity = np.empty(n)
+        upvotes = np.empty(n)
+        medal = np.empty(n)
+        competition_rank = np.empty(n)
+        kaggle_rank = np.empty(n)
+        for i, candidate in enumerate(candidates):
+            if deadline is not None and i % RERANK_DEADLINE_CHECK_EVERY == 0 and time.perf_counter() > deadline:
+                return None
+            metadata = candidate.metadata
+            # Keyword-only hybrid hits have no similarity score
+            similarity[i] = candidate.score if candidate.score is not None else np.nan
+            votes = metadata.get("upvotes")
+            upvotes[i] = votes if isinstance(votes, (int, float)) else 0
+            medal[i] = MEDAL_PRIOR.get(metadata.get("medal_type"), 0.0)
+            rank = metadata.get("author_competition_rank")
+            competition_rank[i] = rank if isinstance(rank, (int, float)) and rank > 0 else np.inf
+            kaggle_rank[i] = KAGGLE_RANK_PRIOR.get(metadata.get("author_kaggle_rank"), 0.0)
+
+        if np.isnan(similarity).all():
+            similarity[:] = 0.0
+        else:
+            similarity = np.where(np.isnan(similarity), np.nanmin(similarity), similarity)
+        upvotes = np.log1p(np.maximum(upvotes, 0))
+        if upvotes.max() > 0:
+            upvotes /= upvotes.max()
+        # 1st place -> 1.0, 100th -> 0.1, unranked -> 0
+        competition_rank = 1.0 / np.sqrt(competition_rank)
+        return np.column_stack([similarity, upvotes, medal, competition_rank, kaggle_rank])
+
+    def rerank(self, candidates: list, k: int = None) -> list:
+        """Return candidates sorted by combined score, truncated to k.
+
+        Only the first RERANK_MAX_CANDIDATES are scored; their score is written to
+        metadata['rerank_score']. If scoring runs past
+        the latency budget, the retrieval order is returned instead and the
+        fallback is counted in kaggler_stage_budget_exceeded_total.
+        """
+        if not candidates:
+            return []
+        start = time.perf_counter()
+        scored, unscored = candidates[:RERANK_MAX_CANDIDATES], candidates[RERANK_MAX_CANDIDATES:]
+
+        features = self.features(scored, deadline=start + self.budget_ms / 1000)
+        self.last_within_budget = features is not None
+        if not self.last_within_budget:
+            budget_exceeded.inc("rerank")
+            self.last_latency_ms = (time.perf_counter() - start) * 1000
+            return candidates[:k]
+
+        weights = np.array([
+            self.weights["similarity"], self.weights["upvotes"], self.weights["medal"],
+            self.weights["competition_rank"], self.weights["kaggle_rank"],
+        ])
+        scores = features @ weights
+        for candidate, score in zip(scored, scores):
+            candidate.metadata["rerank_score"] = float(score)
+        # Stable sort keeps retrieval order on ties
+        order = np.argsort(-scores, kind="stable")
+        reranked = ([scored[i] for i in order] + unscored)[:k]
+
+        self.last_latency_ms = (time.perf_counter() - start) * 1000
+        return reranked
+
+
+# Singleton instance
+reranker = Reranker()
@@ -0,0 +1,18 @@
+from typing import Optional
+
+
+def parse_fields(fields: Optional[str]) -> Optional[set]:
+    """Parse a comma-separated ?fields= value; None means every field"""
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(",") if field.strip()}
+
+
+def project_result(content: str, metadata: dict, fields: Optional[set]) -> dict:
+    """Keep only the requested fields; "content" selects the text, anything else a metadata key"""
+    if fields is None:
+        return {"content": content, "metadata": metadata}
+    result = {"metadata": {key: value for key, value in metadata.items() if key in fields}}
+    if "content" in fields:
+        result["content"] = content
+    return result
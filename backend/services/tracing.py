@@ -0,0 +1,188 @@
+"""
+Request tracing: per-stage timings, Prometheus histograms and sampled request logs.
+
+The API middleware opens a RequestTrace per request and keeps it in a context
+variable, so services record stages with `with stage("pinecone_query"):`
+without threading the trace through their signatures. Stages recorded
+outside a request (scripts, warm-up) are no-ops.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+import orjson
+
+# Seconds; covers in-process stages (sub-millisecond) up to slow upstream calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Fraction of requests logged; slow and failed requests are always logged
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 0.01))
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+logger = logging.getLogger("kaggler.requests")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label value, rendered in Prometheus text format"""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}  # label value -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, label_value: str, value: float):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 2)
+            series[position] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {label_value: list(values) for label_value, values in self._series.items()}
+        for label_value, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="{bound}"}} {cumulative}')
+            cumulative += values[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {values[-1]:.6f}')
+            lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Monotonic count per label value, rendered in Prometheus text format"""
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def inc(self, label_value: str, amount: int = 1):
+        with self._lock:
+            self._counts[label_value] = self._counts.get(label_value, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            counts = dict(self._counts)
+        lines += [f'{self.name}{{{self.label}="{label_value}"}} {count}' for label_value, count in sorted(counts.items())]
+        return lines
+
+
+request_duration = Histogram("kaggler_request_duration_seconds", "End-to-end request latency", "route")
+stage_duration = Histogram("kaggler_stage_duration_seconds", "Latency of one stage of a search request", "stage")
+budget_exceeded = Counter("kaggler_stage_budget_exceeded_total",
+                          "Stages that gave up and fell back after exceeding their latency budget", "stage")
+
+
+class RequestTrace:
+    """Stage timings of one request, in the order the stages ran"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.stages = []  # (name, seconds)
+
+    def record(self, name: str, seconds: float):
+        self.stages.append((name, seconds))
+        stage_duration.observe(name, seconds)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+def start_trace(method: str, path: str) -> tuple[RequestTrace, contextvars.Token]:
+    trace = RequestTrace(method, path)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(trace: RequestTrace, token: contextvars.Token, route: str, status_code: int):
+    """Observe the request latency and log it if sampled, slow or failed"""
+    _current_trace.reset(token)
+    total = trace.elapsed()
+    request_duration.observe(route, total)
+
+    total_ms = total * 1000
+    if status_code >= 500 or total_ms >= SLOW_REQUEST_MS or random.random() < LOG_SAMPLE_RATE:
+        logger.info(orjson.dumps({
+            "event": "request",
+            "method": trace.method,
+            "route": route,
+            "status": status_code,
+            "duration_ms": round(total_ms, 2),
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in trace.stages},
+        }).decode())
+
+
+def log_error(event: str, error: Exception, **fields):
+    """Structured error log with traceback; errors are never sampled out"""
+    trace = _current_trace.get()
+    logger.error(orjson.dumps({
+        "event": event,
+        "route": trace.path if trace else None,
+        "error": str(error),
+        "traceback": traceback.format_exc(),
+        **fields,
+    }, default=str).decode())
+
+
+def current_trace() -> RequestTrace | None:
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as a stage of the current request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(name, time.perf_counter() - start)
+
+
+def render_gauges(name: str, help_text: str, label: str, values: dict) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines += [f'{name}{{{label}="{label_value}"}} {value}' for label_value, value in sorted(values.items())]
+    return lines
+
+
+def render_metrics(pool_stats: dict) -> str:
+    """Prometheus exposition of this worker's histograms, budget counters and pool gauges"""
+    pools = {name: stats for name, stats in pool_stats.items() if isinstance(stats, dict)}
+    lines = request_duration.render() + stage_duration.render() + budget_exceeded.render()
+    lines += render_gauges("kaggler_pool_in_flight", "Requests holding a pooled connection", "pool",
+                           {name: stats["in_flight"] for name, stats in pools.items()})
+    lines += render_gauges("kaggler_pool_size", "Connection pool size", "pool",
+                           {name: stats["size"] for name, stats in pools.items()})
+    lines += render_gauges("kaggler_pool_peak_utilization", "Peak in-flight / size since the last scrape", "pool",
+                           {name: stats["peak_utilization"] for name, stats in pools.items()})
+    return "\n".join(lines) + "\n"
@@ -1,134 +1,416 @@
+import importlib.util
 import os
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import OpenAIEmbeddings
-from pinecone import Pinecone
+import threading
+import time
+from dataclasses import dataclass
 from dotenv import find_dotenv, load_dotenv
-from langchain.schema import Document
+from config.settings import (
+    OPENAI_KEEPALIVE_CONNECTIONS, OPENAI_KEEPALIVE_EXPIRY_SECONDS, PARENT_MAX_CHARS, PINECONE_USE_GRPC,
+    SEARCH_POOL_SIZE, VECTOR_ALIAS_REFRESH_SECONDS
+)
+from services.database import db_service
+from services.doc_store import doc_store, parent_excerpt
+from services.keyword_index import keyword_index_service, reciprocal_rank_fusion_scores
+from services.reranker import Candidate, reranker
+from services.diversity import DEFAULT_PER_DISCUSSION_CAP, mmr_select
+from services.pooling import PoolGauge
+from services.tracing import log_error, stage
 load_dotenv(find_dotenv())
 
+# Must match the model the sync embeds with
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Parent-document, hybrid and rerank modes over-fetch chunks so k good results survive collapsing/fusion/reranking
+PARENT_OVERFETCH = 4
+# Written by scraper/src/reindex.py (see scraper/src/index_alias.py); without it the default namespace is searched
+ALIAS_COLLECTION = "index_aliases"
+ALIAS_NAME = "kaggle-competitions"
+DEFAULT_INDEX_NAME = "kaggle-competitions"
+# Index layouts; per-competition keeps each competition's discussion chunks in "<namespace>--<competition id>"
+LAYOUT_SHARED = "shared"
+LAYOUT_PER_COMPETITION = "per_competition"
+COMPETITION_NAMESPACE_SEPARATOR = "--"
+
+@dataclass(slots=True)
+class SearchResult:
+    """One search hit: chunk (or parent discussion) text plus its Pinecone metadata and score"""
+    content: str
+    metadata: dict
+
+@dataclass(frozen=True, slots=True)
+class IndexTarget:
+    """Index handle, namespace and layout that searches read; replaced as a whole when the alias moves"""
+    index_name: str
+    namespace: str
+    layout: str
+    index: object
+
+    def discussion_scope(self, competition_id: str, **conditions) -> tuple[str, dict | None]:
+        """Namespace and metadata filter for one competition's discussion chunks"""
+        if self.layout == LAYOUT_PER_COMPETITION:
+            # Everything in a competition namespace is one competition's discussions: no filter needed
+            return f"{self.namespace}{COMPETITION_NAMESPACE_SEPARATOR}{competition_id}", conditions or None
+        return self.namespace, {"competition_id": competition_id, "type": "discussion", **conditions}
+
 class VectorStoreService:
     def __init__(self):
-        # Initialize Pinecone with the same setup as sync service
-        self.pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
-        self.index_name = 'kaggle-competitions'  # Use the correct index name
-        
+        # Clients are created on first use (or by the API's startup warm-up), never at import
+        self.pc = None
+        self.target = None
+        self.openai = None
+        self.transport = None
+        self.ready = False
+        self._connect_lock = threading.Lock()
+        self._alias_lock = threading.Lock()
+        self._alias_checked_at = 0.0
+        self._index_handles = {}
+        # Shared by every request handler; see config.settings for sizing
+        self.pinecone_pool = PoolGauge("pinecone", SEARCH_POOL_SIZE)
+        self.openai_pool = PoolGauge("openai", SEARCH_POOL_SIZE)
+    
+    def connect(self):
+        """Connect to Pinecone and OpenAI; safe to call repeatedly and from several threads"""
+        if self.ready:
+            return
+        with self._connect_lock:
+            if self.ready:
+                return
+            # Heavy client libraries are imported here to keep them off the startup path
+            import httpx
+            from openai import OpenAI
+            
+            self.pc, self.transport = self._connect_pinecone()
+            self.target = self._resolve_target()
+            self._alias_checked_at = time.monotonic()
+            print(f"✅ Connected to Pinecone index: {self.index_name} (namespace {self.target.namespace or 'default'}, "
+                  f"{self.target.layout} layout, {self.transport}, pool {SEARCH_POOL_SIZE})")
+            
+            # Only text queries need embeddings; /api/rag-search receives them from the client
+            try:
+                http_client = httpx.Client(
+                    # HTTP/2 multiplexes requests over one connection when the h2 package is installed
+                    http2=importlib.util.find_spec("h2") is not None,
+                    limits=httpx.Limits(
+                        max_connections=SEARCH_POOL_SIZE,
+                        max_keepalive_connections=OPENAI_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY_SECONDS,
+                    ),
+                )
+                self.openai = OpenAI(http_client=http_client)
+                print("✅ OpenAI embeddings initialized")
+            except Exception as e:
+                print(f"⚠️ OpenAI embeddings not available: {e}")
+                print("💡 Set OPENAI_API_KEY environment variable for embedding functionality")
+                self.openai = None
+            self.ready = True
+    
+    @property
+    def index(self):
+        return self.target.index if self.target else None
+    
+    @property
+    def index_name(self) -> str:
+        return self.target.index_name if self.target else DEFAULT_INDEX_NAME
+    
+    def _connect_pinecone(self):
+        """Pinecone client: gRPC when pinecone[grpc] is installed, otherwise keep-alive HTTPS"""
+        api_key = os.environ.get("PINECONE_API_KEY")
         try:
-            self.index = self.pc.Index(self.index_name)
-            print(f"✅ Connected to Pinecone index: {self.index_name}")
+            if PINECONE_USE_GRPC:
+                try:
+                    from pinecone.grpc import PineconeGRPC
+                except ImportError:
+                    print("💡 pinecone[grpc] not installed - using HTTPS")
+                else:
+                    return PineconeGRPC(api_key=api_key), "grpc"
+            
+            from pinecone import Pinecone
+            return Pinecone(api_key=api_key, pool_threads=SEARCH_POOL_SIZE), "https"
         except Exception as e:
             print(f"❌ Error connecting to Pinecone index: {str(e)}")
             raise
+    
+    def _open_index(self, index_name: str):
+        """Pooled index handle, opened once per index name"""
+        if index_name not in self._index_handles:
+            if self.transport == "grpc":
+                index = self.pc.Index(index_name, pool_threads=SEARCH_POOL_SIZE)
+            else:
+                # urllib3 keeps up to connection_pool_maxsize connections alive per host
+                index = self.pc.Index(index_name, pool_threads=SEARCH_POOL_SIZE, connection_pool_maxsize=SEARCH_POOL_SIZE)
+            self._index_handles[index_name] = index
+        return self._index_handles[index_name]
+    
+    def _resolve_target(self) -> IndexTarget:
+        """Index, namespace and layout named by the Firestore alias, or the default namespace of the default index"""
+        index_name, namespace, layout = DEFAULT_INDEX_NAME, "", LAYOUT_SHARED
+        db = db_service.db
+        if db:
+            snapshot = db.collection(ALIAS_COLLECTION).document(ALIAS_NAME).get()
+            if snapshot.exists:
+                alias = snapshot.to_dict()
+                index_name = alias.get("index_name") or DEFAULT_INDEX_NAME
+                namespace = alias.get("namespace") or ""
+                layout = alias.get("layout") or LAYOUT_SHARED
+        if self.target and (self.target.index_name, self.target.namespace, self.target.layout) == (index_name, namespace, layout):
+            return self.target
+        return IndexTarget(index_name, namespace, layout, self._open_index(index_name))
+    
+    def _current_target(self) -> IndexTarget:
+        """Target for one search, re-resolved at most every VECTOR_ALIAS_REFRESH_SECONDS.
         
-        # Initialize embeddings
-        try:
-            self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-            print("✅ OpenAI embeddings initialized")
-        except Exception as e:
-            print(f"⚠️ OpenAI embeddings not available: {e}")
-            print("💡 Set OPENAI_API_KEY environment variable for embedding functionality")
-            self.embeddings = None
+        A search reads the target once and uses it for all of its queries, so an
+        alias switch never mixes namespaces within a response.
+        """
+        if (time.monotonic() - self._alias_checked_at >= VECTOR_ALIAS_REFRESH_SECONDS
+                and self._alias_lock.acquire(blocking=False)):
+            # One request refreshes; concurrent ones keep using the current target meanwhile
+            try:
+                self._alias_checked_at = time.monotonic()
+                target = self._resolve_target()
+                if target is not self.target:
+                    print(f"🔀 Index alias moved: now searching {target.index_name} "
+                          f"(namespace {target.namespace or 'default'}, {target.layout} layout)")
+                    self.target = target
+            except Exception as e:
+                # Keep serving from the current target; the next refresh retries
+                log_error("index_alias_refresh_failed", e)
+            finally:
+                self._alias_lock.release()
+        return self.target
+    
+    def pool_stats(self, reset_peak: bool = False) -> dict:
+        """Connection pool utilization per upstream"""
+        return {
+            "transport": self.transport,
+            "pinecone": self.pinecone_pool.stats(reset_peak),
+            "openai": self.openai_pool.stats(reset_peak),
+        }
+    
+    def _query(self, target: IndexTarget, namespace: str = None, **kwargs):
+        with stage("pinecone_query"), self.pinecone_pool.track():
+            return target.index.query(namespace=target.namespace if namespace is None else namespace, **kwargs)
+    
+    def _fetch(self, target: IndexTarget, ids: list[str], namespace: str = None):
+        with stage("pinecone_fetch"), self.pinecone_pool.track():
+            return target.index.fetch(ids=ids, namespace=target.namespace if namespace is None else namespace)
+    
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a text query with the same model the sync used"""
+        self.connect()
+        if not self.openai:
+            raise RuntimeError("OpenAI embeddings not available - missing OpenAI credentials")
+        with stage("embed"), self.openai_pool.track():
+            return self.openai.embeddings.create(model=EMBEDDING_MODEL, input=text).data[0].embedding
+    
+    def search_by_embedding(self, embedding: list[float], competition_id: str, k: int = 4,
+                            parent_documents: bool = False, query: str = None, rerank: bool = False,
+                            diversify: bool = False) -> list:
+        """Search for relevant discussions of one competition by embedding.
+
+        With query, dense hits are fused with BM25 keyword hits (hybrid search).
+        With rerank, candidates are reordered by similarity plus quality priors.
+        With diversify, k results are picked by MMR with a per-discussion cap.
+        With parent_documents, chunk hits are collapsed into whole discussions.
+        """
+        self.connect()
+        target = self._current_target()
         
-        # Initialize vector store
-        if self.embeddings:
-            self.vector_store = PineconeVectorStore(
-                index=self.index,
-                embedding=self.embeddings
-            )
-            print("✅ Vector store initialized with OpenAI embeddings")
-        else:
-            self.vector_store = None
-            print("⚠️ Vector store not available - missing OpenAI credentials")
-    
-    def search_by_embedding(self, embedding: list[float], competition_id: str, k: int = 4) -> list:
-        """Search for relevant discussions by embedding with competition filter"""
-        if not self.vector_store:
-            print("⚠️ Vector search not available - missing OpenAI credentials")
-            return []
+        if parent_documents or query or rerank or diversify:
+            try:
+                if query:
+                    candidates = self._hybrid_candidates(target, embedding, competition_id, query,
+                                                         k * PARENT_OVERFETCH, include_values=diversify)
+                else:
+                    candidates = self._dense_candidates(target, embedding, competition_id, k * PARENT_OVERFETCH,
+                                                        include_values=diversify)
+                if rerank:
+                    with stage("rerank"):
+                        candidates = reranker.rerank(candidates)
+                if diversify:
+                    # Whole-discussion results need distinct discussions
+                    cap = 1 if parent_documents else DEFAULT_PER_DISCUSSION_CAP
+                    # Relevance is the last upstream score: reranked (unless over budget), else fused, else dense
+                    score_keys = [key for key, used in (('rerank_score', rerank), ('fused_score', query)) if used]
+                    score_key = next((key for key in score_keys
+                                      if any(key in candidate.metadata for candidate in candidates)), None)
+                    relevance = [candidate.metadata.get(score_key) if score_key else candidate.score
+                                 for candidate in candidates]
+                    with stage("mmr"):
+                        candidates = mmr_select(embedding, candidates, k, per_discussion_cap=cap,
+                                                relevance=relevance)
+                if parent_documents:
+                    return self._collapse_to_parents(candidates, k)
+                return self._to_results(candidates[:k])
+            except Exception as e:
+                log_error("search_failed", e, competition_id=competition_id)
+                return []
             
         try:
-            print("🔄 Using direct Pinecone query...")
-            complete_results = self.index.query(
-                vector=embedding,
-                top_k=k,
-                filter={
-                    "competition_id": competition_id,
-                    "type": "discussion",
-                    "chunk_type": "complete_discussion"  # Prioritize whole discussions
-
-                },
-                include_metadata=True,
-                include_values=False
-            )
-            print("Results:", complete_results)
-            if len(complete_results.matches) >= k:
-                return self._convert_pinecone_to_documents(complete_results.matches[:k])
-            
-            # Otherwise, supplement with discussion parts
-            partial_results = self.index.query(
+            # Best chunks by score alone, whether or not their discussion fits in one chunk
+            namespace, search_filter = target.discussion_scope(competition_id)
+            results = self._query(
+                target,
+                namespace=namespace,
                 vector=embedding,
                 top_k=k,
-                filter={
-                    "competition_id": competition_id,
-                    "type": "discussion"
-                },
+                filter=search_filter,
                 include_metadata=True
             )
-            
-            return self._convert_pinecone_to_documents(partial_results.matches)
+            return self._to_results(results.matches)
             
         except Exception as e:
-            print(f"❌ Error searching Pinecone: {str(e)}")
-            import traceback
-            print(f"❌ Full traceback: {traceback.format_exc()}")
+            log_error("search_failed", e, competition_id=competition_id)
             return []
 
-    def _convert_pinecone_to_documents(self, pinecone_matches):
+    def _dense_candidates(self, target: IndexTarget, embedding: list[float], competition_id: str, top_k: int,
+                          include_values: bool = False) -> list:
+        """Best-first discussion chunk matches for an embedding"""
+        namespace, search_filter = target.discussion_scope(competition_id)
+        results = self._query(
+            target,
+            namespace=namespace,
+            vector=embedding,
+            top_k=top_k,
+            filter=search_filter,
+            include_metadata=True,
+            include_values=include_values
+        )
+        return [
+            Candidate(match.id, match.score, match.metadata, match.values if include_values else None)
+            for match in results.matches
+        ]
 
-        docs = []
-        for match in pinecone_matches:
-            # Get the text content from metadata (this is how we stored it)
-            page_content = match.metadata.get('text', '')
-            
-            # Create metadata without the text field
-            metadata = {k: v for k, v in match.metadata.items() if k != 'text'}
-            metadata['score'] = match.score  # Add similarity score
-            
-            docs.append(Document(
-                page_content=page_content,
-                metadata=metadata
-            ))
+    def _hybrid_candidates(self, target: IndexTarget, embedding: list[float], competition_id: str, query: str,
+                           top_k: int, include_values: bool = False) -> list:
+        """Dense and BM25 candidates merged with reciprocal-rank fusion"""
+        dense = self._dense_candidates(target, embedding, competition_id, top_k, include_values)
+        with stage("keyword_search"):
+            keyword_hits = keyword_index_service.search(competition_id, query, top_k)
+        if not keyword_hits:
+            return dense
+        
+        by_id = {candidate.id: candidate for candidate in dense}
+        keyword_scores = dict(keyword_hits)
+        fused_scores = reciprocal_rank_fusion_scores(list(by_id), [vector_id for vector_id, _ in keyword_hits])
+        fused_ids = sorted(fused_scores, key=fused_scores.get, reverse=True)[:top_k]
+        
+        # Keyword-only hits have no metadata yet: fetch them from Pinecone in one call
+        missing = [vector_id for vector_id in fused_ids if vector_id not in by_id]
+        if missing:
+            fetched = self._fetch(target, missing, namespace=target.discussion_scope(competition_id)[0]).vectors
+            for vector_id in missing:
+                if vector_id in fetched:
+                    vector = fetched[vector_id]
+                    by_id[vector_id] = Candidate(vector_id, None, vector.metadata or {},
+                                                 vector.values if include_values else None)
         
+        candidates = []
+        for vector_id in fused_ids:
+            candidate = by_id.get(vector_id)
+            if candidate:
+                # Each candidate owns its match's metadata dict, so annotate it in place
+                if vector_id in keyword_scores:
+                    candidate.metadata['keyword_score'] = keyword_scores[vector_id]
+                candidate.metadata['fused_score'] = fused_scores[vector_id]
+                candidates.append(candidate)
+        return candidates
+
+    def _collapse_to_parents(self, candidates: list, k: int) -> list[SearchResult]:
+        """Collapse best-first chunk candidates by parent discussion and return their parents.
+
+        A parent longer than PARENT_MAX_CHARS is trimmed to a window around its best
+        chunk; the chunk text itself is never returned alongside it.
+        """
+        # The first hit per parent is its best one; count every hit before keeping the first k parents
+        best_by_parent = {}
+        hits_by_parent = {}
+        for candidate in candidates:
+            parent_id = candidate.metadata.get('parent_id') or candidate.metadata.get('id')
+            hits_by_parent[parent_id] = hits_by_parent.get(parent_id, 0) + 1
+            if parent_id not in best_by_parent:
+                best_by_parent[parent_id] = candidate
+        best_by_parent = dict(list(best_by_parent.items())[:k])
+        
+        with stage("doc_store"):
+            parents = doc_store.get_many(list(best_by_parent))
+        
+        docs = []
+        for parent_id, candidate in best_by_parent.items():
+            metadata = candidate.metadata
+            chunk_text = metadata.pop('text', '')
+            # Fall back to the matched chunk if the parent body is unavailable
+            parent = parents.get(parent_id)
+            content, truncated = parent_excerpt(parent, chunk_text, PARENT_MAX_CHARS) if parent else (chunk_text, False)
+            metadata.update({
+                'score': candidate.score,
+                'parent_id': parent_id,
+                'matched_chunks': hits_by_parent[parent_id],
+                'parent_truncated': truncated,
+            })
+            docs.append(SearchResult(content, metadata))
         return docs
+
+    def _to_results(self, pinecone_matches) -> list[SearchResult]:
+        """Wrap matches without copying: each match's metadata dict becomes the result's"""
+        results = []
+        with stage("convert"):
+            for match in pinecone_matches:
+                # The text is stored in metadata; move it out instead of rebuilding the dict
+                metadata = match.metadata
+                content = metadata.pop('text', '')
+                metadata['score'] = match.score  # Add similarity score
+                results.append(SearchResult(content, metadata))
+        return results
     
-    def search_competitions(self, query: str, k: int = 4) -> list:
+    def search_competitions(self, query: str, k: int = 4) -> list[SearchResult]:
         """Search for relevant competitions by text query"""
         try:
-            results = self.vector_store.similarity_search(
-                query=query,
-                k=k,
-                filter={"type": "competition"}
-            )
-            return results
+            return self._search_text(query, k, {"type": "competition"})
         except Exception as e:
-            print(f"❌ Error searching competitions: {str(e)}")
+            log_error("search_competitions_failed", e)
             return []
     
-    def search_discussions(self, query: str, competition_id: str = None, k: int = 4) -> list:
-        """Search for relevant discussions by text query"""
+    def search_discussions(self, query: str, competition_id: str = None, k: int = 4) -> list[SearchResult]:
+        """Search for relevant discussions by text query, in one competition or across all of them"""
         try:
-            search_filter = {"type": "discussion"}
+            embedding = self.embed_query(query)
+            target = self._current_target()
             if competition_id:
-                search_filter["competition_id"] = competition_id
-            
-            results = self.vector_store.similarity_search(
-                query=query,
-                k=k,
-                filter=search_filter
-            )
-            return results
+                namespace, search_filter = target.discussion_scope(competition_id)
+                matches = self._query(target, namespace=namespace, vector=embedding, top_k=k,
+                                      filter=search_filter, include_metadata=True).matches
+            elif target.layout == LAYOUT_PER_COMPETITION:
+                matches = self._query_competition_namespaces(target, embedding, k)
+            else:
+                matches = self._query(target, vector=embedding, top_k=k, filter={"type": "discussion"},
+                                      include_metadata=True).matches
+            return self._to_results(matches)
         except Exception as e:
-            print(f"❌ Error searching discussions: {str(e)}")
+            log_error("search_discussions_failed", e, competition_id=competition_id)
             return []
+    
+    def _query_competition_namespaces(self, target: IndexTarget, embedding: list[float], k: int) -> list:
+        """Unscoped discussion search in the per-competition layout: fan out over every competition namespace"""
+        prefix = f"{target.namespace}{COMPETITION_NAMESPACE_SEPARATOR}"
+        with stage("pinecone_stats"), self.pinecone_pool.track():
+            namespaces = [name for name in (target.index.describe_index_stats().namespaces or {})
+                          if name.startswith(prefix)]
+        if not namespaces:
+            return []
+        with stage("pinecone_query_namespaces"), self.pinecone_pool.track():
+            return target.index.query_namespaces(vector=embedding, namespaces=namespaces, metric="cosine",
+                                                 top_k=k, include_metadata=True).matches
+    
+    def _search_text(self, query: str, k: int, search_filter: dict) -> list[SearchResult]:
+        embedding = self.embed_query(query)
+        results = self._query(
+            self._current_target(),
+            vector=embedding,
+            top_k=k,
+            filter=search_filter,
+            include_metadata=True
+        )
+        return self._to_results(results.matches)
 
 
 # Singleton instance
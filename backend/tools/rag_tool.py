@@ -1,6 +1,19 @@
 from langchain_core.tools import tool
+from services.tracing import log_error
 from services.vector_store import vector_store_service
 
+
+def search(query: str, competition_id: str = None, k: int = 4) -> list:
+    """Discussions of one competition through the API's search path, or of every competition"""
+    if not competition_id:
+        return vector_store_service.search_discussions(query=query, k=k)
+    try:
+        embedding = vector_store_service.embed_query(query)
+    except Exception as e:
+        log_error("search_failed", e, competition_id=competition_id)
+        return []
+    return vector_store_service.search_by_embedding(embedding, competition_id, k=k)
+
 @tool
 def rag_tool(query: str, competition_id: str = None):
     """Search competition discussions using semantic similarity.
@@ -12,10 +25,7 @@ def rag_tool(query: str, competition_id: str = None):
     Returns:
         Formatted results with document content and source URLs
     """
-    if competition_id:
-        query_results = vector_store_service.search_discussions(query=query, competition_id=competition_id)
-    else:
-        query_results = vector_store_service.search_by_text(query=query)
+    query_results = search(query, competition_id)
     
     # Format results
     if not query_results:
@@ -27,7 +37,7 @@ def rag_tool(query: str, competition_id: str = None):
         doc_type = doc.metadata.get("type", "unknown")
         title = doc.metadata.get("title", "No title")
         
-        results.append(f"Document {i} [{doc_type.upper()}]: {title}\nContent: {doc.page_content[:300]}...\nSource URL: {url}")
+        results.append(f"Document {i} [{doc_type.upper()}]: {title}\nContent: {doc.content[:300]}...\nSource URL: {url}")
     
     return "\n\n".join(results)
 
@@ -39,10 +49,7 @@ class RAGTool:
     
     def search(self, query: str, competition_id: str = None, k: int = 4):
         """Search for relevant documents using the vector store"""
-        if competition_id:
-            return self.vector_store.search_discussions(query=query, competition_id=competition_id, k=k)
-        else:
-            return self.vector_store.search_by_text(query=query, k=k)
+        return search(query, competition_id, k)
     
     def search_competitions(self, query: str, k: int = 4):
         """Search for relevant competitions"""
@@ -14,11 +14,12 @@ export const ragTool = tool(
       console.log('🔍 RAG Tool: Backend URL:', backendUrl);
       const embedded_query = await embeddingService.embedText(query);
       console.log("Embedded Query", embedded_query)
-      const response = await fetch(`${backendUrl}/api/rag-search`, {
+      const response = await fetch(`${backendUrl}/api/rag-search?fields=content,url`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ 
           embedding: embedded_query, 
+          query, // Enables hybrid keyword + vector search on the backend
           competition_id: competition_id || null,
           k: 4 // Default number of results
         }),
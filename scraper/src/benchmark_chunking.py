@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark discussion chunking against the previous character-based pipeline.
+
+Reports long-discussion splitter throughput, the chunk-size distribution, and
+total chunks and embedded tokens for the whole discussion pipeline, on the
+longest discussions from a scraper backup dump, the local corpus archive or
+straight from Firestore:
+
+    python benchmark_chunking.py --input discussions_backup_20250101_000000.json
+    python benchmark_chunking.py --archive --top 200
+    python benchmark_chunking.py --firestore --top 200
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from chunking import count_tokens
+from pinecone_sync_service import PineconeSyncService
+
+
+def _legacy_paragraph_splitter():
+    """The character-based discussion_splitter used before token budgets"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200,
+                                          separators=["\n\n\n", "\n\n"], length_function=len)
+
+
+def legacy_split(text: str) -> List[str]:
+    """The pre-StructuralChunker splitter, kept here as the benchmark baseline"""
+    section_markers = ["\n\n**", "\n\n##", "\n\n1.", "\n\n-", "\nConclusion", "\nSummary", "\nUpdate:", "\nEdit:"]
+    for marker in section_markers:
+        if marker in text:
+            parts = text.split(marker)
+            chunks = []
+            current_chunk = parts[0]
+            for part in parts[1:]:
+                section = marker + part
+                if len(current_chunk) > 1500:
+                    chunks.append(current_chunk.strip())
+                    current_chunk = section
+                else:
+                    current_chunk += section
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+            return [chunk for chunk in chunks if len(chunk.strip()) > 100]
+
+    return _legacy_paragraph_splitter().split_text(text)
+
+
+def legacy_discussion_chunks(text: str) -> List[str]:
+    """The character-tiered chunking sync_discussions_to_pinecone used before token budgets"""
+    if len(text) <= 2000:
+        return [text]
+    if len(text) <= 4000:
+        return _legacy_paragraph_splitter().split_text(text)
+    return legacy_split(text)
+
+
+def load_discussions(args) -> List[Dict]:
+    """Load discussions and keep the longest ones"""
+    if args.firestore:
+        from google.cloud import firestore
+        docs = [doc.to_dict() for doc in firestore.Client().collection('discussions').stream()]
+    elif args.archive:
+        from corpus_archive import DISCUSSIONS, CorpusArchive
+        docs = CorpusArchive().latest(DISCUSSIONS).to_pylist()
+    else:
+        with open(args.input) as f:
+            docs = json.load(f)
+    docs.sort(key=lambda doc: len(doc.get('content') or ''), reverse=True)
+    return docs[:args.top]
+
+
+def percentiles(values: List[int]) -> Dict[str, float]:
+    """Summarize a size distribution"""
+    if len(values) < 2:
+        return {"count": len(values), "max": max(values, default=0)}
+    cuts = statistics.quantiles(values, n=100)
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 1),
+        "p50": cuts[49],
+        "p90": cuts[89],
+        "p99": cuts[98],
+        "max": max(values),
+    }
+
+
+def run(name: str, split: Callable[[str], List[str]], texts: List[str], repeat: int) -> Dict:
+    """Time a splitter over the corpus and describe the chunks it produces"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        chunks = [chunk for text in texts for chunk in split(text)]
+    elapsed = (time.perf_counter() - start) / repeat
+    total_chars = sum(len(text) for text in texts)
+    return {
+        "splitter": name,
+        "seconds": round(elapsed, 4),
+        "mb_per_second": round(total_chars / 1e6 / elapsed, 2) if elapsed else None,
+        "chunk_chars": percentiles([len(chunk) for chunk in chunks]),
+        "chunk_tokens": percentiles(count_tokens(chunks)),
+    }
+
+
+def embedding_cost(service: PineconeSyncService, discussions: List[Dict]) -> Dict:
+    """Chunks and embedded tokens for the whole discussion pipeline, before and after"""
+    legacy_chunks = [
+        chunk for disc in discussions
+        for chunk in legacy_discussion_chunks(service.prepare_discussion_docs_for_rag(disc)["text"])
+    ]
+    current_chunks = [doc.page_content for doc in service.build_discussion_documents(discussions)]
+    return {
+        "legacy": {"chunks": len(legacy_chunks), "embedded_tokens": sum(count_tokens(legacy_chunks))},
+        "token_budgeted": {"chunks": len(current_chunks), "embedded_tokens": sum(count_tokens(current_chunks))},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="JSON list of discussions (e.g. a discussions_backup_*.json dump)")
+    source.add_argument("--archive", action="store_true", help="Read the latest discussions from the local corpus archive")
+    source.add_argument("--firestore", action="store_true", help="Read discussions from Firestore")
+    parser.add_argument("--top", type=int, default=100, help="Number of longest discussions to benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Chunking only, no Pinecone/OpenAI/Firestore clients
+    service = PineconeSyncService(connect=False)
+    discussions = load_discussions(args)
+    texts = [service.prepare_discussion_docs_for_rag(disc)["text"] for disc in discussions]
+    print(f"📚 Benchmarking {len(texts)} discussions ({sum(map(len, texts))} chars)")
+
+    report = {
+        "long_discussion_splitter": [
+            run("legacy", legacy_split, texts, args.repeat),
+            run("structural", service.section_chunker.split_text, texts, args.repeat),
+        ],
+        "embedding_cost": embedding_cost(service, discussions),
+    }
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark competition-scoped queries: shared namespace with a metadata filter vs one namespace per competition.
+
+Builds a synthetic corpus on the in-memory index stand-in (local_pinecone.py)
+twice, once per layout (see index_alias.py), and runs the same scoped queries
+against both. Competition sizes follow a long-tailed distribution like the
+real corpus, and each competition's vectors cluster around its own centre.
+Reports latency percentiles, vectors scanned per query, the read units the
+serverless cost model would bill, and whether both layouts returned the same
+top-k ids:
+
+    python benchmark_namespaces.py
+    python benchmark_namespaces.py --competitions 500 --vectors 200000 --dimension 1536
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from index_alias import IndexTarget, LAYOUT_PER_COMPETITION, LAYOUT_SHARED
+from local_pinecone import LocalIndex
+
+# Serverless queries are billed by the size of the namespace they read: 1 read unit per GB, at least 0.25
+READ_UNITS_PER_GB = 1.0
+MIN_READ_UNITS = 0.25
+BASE_NAMESPACE = "benchmark"
+
+
+def competition_sizes(n_competitions: int, n_vectors: int, rng: np.random.RandomState) -> Dict[str, int]:
+    """Long-tailed vectors per competition: a few big competitions, many small ones"""
+    weights = rng.lognormal(mean=0.0, sigma=1.2, size=n_competitions)
+    sizes = np.maximum(1, np.round(weights / weights.sum() * n_vectors)).astype(int)
+    return {f"competition-{i:04d}": int(size) for i, size in enumerate(sizes)}
+
+
+def build_corpus(sizes: Dict[str, int], dimension: int, rng: np.random.RandomState) -> List[tuple]:
+    vectors = []
+    for competition_id, size in sizes.items():
+        centre = rng.normal(size=dimension)
+        for i in range(size):
+            values = centre + rng.normal(scale=1.5, size=dimension)
+            metadata = {
+                'type': 'discussion',
+                'id': f"{competition_id}-{i}",
+                'competition_id': competition_id,
+                'chunk_type': 'complete_discussion' if i % 3 else 'discussion_part',
+            }
+            vectors.append((f"discussion-{competition_id}-{i}", values.astype(np.float32), metadata))
+    return vectors
+
+
+def load(index: LocalIndex, target: IndexTarget, vectors: List[tuple], batch_size: int = 1000):
+    by_namespace: Dict[str, List[tuple]] = {}
+    for vector in vectors:
+        by_namespace.setdefault(target.namespace_for(vector[2]['type'], vector[2]['competition_id']), []).append(vector)
+    for namespace, namespace_vectors in by_namespace.items():
+        for i in range(0, len(namespace_vectors), batch_size):
+            index.upsert(vectors=namespace_vectors[i:i + batch_size], namespace=namespace)
+
+
+def scoped_query(index: LocalIndex, target: IndexTarget, embedding: np.ndarray, competition_id: str, k: int):
+    """The search_by_embedding query for one competition in the target's layout"""
+    namespace = target.namespace_for('discussion', competition_id)
+    search_filter = None
+    if target.layout == LAYOUT_SHARED:
+        search_filter = {"competition_id": competition_id, "type": "discussion"}
+    return index.query(vector=embedding, top_k=k, namespace=namespace, filter=search_filter, include_metadata=True)
+
+
+def run(index: LocalIndex, target: IndexTarget, queries: List[tuple], k: int, bytes_per_vector: int) -> Dict:
+    stats = index.describe_index_stats()
+    # Build the lazy matrices and metadata columns first, as a warm index would have them
+    for competition_id in {competition_id for _, competition_id in queries}:
+        scoped_query(index, target, queries[0][0], competition_id, k)
+
+    latencies, scanned, read_units, results = [], [], [], []
+    for embedding, competition_id in queries:
+        start = time.perf_counter()
+        response = scoped_query(index, target, embedding, competition_id, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        namespace_size = stats.namespaces[target.namespace_for('discussion', competition_id)].vector_count
+        scanned.append(namespace_size)
+        read_units.append(max(MIN_READ_UNITS, namespace_size * bytes_per_vector / 1e9 * READ_UNITS_PER_GB))
+        results.append([match.id for match in response.matches])
+
+    latencies.sort()
+    return {
+        "layout": target.layout,
+        "namespaces": len(stats.namespaces),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 3),
+            "p95": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+            "mean": round(statistics.fmean(latencies), 3),
+        },
+        "vectors_scanned_per_query": round(statistics.fmean(scanned), 1),
+        "read_units_per_query": round(statistics.fmean(read_units), 4),
+        "_results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--competitions", type=int, default=200)
+    parser.add_argument("--vectors", type=int, default=50_000, help="Discussion chunks in the whole corpus")
+    parser.add_argument("--dimension", type=int, default=384, help="Embedding dimension (the sync uses 1536)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=16, help="top_k per query (search_by_embedding over-fetches 4k)")
+    parser.add_argument("--metadata-bytes", type=int, default=2_000,
+                        help="Metadata per vector, chunk text included, for the read-unit estimate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(args.seed)
+    sizes = competition_sizes(args.competitions, args.vectors, rng)
+    vectors = build_corpus(sizes, args.dimension, rng)
+    competition_ids = list(sizes)
+    # Every competition is equally likely to be searched, whatever its size
+    queries = [
+        (rng.normal(size=args.dimension).astype(np.float32), competition_ids[rng.randint(len(competition_ids))])
+        for _ in range(args.queries)
+    ]
+    print(f"📚 {len(vectors)} vectors in {len(sizes)} competitions "
+          f"(largest {max(sizes.values())}, median {int(statistics.median(sizes.values()))}), {len(queries)} queries")
+
+    bytes_per_vector = args.dimension * 4 + args.metadata_bytes
+    reports = []
+    for layout in (LAYOUT_SHARED, LAYOUT_PER_COMPETITION):
+        target = IndexTarget(namespace=BASE_NAMESPACE, layout=layout)
+        index = LocalIndex(args.dimension)
+        start = time.perf_counter()
+        load(index, target, vectors)
+        print(f"  {layout}: loaded in {time.perf_counter() - start:.1f}s")
+        reports.append(run(index, target, queries, args.k, bytes_per_vector))
+
+    shared, per_competition = reports
+    same = sum(a == b for a, b in zip(shared.pop("_results"), per_competition.pop("_results")))
+    print(json.dumps({
+        "corpus": {"vectors": len(vectors), "competitions": len(sizes), "dimension": args.dimension, "k": args.k},
+        "layouts": reports,
+        "speedup_p50": round(shared["latency_ms"]["p50"] / per_competition["latency_ms"]["p50"], 1),
+        "read_unit_ratio": round(shared["read_units_per_query"] / per_competition["read_units_per_query"], 1),
+        "identical_top_k": f"{same}/{len(queries)}",
+    }, indent=2))
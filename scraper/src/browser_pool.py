@@ -0,0 +1,168 @@
+"""
+Chromium pages with a bounded memory footprint for long scrapes.
+
+Pages are opened from a shared browser context that is replaced after
+BROWSER_MAX_NAVIGATIONS main-frame navigations. The resident memory of the
+Chromium processes is sampled whenever a page is opened; above
+BROWSER_MAX_RSS_MB the whole browser is relaunched as soon as no page is
+open (until then only the context is replaced). Pages are always closed when
+their `async with` block exits, and a replaced context is closed with its
+last page. Peak memory goes into the run profile.
+
+Memory is read from /proc, so the RSS limit and memory peaks are only
+available on Linux; navigation-based recycling works everywhere.
+"""
+import os
+import resource
+import sys
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from profiling import run_profile
+
+# Main-frame navigations (gotos and pagination clicks) per browser context
+BROWSER_MAX_NAVIGATIONS = int(os.environ.get("BROWSER_MAX_NAVIGATIONS", 100))
+# Resident memory of the browser processes that triggers a relaunch; 0 disables the check
+BROWSER_MAX_RSS_MB = float(os.environ.get("BROWSER_MAX_RSS_MB", 1500))
+
+_PAGE_SIZE_MB = os.sysconf("SC_PAGE_SIZE") / 2**20 if hasattr(os, "sysconf") else 0
+
+
+def child_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Resident memory of all descendants of a process (the Playwright driver and Chromium), or None off Linux"""
+    if not os.path.isdir("/proc"):
+        return None
+    pid = pid or os.getpid()
+    children: Dict[int, list] = {}
+    rss_pages: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, so split after its closing parenthesis
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/statm") as f:
+                rss_pages[int(entry)] = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            # The process exited while we were reading
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, stack = 0, list(children.get(pid, []))
+    while stack:
+        child = stack.pop()
+        total += rss_pages.get(child, 0)
+        stack.extend(children.get(child, []))
+    return total * _PAGE_SIZE_MB
+
+
+def own_peak_rss_mb() -> float:
+    """Peak resident memory of this Python process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class _PooledContext:
+    def __init__(self, context):
+        self.context = context
+        self.navigations = 0
+        self.open_pages = 0
+        self.retired = False
+
+
+class BrowserPool:
+    """Launches Chromium and hands out pages that are closed and recycled automatically"""
+
+    def __init__(self, browser_type, max_navigations: int = BROWSER_MAX_NAVIGATIONS,
+                 max_rss_mb: float = BROWSER_MAX_RSS_MB, **launch_options):
+        self.browser_type = browser_type
+        self.launch_options = launch_options
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self.browser = None
+        self._current: Optional[_PooledContext] = None
+        self._open_pages = 0
+        self._navigations_since_launch = 0
+
+    async def start(self) -> "BrowserPool":
+        self.browser = await self.browser_type.launch(**self.launch_options)
+        self._navigations_since_launch = 0
+        return self
+
+    async def close(self):
+        self._sample_memory()
+        if self.browser:
+            await self.browser.close()
+            self.browser = None
+        self._current = None
+
+    async def __aenter__(self) -> "BrowserPool":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @asynccontextmanager
+    async def page(self):
+        """A new page in the current context, closed on exit whatever happens inside the block"""
+        await self._recycle_if_needed()
+        if self._current is None:
+            self._current = _PooledContext(await self.browser.new_context())
+            run_profile.count("browser_contexts")
+        pooled = self._current
+        page = await pooled.context.new_page()
+        pooled.open_pages += 1
+        self._open_pages += 1
+
+        def on_navigated(frame):
+            if frame.parent_frame is None:
+                pooled.navigations += 1
+                self._navigations_since_launch += 1
+
+        page.on("framenavigated", on_navigated)
+        try:
+            yield page
+        finally:
+            pooled.open_pages -= 1
+            self._open_pages -= 1
+            try:
+                await page.close()
+            finally:
+                if pooled.retired and pooled.open_pages == 0:
+                    await pooled.context.close()
+
+    async def _recycle_if_needed(self):
+        rss = self._sample_memory()
+        # A browser that has not navigated yet cannot shed memory by relaunching
+        if rss is not None and self.max_rss_mb and rss > self.max_rss_mb and self._navigations_since_launch:
+            if self._open_pages == 0:
+                print(f"Browser memory at {rss:.0f} MB; relaunching Chromium")
+                run_profile.count("browser_restarts")
+                await self.browser.close()
+                self._current = None
+                await self.start()
+                return
+            # A relaunch would close open pages; a fresh context is the most that can be freed now
+            if self._current and self._current.navigations:
+                await self._retire_current()
+        elif self._current and self._current.navigations >= self.max_navigations:
+            await self._retire_current()
+
+    async def _retire_current(self):
+        """New pages go to a fresh context; the old one is closed now, or with its last open page"""
+        if self._current is None:
+            return
+        run_profile.count("browser_contexts_recycled")
+        retired, self._current = self._current, None
+        retired.retired = True
+        if retired.open_pages == 0:
+            await retired.context.close()
+
+    def _sample_memory(self) -> Optional[float]:
+        rss = child_rss_mb()
+        if rss is not None:
+            run_profile.peak("browser_rss_mb", rss)
+        run_profile.peak("python_rss_mb", own_peak_rss_mb())
+        return rss
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Check the structural discussion chunker against golden fixtures.
+
+Each scraper/fixtures/chunking/<name>.txt is split with the settings below
+and compared with expected/<name>.json: headings and other section markers,
+markers inside code fences, a section longer than a whole chunk, the overlap
+between chunks and the hard maximum. Budgets are counted in word pieces
+rather than embedding tokens, so the fixtures stay small and do not depend on
+the tiktoken version; the packing is the same either way. Exits non-zero on
+any mismatch:
+
+    python check_chunking.py
+    python check_chunking.py --update    # rewrite the expected chunks after an intended change
+"""
+import argparse
+import json
+import os
+
+from chunking import StructuralChunker, split_sections, word_pieces
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "chunking")
+# Fixture name -> (max_tokens, overlap_tokens)
+FIXTURES = {
+    "headings": (40, 5),
+    "code_fence": (30, 5),
+    "oversized": (16, 4),
+    "unclosed_fence": (40, 5),
+}
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURE_DIR, f"{name}.txt")) as f:
+        return f.read()
+
+
+def expected_path(name: str) -> str:
+    return os.path.join(FIXTURE_DIR, "expected", f"{name}.json")
+
+
+def check(name: str, max_tokens: int, overlap_tokens: int, update: bool) -> bool:
+    text = read_fixture(name)
+    chunker = StructuralChunker(max_tokens, overlap_tokens)
+    result = {
+        "sections": len(split_sections(text)),
+        "chunks": chunker.split_text(text),
+    }
+    if update:
+        with open(expected_path(name), "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"📝 {name}: {result['sections']} sections, {len(result['chunks'])} chunks")
+        return True
+
+    with open(expected_path(name)) as f:
+        expected = json.load(f)
+    oversized = [len(word_pieces(chunk)) for chunk in result["chunks"] if len(word_pieces(chunk)) > max_tokens]
+    ok = result == expected and not oversized
+    print(f"{'✅' if ok else '❌'} {name}: {result['sections']} sections, {len(result['chunks'])} chunks "
+          f"(max {max_tokens}, overlap {overlap_tokens})")
+    if oversized:
+        print(f"  chunks over the hard maximum: {oversized}")
+    if result != expected:
+        print(json.dumps({"expected": expected, "got": result}, indent=2))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update", action="store_true", help="Write the current output as the expected chunks")
+    args = parser.parse_args()
+
+    ok = True
+    for name, (max_tokens, overlap_tokens) in FIXTURES.items():
+        ok &= check(name, max_tokens, overlap_tokens, args.update)
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Check the reindex lifecycle offline: run, verify, switch, rollback and drop.
+
+Drives reindex.py's own run/rollback/drop against the in-memory index
+stand-in (local_pinecone.py) and an in-memory Firestore holding the alias
+document and a small synthetic corpus. Only the per-competition rebuild is
+replaced: instead of chunking and embedding in worker processes, it upserts
+deterministic vectors for the same documents into the target's layout. Also
+checks that the alias is not switched when the new namespace holds fewer
+vectors than were written, or fewer than MIN_LIVE_RATIO of the live ones,
+and that backfill-related derives related competitions and top discussions
+from the live vectors alone. Exits non-zero on any failure:
+
+    python check_reindex.py
+"""
+import argparse
+import contextlib
+import zlib
+from collections import defaultdict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from unittest import mock
+
+import numpy as np
+
+import index_alias
+import reindex
+from index_alias import IndexTarget, read_alias, resolve_alias
+from keyword_index import KeywordIndex
+from local_pinecone import LocalPinecone
+
+DIMENSION = 8
+COMPETITIONS = 6
+DISCUSSIONS_PER_COMPETITION = 3
+CHUNKS_PER_DISCUSSION = 2
+SEEDED_AT = "2025-01-01T00:00:00+00:00"
+
+
+class _Snapshot:
+    def __init__(self, doc_id: str, data: Optional[dict]):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[dict]:
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field: str):
+        return self._data.get(field)
+
+
+class _DocumentRef:
+    def __init__(self, store: "MemoryFirestore", collection: str, doc_id: str):
+        self.store, self.collection, self.id = store, collection, doc_id
+
+    def get(self, transaction=None) -> _Snapshot:
+        return _Snapshot(self.id, self.store.collections[self.collection].get(self.id))
+
+    def set(self, data: dict, merge: bool = False):
+        docs = self.store.collections[self.collection]
+        docs[self.id] = {**docs.get(self.id, {}), **data} if merge else dict(data)
+
+    def update(self, fields: dict):
+        self.store.collections[self.collection][self.id].update(fields)
+
+
+class _Query:
+    def __init__(self, store: "MemoryFirestore", collection: str, conditions: tuple = ()):
+        self.store, self.collection, self.conditions = store, collection, conditions
+
+    def document(self, doc_id: str) -> _DocumentRef:
+        return _DocumentRef(self.store, self.collection, doc_id)
+
+    def where(self, field: str, op: str, value) -> "_Query":
+        return _Query(self.store, self.collection, self.conditions + ((field, op, value),))
+
+    def select(self, fields) -> "_Query":
+        return self
+
+    def stream(self):
+        for doc_id, data in list(self.store.collections[self.collection].items()):
+            if all(data.get(field) == value if op == '==' else data.get(field) is not None and data[field] >= value
+                   for field, op, value in self.conditions):
+                yield _Snapshot(doc_id, data)
+
+
+class _Batch:
+    def __init__(self):
+        self.writes = []
+
+    def set(self, ref: _DocumentRef, data: dict, merge: bool = False):
+        self.writes.append(lambda: ref.set(data, merge))
+
+    def update(self, ref: _DocumentRef, fields: dict):
+        self.writes.append(lambda: ref.update(fields))
+
+    def commit(self):
+        for write in self.writes:
+            write()
+
+
+class _Transaction:
+    """Writes immediately; the in-memory store has no concurrent writers"""
+
+    def set(self, ref: _DocumentRef, data: dict, merge: bool = False):
+        ref.set(data, merge)
+
+
+class MemoryFirestore:
+    """Firestore stand-in for the calls reindex makes: documents, ==/>= queries, batches and transactions"""
+
+    def __init__(self):
+        self.collections: Dict[str, Dict[str, dict]] = defaultdict(dict)
+
+    def collection(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def batch(self) -> _Batch:
+        return _Batch()
+
+    def transaction(self) -> _Transaction:
+        return _Transaction()
+
+    def get_all(self, refs: List[_DocumentRef]) -> List[_Snapshot]:
+        return [ref.get() for ref in refs]
+
+
+def seed_corpus(db: MemoryFirestore):
+    for c in range(COMPETITIONS):
+        competition_id = f"competition-{c:02d}"
+        db.collection('competitions').document(competition_id).set({
+            'title': f"Competition {c}", 'url': f"https://www.kaggle.com/c/{competition_id}", 'deadline': '',
+            'last_synced': SEEDED_AT,
+        })
+        for d in range(DISCUSSIONS_PER_COMPETITION):
+            db.collection('discussions').document(f"{c}{d:03d}").set({
+                'competition_id': competition_id, 'title': f"Solution {d}", 'medal_type': 'Gold',
+                'author_kaggle_rank': 'Master', 'upvotes': 10 * d, 'last_synced': SEEDED_AT,
+            })
+
+
+def _values(vector_id: str) -> List[float]:
+    return np.random.RandomState(zlib.crc32(vector_id.encode())).normal(size=DIMENSION).tolist()
+
+
+def competition_vectors(db: MemoryFirestore, competition_id: str) -> List[tuple]:
+    """(id, values, metadata) of one competition's chunks, with the sync's deterministic vector ids"""
+    vectors = []
+    snapshot = db.collection('competitions').document(competition_id).get()
+    if snapshot.exists:
+        data = snapshot.to_dict()
+        vectors.append((f"competition-{competition_id}-0", _values(competition_id), {
+            'type': 'competition', 'id': competition_id, 'competition_id': competition_id,
+            **{key: data.get(key, '') for key in ('title', 'url', 'deadline')},
+        }))
+    for doc in db.collection('discussions').where('competition_id', '==', competition_id).stream():
+        for chunk_index in range(CHUNKS_PER_DISCUSSION):
+            vector_id = f"discussion-{doc.id}-{chunk_index}"
+            vectors.append((vector_id, _values(vector_id), {
+                'type': 'discussion', 'id': doc.id, 'parent_id': doc.id, 'competition_id': competition_id,
+                'chunk_index': chunk_index, 'text': f"{doc.get('title')} part {chunk_index}",
+            }))
+    return vectors
+
+
+def upsert(index, target: IndexTarget, vectors: List[tuple]):
+    by_namespace = defaultdict(list)
+    for vector in vectors:
+        by_namespace[target.namespace_for(vector[2]['type'], vector[2]['competition_id'])].append(vector)
+    for namespace, namespace_vectors in by_namespace.items():
+        index.upsert(vectors=namespace_vectors, namespace=namespace)
+
+
+class LocalRebuild:
+    """Stands in for reindex.rebuild: same results, built in-process from the corpus without embeddings.
+
+    lose_vectors drops that many written vectors (a lost upsert). sync_during marks one
+    competition as synced to the old target while the first rebuild runs.
+    """
+
+    def __init__(self, db: MemoryFirestore, pc: LocalPinecone, lose_vectors: int = 0, sync_during: Optional[str] = None):
+        self.db, self.pc = db, pc
+        self.lose_vectors, self.sync_during = lose_vectors, sync_during
+        self.calls: List[List[str]] = []
+
+    def __call__(self, competition_ids, target: IndexTarget, workers: int = 1) -> List[reindex.CompetitionResult]:
+        competition_ids = list(competition_ids)
+        self.calls.append(competition_ids)
+        index = self.pc.Index(target.index_name)
+        results = []
+        for competition_id in competition_ids:
+            vectors = competition_vectors(self.db, competition_id)
+            upsert(index, target, vectors)
+            result = reindex.CompetitionResult(competition_id, vectors=len(vectors),
+                                               keyword_index=KeywordIndex(competition_id))
+            for vector_id, _, metadata in vectors:
+                if metadata['type'] == 'discussion':
+                    result.keyword_index.add(vector_id, metadata['parent_id'], metadata['text'])
+                else:
+                    result.chunk_ids.append(vector_id)
+                    result.info = {key: metadata[key] for key in ('title', 'url', 'deadline')}
+            results.append(result)
+
+        if self.lose_vectors:
+            lost = sorted(index.namespaces[target.namespace].records)[:self.lose_vectors]
+            index.delete(ids=lost, namespace=target.namespace)
+        if self.sync_during and len(self.calls) == 1:
+            self.db.collection('competitions').document(self.sync_during).update(
+                {'last_synced': datetime.now(timezone.utc).isoformat()})
+        return results
+
+
+class LocalSyncService:
+    """The parts of PineconeSyncService that reindex uses outside the rebuild"""
+
+    def __init__(self, db: MemoryFirestore, pc: LocalPinecone, target: IndexTarget):
+        self.db, self.pc, self.target = db, pc, target
+        self.namespace = target.namespace
+        self.pc.create_index(target.index_name, DIMENSION)
+        self.index = self.pc.Index(target.index_name)
+
+
+def setup():
+    """A live index in the default namespace holding the whole corpus, with no alias document yet"""
+    db, pc = MemoryFirestore(), LocalPinecone()
+    seed_corpus(db)
+    pc.create_index(index_alias.DEFAULT_INDEX_NAME, DIMENSION)
+    live = IndexTarget()
+    for snapshot in db.collection('competitions').stream():
+        upsert(pc.Index(live.index_name), live, competition_vectors(db, snapshot.id))
+    return db, pc
+
+
+@contextlib.contextmanager
+def offline(db: MemoryFirestore, pc: LocalPinecone, rebuild: LocalRebuild):
+    """Point reindex at the in-memory Firestore, index and rebuild"""
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.object(reindex, 'firestore', SimpleNamespace(Client=lambda: db)))
+        stack.enter_context(mock.patch.object(index_alias, 'firestore', SimpleNamespace(transactional=lambda fn: fn)))
+        stack.enter_context(mock.patch.object(reindex, 'PineconeSyncService',
+                                              lambda target: LocalSyncService(db, pc, target)))
+        stack.enter_context(mock.patch.object(reindex, 'rebuild', rebuild))
+        stack.enter_context(mock.patch.object(reindex, 'VERIFY_TIMEOUT_SECONDS', 0))
+        yield
+
+
+def counts(pc: LocalPinecone) -> Dict[str, int]:
+    stats = pc.Index(index_alias.DEFAULT_INDEX_NAME).describe_index_stats()
+    return {name: summary.vector_count for name, summary in stats.namespaces.items()}
+
+
+class Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def __call__(self, name: str, ok: bool, detail=None):
+        print(f"{'✅' if ok else '❌'} {name}" + (f" ({detail})" if detail is not None and not ok else ""))
+        self.failed += not ok
+
+
+def check_lifecycle(check: Checks):
+    """Full run into a per-competition layout, then rollback and drop"""
+    db, pc = setup()
+    live = IndexTarget()
+    total = counts(pc)['']
+    late_competition = "competition-03"
+    rebuild = LocalRebuild(db, pc, sync_during=late_competition)
+    with offline(db, pc, rebuild):
+        ok = reindex.run(workers=1, namespace="reindex-a", layout=index_alias.LAYOUT_PER_COMPETITION)
+        target = IndexTarget(index_alias.DEFAULT_INDEX_NAME, "reindex-a", index_alias.LAYOUT_PER_COMPETITION)
+        alias = read_alias(db)
+        check("run switches the alias to the verified target", ok and resolve_alias(db) == target, alias)
+        check("the alias keeps the live target as previous", IndexTarget.from_dict(alias.get('previous')) == live, alias)
+        check("the new target holds every vector", reindex.vector_count(pc.Index(target.index_name), target) == total,
+              counts(pc))
+        check("one namespace per competition", len(reindex.namespace_counts(pc.Index(target.index_name), target))
+              == COMPETITIONS + 1, counts(pc))
+        check("the old namespace keeps serving until dropped", counts(pc).get('') == total, counts(pc))
+        check("a competition synced during the rebuild is rebuilt after the switch",
+              rebuild.calls[1:] == [[late_competition]], rebuild.calls)
+        check("keyword indexes are rewritten from the new chunks",
+              len(db.collections['keyword_indexes']) == COMPETITIONS, sorted(db.collections['keyword_indexes']))
+        check("related competitions are rewritten from the new chunks",
+              len(db.collections['related_competitions']) == COMPETITIONS, sorted(db.collections['related_competitions']))
+
+        reindex.rollback(db)
+        alias = read_alias(db)
+        check("rollback points the alias at the previous target", resolve_alias(db) == live, alias)
+        check("rollback keeps the rolled-back target as previous",
+              IndexTarget.from_dict(alias.get('previous')) == target, alias)
+
+        with contextlib.suppress(SystemExit):
+            reindex.drop(db, pc, live.index_name, live.namespace)
+        check("drop refuses the live target", counts(pc).get('') == total, counts(pc))
+        with contextlib.suppress(SystemExit):
+            reindex.drop(db, pc, target.index_name, target.namespace)
+        check("drop refuses a target that was live within the grace period",
+              reindex.vector_count(pc.Index(target.index_name), target) == total, counts(pc))
+        with mock.patch.object(reindex, 'DROP_GRACE_SECONDS', 0):
+            reindex.drop(db, pc, target.index_name, target.namespace)
+        check("drop deletes the target and its competition namespaces", list(counts(pc)) == [''], counts(pc))
+
+
+def check_count_mismatch(check: Checks):
+    """Fewer vectors in the new target than were written"""
+    db, pc = setup()
+    with offline(db, pc, LocalRebuild(db, pc, lose_vectors=1)):
+        ok = reindex.run(workers=1, namespace="reindex-lost")
+    check("a count mismatch leaves the alias alone", not ok and not read_alias(db), read_alias(db))
+
+
+def check_live_ratio(check: Checks):
+    """A new target much smaller than the live one"""
+    db, pc = setup()
+    partial = ["competition-00", "competition-01"]
+    with offline(db, pc, LocalRebuild(db, pc)):
+        ok = reindex.run(workers=1, namespace="reindex-partial", competition_ids=partial)
+        check(f"under {reindex.MIN_LIVE_RATIO:.0%} of the live vectors leaves the alias alone",
+              not ok and not read_alias(db), read_alias(db))
+        ok = reindex.run(workers=1, namespace="reindex-forced", competition_ids=partial, force=True)
+        check("--force switches anyway", ok and resolve_alias(db).namespace == "reindex-forced", read_alias(db))
+
+
+def check_backfill(check: Checks):
+    """Related competitions and top discussions backfilled from the live vectors"""
+    db, pc = setup()
+    live = IndexTarget()
+    # A discussion that never made it into the index is not a top discussion
+    db.collection('discussions').document("9000").set({'competition_id': "competition-00", 'title': "Unsynced",
+                                                      'medal_type': 'Gold', 'upvotes': 10 ** 6})
+    reindex.backfill_related(db, pc.Index(live.index_name), live)
+    related = db.collections['related_competitions']
+    check("every indexed competition gets a related row",
+          len(related) == COMPETITIONS and all(len(row['related']) == COMPETITIONS - 1 for row in related.values()),
+          {competition_id: len(row['related']) for competition_id, row in related.items()})
+    check("centroids are stored with the competition's display fields",
+          db.collections['competition_centroids']["competition-00"].get('title') == "Competition 0")
+    top = db.collections['competition_top_discussions']
+    lists = {competition_id: [entry['id'] for entry in row['discussions']] for competition_id, row in top.items()}
+    check("every competition gets its indexed Gold discussions, most upvoted first",
+          len(lists) == COMPETITIONS and lists["competition-00"] == ["0002", "0001", "0000"], lists)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    check = Checks()
+    for scenario in (check_lifecycle, check_count_mismatch, check_live_ratio, check_backfill):
+        print(f"\n=== {scenario.__doc__}")
+        scenario(check)
+    print(f"\n{'✅ All checks passed' if not check.failed else f'❌ {check.failed} checks failed'}")
+    raise SystemExit(1 if check.failed else 0)
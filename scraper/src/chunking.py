@@ -0,0 +1,128 @@
+"""
+Structural chunking for long discussion text.
+
+Splits text once on every section marker, then packs whole sections into
+chunks by token count with a hard maximum and a fixed token overlap.
+Golden fixtures for the splitter are checked by check_chunking.py.
+"""
+import re
+from functools import lru_cache
+from typing import Callable, List, Sequence
+
+# Embedding model whose tokenizer chunk budgets are measured in
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Every boundary the old first-marker-wins splitter knew about, matched in a single pass
+SECTION_MARKER_PATTERN = re.compile(
+    r"\n\n(?:\*\*|##|1\.|-)"           # bold headers, markdown headers, numbered lists, bullets
+    r"|\n(?:Conclusion|Summary|Update:|Edit:)"
+)
+# Fenced code blocks as extract_content.js writes them (an unclosed fence runs to the end)
+CODE_FENCE_PATTERN = re.compile(r"^```.*?(?:^```|\Z)", re.MULTILINE | re.DOTALL)
+
+# Word pieces keep their leading whitespace, so "".join(pieces) == text
+_WORD_PIECE_PATTERN = re.compile(r"\s*\S+|\s+$")
+
+
+def word_pieces(text: str) -> List[str]:
+    """Split text into whitespace-prefixed word tokens that round-trip through "".join"""
+    return _WORD_PIECE_PATTERN.findall(text)
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model: str = EMBEDDING_MODEL):
+    """Load the tiktoken encoder for an embedding model once per process"""
+    import tiktoken
+    return tiktoken.encoding_for_model(model)
+
+
+def token_length(text: str) -> int:
+    """Number of embedding-model tokens in text (drop-in length_function for splitters)"""
+    return len(get_encoder().encode_ordinary(text))
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    """Token counts for many texts at once, encoded in parallel by tiktoken"""
+    return [len(tokens) for tokens in get_encoder().encode_ordinary_batch(texts)]
+
+
+def split_sections(text: str) -> List[str]:
+    """Split text at every section marker outside code fences; each marker starts the section it introduces"""
+    fences = [match.span() for match in CODE_FENCE_PATTERN.finditer(text)]
+    fence = 0
+    sections = []
+    start = 0
+    for match in SECTION_MARKER_PATTERN.finditer(text):
+        # Markers and fences both come in text order, so one pointer walks the fences
+        while fence < len(fences) and fences[fence][1] <= match.start():
+            fence += 1
+        if fence < len(fences) and fences[fence][0] <= match.start():
+            continue
+        if match.start() > start:
+            sections.append(text[start:match.start()])
+            start = match.start()
+    sections.append(text[start:])
+    return sections
+
+
+class StructuralChunker:
+    """Pack marker-delimited sections into chunks of at most max_tokens tokens.
+
+    Sections are kept whole whenever they fit. A section longer than max_tokens
+    is cut into hard windows. Consecutive chunks share overlap_tokens tokens.
+    Runs in time linear in the length of the text.
+    """
+
+    def __init__(self, max_tokens: int = 350, overlap_tokens: int = 35,
+                 encode: Callable[[str], Sequence] = word_pieces,
+                 decode: Callable[[Sequence], str] = "".join):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encode = encode
+        self.decode = decode
+
+    def split_text(self, text: str) -> List[str]:
+        """Split text into stripped, non-empty chunks"""
+        token_chunks = self.pack([self.encode(section) for section in split_sections(text)])
+        chunks = (self.decode(tokens).strip() for tokens in token_chunks)
+        return [chunk for chunk in chunks if chunk]
+
+    def pack(self, sections: List[Sequence]) -> List[list]:
+        """Greedily pack tokenized sections into overlapping token windows"""
+        max_tokens, overlap = self.max_tokens, self.overlap_tokens
+        chunks = []
+        current = []
+        fresh = 0  # tokens in current that are not overlap carried over from the previous chunk
+
+        for tokens in sections:
+            if fresh and len(current) + len(tokens) > max_tokens:
+                chunks.append(current)
+                # Carry the overlap, trimmed so a section that fits on its own still does
+                keep = min(overlap, max(max_tokens - len(tokens), 0))
+                current = current[len(current) - keep:] if keep else []
+                fresh = 0
+
+            offset = 0
+            # Only a section longer than a whole chunk gets here: cut hard windows
+            while len(current) + len(tokens) - offset > max_tokens:
+                take = max_tokens - len(current)
+                current.extend(tokens[offset:offset + take])
+                offset += take
+                chunks.append(current)
+                current = current[len(current) - overlap:] if overlap else []
+                fresh = 0
+
+            current.extend(tokens[offset:])
+            fresh += len(tokens) - offset
+
+        if fresh:
+            chunks.append(current)
+        return chunks
+
+
+def token_chunker(max_tokens: int, overlap_tokens: int) -> StructuralChunker:
+    """StructuralChunker that counts and cuts in embedding-model tokens"""
+    encoder = get_encoder()
+    return StructuralChunker(max_tokens, overlap_tokens, encode=encoder.encode_ordinary, decode=encoder.decode)
@@ -0,0 +1,237 @@
+"""
+Local Parquet archive of every scraped record, for offline reprocessing.
+
+Each run appends its competitions and discussions, with both the raw
+extracted text and the normalized text stored in Firestore, to a
+hive-partitioned Parquet dataset:
+
+    archive/<kind>/competition_id=<id>/run_date=<YYYY-MM-DD>/part-<run id>[-<writer>]-<n>.parquet
+
+A record is archived once per run that scraped it, so the archive keeps its
+history; `latest()` picks the most recent version of each record. Part file
+names never collide, so the per-run archives uploaded by CI can be unpacked
+into one directory. The reader
+streams Arrow record batches, so normalization, chunking and embedding
+experiments run against local disk instead of Firestore:
+
+    python corpus_archive.py stats
+    python corpus_archive.py backfill    # archive everything currently in Firestore
+
+    archive = CorpusArchive()
+    for batch in archive.iter_batches("discussions", competition_ids=["arc-prize-2025"], columns=["id", "raw_content"]):
+        ...
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+ARCHIVE_DIR = os.environ.get(
+    "CORPUS_ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "archive")
+)
+COMPETITIONS = "competitions"
+DISCUSSIONS = "discussions"
+# Buffered records per writer before a part file is written
+ARCHIVE_FLUSH_RECORDS = 500
+
+# Partition columns (competition_id, run_date) live in the directory names, not in the files
+SCHEMAS = {
+    COMPETITIONS: pa.schema([
+        ("id", pa.string()),
+        ("title", pa.string()),
+        ("url", pa.string()),
+        ("description", pa.string()),
+        ("raw_description", pa.string()),
+        ("evaluation", pa.string()),
+        ("raw_evaluation", pa.string()),
+        ("deadline", pa.string()),
+        ("start_time", pa.string()),
+        ("page_found", pa.int32()),
+        ("scraped_at", pa.string()),
+        ("run_id", pa.string()),
+    ]),
+    DISCUSSIONS: pa.schema([
+        ("id", pa.string()),
+        ("title", pa.string()),
+        ("url", pa.string()),
+        ("author", pa.string()),
+        ("content", pa.string()),
+        ("raw_content", pa.string()),
+        ("upvotes", pa.int64()),
+        ("post_date", pa.string()),
+        # An int rank, or strings such as "Unranked"
+        ("author_competition_rank", pa.string()),
+        ("author_kaggle_rank", pa.string()),
+        ("medal_type", pa.string()),
+        ("page_found", pa.int32()),
+        ("scraped_at", pa.string()),
+        ("run_id", pa.string()),
+    ]),
+}
+PARTITIONING = ds.partitioning(
+    pa.schema([("competition_id", pa.string()), ("run_date", pa.string())]), flavor="hive"
+)
+
+
+def _row(record: Dict, schema: pa.Schema) -> Dict:
+    row = {name: record.get(name) for name in schema.names}
+    for name in ("author_competition_rank", "author_kaggle_rank"):
+        if name in row and row[name] is not None:
+            row[name] = str(row[name])
+    return row
+
+
+class CorpusArchiveWriter:
+    """Buffers one run's records and writes them as Parquet part files"""
+
+    def __init__(self, started_at: Optional[datetime] = None, writer_id: Optional[str] = None, root: str = None):
+        started_at = started_at or datetime.now(timezone.utc)
+        self.root = root or ARCHIVE_DIR
+        self.run_id = started_at.strftime('%Y%m%dT%H%M%SZ')
+        self.run_date = started_at.date().isoformat()
+        self.writer_id = writer_id
+        self._buffers: Dict[str, Dict[str, List[Dict]]] = {kind: defaultdict(list) for kind in SCHEMAS}
+        self._buffered = 0
+        self._parts = 0
+        self.paths: List[str] = []
+
+    def add_competition(self, competition: Dict, raw_description: Optional[str] = None,
+                        raw_evaluation: Optional[str] = None):
+        self._add(COMPETITIONS, competition['id'], {
+            **competition, 'raw_description': raw_description, 'raw_evaluation': raw_evaluation,
+        })
+
+    def add_discussion(self, discussion: Dict, raw_content: Optional[str] = None):
+        self._add(DISCUSSIONS, discussion['competition_id'], {**discussion, 'raw_content': raw_content})
+
+    def _add(self, kind: str, competition_id: str, record: Dict):
+        self._buffers[kind][competition_id].append(_row({**record, 'run_id': self.run_id}, SCHEMAS[kind]))
+        self._buffered += 1
+        if self._buffered >= ARCHIVE_FLUSH_RECORDS:
+            self.flush()
+
+    def flush(self) -> List[str]:
+        """Write buffered records, one part file per kind and competition; returns the new paths"""
+        written = []
+        for kind, by_competition in self._buffers.items():
+            for competition_id, rows in by_competition.items():
+                directory = os.path.join(self.root, kind, f"competition_id={quote(competition_id, safe='')}",
+                                         f"run_date={self.run_date}")
+                os.makedirs(directory, exist_ok=True)
+                name = "-".join(filter(None, ["part", self.run_id, self.writer_id, str(self._parts)]))
+                path = os.path.join(directory, f"{name}.parquet")
+                pq.write_table(pa.Table.from_pylist(rows, schema=SCHEMAS[kind]), path, compression="zstd")
+                written.append(path)
+            by_competition.clear()
+        self._buffered = 0
+        self._parts += 1
+        self.paths.extend(written)
+        return written
+
+
+class CorpusArchive:
+    """Reads the archive as Arrow datasets"""
+
+    def __init__(self, root: str = None):
+        self.root = root or ARCHIVE_DIR
+
+    def dataset(self, kind: str) -> ds.Dataset:
+        path = os.path.join(self.root, kind)
+        if not os.path.isdir(path):
+            # An empty archive reads as no rows rather than an error
+            return ds.dataset(self.schema(kind).empty_table())
+        return ds.dataset(path, format="parquet", partitioning=PARTITIONING, schema=self.schema(kind))
+
+    @staticmethod
+    def schema(kind: str) -> pa.Schema:
+        return pa.unify_schemas([SCHEMAS[kind], PARTITIONING.schema])
+
+    def _filter(self, competition_ids: Optional[Iterable[str]], since: Optional[date], until: Optional[date]):
+        expression = None
+        conditions = []
+        if competition_ids is not None:
+            conditions.append(ds.field("competition_id").isin(list(competition_ids)))
+        # ISO dates compare correctly as strings
+        if since:
+            conditions.append(ds.field("run_date") >= since.isoformat())
+        if until:
+            conditions.append(ds.field("run_date") <= until.isoformat())
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def iter_batches(self, kind: str, competition_ids: Optional[Iterable[str]] = None, since: Optional[date] = None,
+                     until: Optional[date] = None, columns: Optional[List[str]] = None,
+                     batch_size: int = 1024) -> Iterator[pa.RecordBatch]:
+        """Stream record batches; partition filters prune whole directories before any file is opened"""
+        yield from self.dataset(kind).to_batches(
+            columns=columns, filter=self._filter(competition_ids, since, until), batch_size=batch_size,
+        )
+
+    def iter_records(self, kind: str, **filters) -> Iterator[Dict]:
+        """Records as dicts, e.g. to feed PineconeSyncService.build_discussion_documents"""
+        for batch in self.iter_batches(kind, **filters):
+            yield from batch.to_pylist()
+
+    def latest(self, kind: str, competition_ids: Optional[Iterable[str]] = None, since: Optional[date] = None,
+               until: Optional[date] = None, columns: Optional[List[str]] = None) -> pa.Table:
+        """The most recently scraped version of each record"""
+        read_columns = None if columns is None else list(dict.fromkeys([*columns, "id", "scraped_at"]))
+        table = self.dataset(kind).to_table(columns=read_columns, filter=self._filter(competition_ids, since, until))
+        if table.num_rows == 0:
+            return table if columns is None else table.select(columns)
+        table = table.take(pc.sort_indices(table, sort_keys=[("scraped_at", "descending")]))
+        seen, keep = set(), []
+        for position, record_id in enumerate(table.column("id").to_pylist()):
+            if record_id not in seen:
+                seen.add(record_id)
+                keep.append(position)
+        table = table.take(pa.array(keep, type=pa.int64()))
+        return table if columns is None else table.select(columns)
+
+    def stats(self) -> Dict:
+        result = {}
+        for kind in SCHEMAS:
+            dataset = self.dataset(kind)
+            table = dataset.to_table(columns=["competition_id", "run_date"])
+            files = getattr(dataset, "files", [])
+            result[kind] = {
+                "records": table.num_rows,
+                "competitions": len(pc.unique(table.column("competition_id"))) if table.num_rows else 0,
+                "run_dates": sorted(pc.unique(table.column("run_date")).to_pylist()) if table.num_rows else [],
+                "files": len(files),
+                "bytes": sum(os.path.getsize(path) for path in files),
+            }
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", help=f"Archive directory (default: CORPUS_ARCHIVE_DIR or {ARCHIVE_DIR})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Records, competitions, run dates and size per kind")
+    subparsers.add_parser("backfill", help="Archive the current Firestore competitions and discussions (no raw text)")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        from google.cloud import firestore
+        db = firestore.Client()
+        writer = CorpusArchiveWriter(writer_id="backfill", root=args.root)
+        for doc in db.collection(COMPETITIONS).stream():
+            writer.add_competition({**doc.to_dict(), "id": doc.id})
+        for doc in db.collection(DISCUSSIONS).stream():
+            discussion = {**doc.to_dict(), "id": doc.id}
+            if discussion.get("competition_id"):
+                writer.add_discussion(discussion)
+        writer.flush()
+        print(f"📦 Archived Firestore into {len(writer.paths)} files")
+    print(json.dumps(CorpusArchive(args.root).stats(), indent=2))
@@ -0,0 +1,232 @@
+"""
+Lease-based crawl frontier shared by scraper worker processes.
+
+Work items (a competition page, one page of a discussion listing, a
+discussion detail, the finalization of a listing) live in a SQLite file opened
+by every worker. A worker
+leases one item at a time. No other worker can take the item until the lease
+expires, which only happens when its worker died or stalled. Workers check
+that they still hold the lease (renew) before writing results, and completing
+an item needs a live lease too, so a worker that lost its lease drops its
+result instead of writing it twice. Keys are unique per kind, so enqueueing
+the same follow-up work twice is a no-op. Failed items are retried with
+exponential backoff up to FRONTIER_MAX_ATTEMPTS, then parked as "failed".
+
+Leasing also enforces a minimum interval between requests to each host across
+all workers: an item is only handed out once its host's next slot has come.
+Bookkeeping items without a URL load no page and are not rate limited. An item
+that cannot run yet is deferred, which puts it back without using an attempt.
+
+SQLite locking is only reliable on a local disk, so workers share one
+machine. Spreading them across machines needs the same interface over a
+networked store.
+"""
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+DEFAULT_FRONTIER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "frontier.sqlite3")
+# A lease is lost if the worker does not finish or renew it in time
+FRONTIER_LEASE_SECONDS = float(os.environ.get("FRONTIER_LEASE_SECONDS", 300))
+FRONTIER_MAX_ATTEMPTS = int(os.environ.get("FRONTIER_MAX_ATTEMPTS", 4))
+# Retry delays are FRONTIER_RETRY_BASE_DELAY * 2 ** (attempt - 1) seconds
+FRONTIER_RETRY_BASE_DELAY = 30.0
+# Minimum seconds between two requests to one host, across all workers
+FRONTIER_HOST_INTERVAL_SECONDS = float(os.environ.get("FRONTIER_HOST_INTERVAL_SECONDS", 5))
+
+# Work item kinds, in the order a competition is crawled
+COMPETITION = "competition"
+DISCUSSION_LIST = "discussion_list"
+DISCUSSION_DETAIL = "discussion_detail"
+DISCUSSION_FINALIZE = "discussion_finalize"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    url TEXT NOT NULL,
+    host TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority REAL NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    last_error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (kind, key)
+);
+CREATE INDEX IF NOT EXISTS work_items_ready ON work_items (status, not_before, priority);
+CREATE TABLE IF NOT EXISTS host_slots (
+    host TEXT PRIMARY KEY,
+    next_request_at REAL NOT NULL
+);
+"""
+
+
+@dataclass(slots=True)
+class WorkItem:
+    id: int
+    kind: str
+    key: str
+    url: str
+    payload: Dict
+    attempts: int
+
+
+class CrawlFrontier:
+    """Work items with leases, retries and per-host rate limits in one SQLite file"""
+
+    def __init__(self, path: str = None, lease_seconds: float = FRONTIER_LEASE_SECONDS,
+                 max_attempts: int = FRONTIER_MAX_ATTEMPTS, host_interval_seconds: float = FRONTIER_HOST_INTERVAL_SECONDS):
+        self.path = path or os.environ.get("FRONTIER_PATH", DEFAULT_FRONTIER_PATH)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.host_interval_seconds = host_interval_seconds
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Transactions are managed explicitly; BEGIN IMMEDIATE serializes leasing across processes
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def enqueue(self, kind: str, key: str, url: str, payload: Dict = None, priority: float = 0) -> bool:
+        """Add a work item; False if (kind, key) is already queued, so producers can enqueue idempotently"""
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO work_items (kind, key, url, host, payload, priority, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (kind, key, url, urlparse(url).netloc, json.dumps(payload or {}), priority, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def lease(self, worker_id: str, kinds: Iterable[str] = None) -> Optional[WorkItem]:
+        """Lease the highest-priority ready item whose host may be requested now, or None"""
+        now = time.time()
+        kinds = list(kinds or ())
+        kind_filter = f"AND kind IN ({','.join('?' * len(kinds))})" if kinds else ""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Pending items, and leased items whose worker let the lease expire
+            row = self._conn.execute(
+                f"""SELECT id, kind, key, url, host, payload, attempts FROM work_items
+                    WHERE (status = 'pending' OR (status = 'leased' AND lease_expires_at < ?))
+                      AND not_before <= ? {kind_filter}
+                      AND host NOT IN (SELECT host FROM host_slots WHERE next_request_at > ?)
+                    ORDER BY priority DESC, id
+                    LIMIT 1""",
+                [now, now, *kinds, now],
+            ).fetchone()
+            if row is None:
+                self._conn.execute("COMMIT")
+                return None
+            item_id, kind, key, url, host, payload, attempts = row
+            self._conn.execute(
+                """UPDATE work_items SET status = 'leased', lease_owner = ?, lease_expires_at = ?,
+                       attempts = attempts + 1, updated_at = ? WHERE id = ?""",
+                (worker_id, now + self.lease_seconds, now, item_id),
+            )
+            if host:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO host_slots (host, next_request_at) VALUES (?, ?)",
+                    (host, now + self.host_interval_seconds),
+                )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return WorkItem(item_id, kind, key, url, json.loads(payload), attempts + 1)
+
+    def renew(self, item: WorkItem, worker_id: str) -> bool:
+        """Extend a lease this worker still holds"""
+        now = time.time()
+        cursor = self._conn.execute(
+            """UPDATE work_items SET lease_expires_at = ?, updated_at = ?
+               WHERE id = ? AND status = 'leased' AND lease_owner = ? AND lease_expires_at >= ?""",
+            (now + self.lease_seconds, now, item.id, worker_id, now),
+        )
+        return cursor.rowcount > 0
+
+    def complete(self, item: WorkItem, worker_id: str) -> bool:
+        """Mark an item done; False if the lease was lost and another worker may own the item"""
+        now = time.time()
+        cursor = self._conn.execute(
+            """UPDATE work_items SET status = 'done', lease_owner = NULL, lease_expires_at = NULL, last_error = NULL,
+                   updated_at = ?
+               WHERE id = ? AND status = 'leased' AND lease_owner = ? AND lease_expires_at >= ?""",
+            (now, item.id, worker_id, now),
+        )
+        return cursor.rowcount > 0
+
+    def fail(self, item: WorkItem, worker_id: str, error: str) -> str:
+        """Schedule a retry with backoff, or park the item as failed after max_attempts; returns the new status"""
+        now = time.time()
+        if item.attempts >= self.max_attempts:
+            status, not_before = "failed", 0
+        else:
+            status, not_before = "pending", now + FRONTIER_RETRY_BASE_DELAY * 2 ** (item.attempts - 1)
+        self._conn.execute(
+            """UPDATE work_items SET status = ?, not_before = ?, lease_owner = NULL, lease_expires_at = NULL,
+                   last_error = ?, updated_at = ?
+               WHERE id = ? AND status = 'leased' AND lease_owner = ?""",
+            (status, not_before, error[:2000], now, item.id, worker_id),
+        )
+        return status
+
+    def defer(self, item: WorkItem, worker_id: str, seconds: float) -> bool:
+        """Put a leased item back for later without counting the attempt; False if the lease was lost"""
+        now = time.time()
+        cursor = self._conn.execute(
+            """UPDATE work_items SET status = 'pending', not_before = ?, attempts = attempts - 1, lease_owner = NULL,
+                   lease_expires_at = NULL, updated_at = ?
+               WHERE id = ? AND status = 'leased' AND lease_owner = ? AND lease_expires_at >= ?""",
+            (now + seconds, now, item.id, worker_id, now),
+        )
+        return cursor.rowcount > 0
+
+    def delay_host(self, url: str, seconds: float):
+        """Hold back every request to the URL's host for a while, e.g. after a 429 response"""
+        self._conn.execute(
+            """INSERT INTO host_slots (host, next_request_at) VALUES (?, ?)
+               ON CONFLICT (host) DO UPDATE SET next_request_at = MAX(next_request_at, excluded.next_request_at)""",
+            (urlparse(url).netloc, time.time() + seconds),
+        )
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Item counts per kind and status"""
+        counts = {}
+        for kind, status, count in self._conn.execute("SELECT kind, status, COUNT(*) FROM work_items GROUP BY kind, status"):
+            counts.setdefault(kind, {})[status] = count
+        return counts
+
+    def statuses(self, kind: str, keys: Iterable[str]) -> Dict[str, int]:
+        """Counts per status of the given items of one kind; keys not in the frontier are not counted"""
+        keys = list(keys)
+        counts = {}
+        # Stays under SQLite's limit on query parameters
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            for status, count in self._conn.execute(
+                f"SELECT status, COUNT(*) FROM work_items WHERE kind = ? AND key IN ({','.join('?' * len(batch))}) GROUP BY status",
+                [kind, *batch],
+            ):
+                counts[status] = counts.get(status, 0) + count
+        return counts
+
+    def pending(self) -> int:
+        """Items not finished yet (pending, waiting for a retry, or leased)"""
+        return self._conn.execute("SELECT COUNT(*) FROM work_items WHERE status IN ('pending', 'leased')").fetchone()[0]
+
+    def purge_finished(self, max_age_seconds: float) -> int:
+        """Delete done and failed items last touched more than max_age_seconds ago"""
+        cursor = self._conn.execute(
+            "DELETE FROM work_items WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - max_age_seconds,),
+        )
+        return cursor.rowcount
@@ -0,0 +1,116 @@
+"""
+Per-competition crawl state for incremental discussion crawls.
+
+Each run walks a competition's discussions newest-first and stops at the first
+post at or before the competition's watermark (the newest post date seen by a
+previous run). Vote counts of older discussions change without new posts, so
+a vote-sorted sweep refreshes them at a much lower frequency. The state lives
+in the Firestore `crawl_state` collection and is only written after the
+scraped discussions, so a failed run never advances a watermark.
+
+It also keeps smoothed change rates (new posts and re-voted discussions per
+hour) and the deadline, which refresh_scheduler.py turns into a per-competition
+refresh interval.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+CRAWL_STATE_COLLECTION = 'crawl_state'
+# Hours between vote-sorted sweeps of one competition
+VOTE_SWEEP_INTERVAL_HOURS = float(os.environ.get('VOTE_SWEEP_INTERVAL_HOURS', 24))
+# Weight of the latest crawl in the smoothed change rates
+RATE_SMOOTHING = 0.3
+
+
+class CrawlState:
+    """Watermark, crawl times and change rates of one competition; datetimes are UTC ISO 8601 strings"""
+
+    def __init__(self, competition_id: str, discussions_watermark: Optional[str] = None,
+                 last_vote_sweep: Optional[str] = None, last_crawled_at: Optional[str] = None,
+                 new_posts_per_hour: Optional[float] = None, vote_churn_per_hour: Optional[float] = None,
+                 deadline: Optional[str] = None):
+        self.competition_id = competition_id
+        self.discussions_watermark = discussions_watermark
+        self.last_vote_sweep = last_vote_sweep
+        self.last_crawled_at = last_crawled_at
+        self.new_posts_per_hour = new_posts_per_hour
+        self.vote_churn_per_hour = vote_churn_per_hour
+        self.deadline = deadline
+
+    def is_new(self, posted_at: str, fallback_watermark: Optional[str] = None) -> bool:
+        """True if a post is newer than the watermark; competitions without one use the fallback"""
+        watermark = self.discussions_watermark or fallback_watermark
+        return watermark is None or _parse(posted_at) > _parse(watermark)
+
+    def advance(self, posted_at: Optional[str]):
+        """Move the watermark forward to a newer post date seen in this run"""
+        if posted_at and (self.discussions_watermark is None or _parse(posted_at) > _parse(self.discussions_watermark)):
+            self.discussions_watermark = posted_at
+
+    def vote_sweep_due(self, now: Optional[datetime] = None) -> bool:
+        if self.last_vote_sweep is None:
+            return True
+        now = now or datetime.now(timezone.utc)
+        return now - _parse(self.last_vote_sweep) >= timedelta(hours=VOTE_SWEEP_INTERVAL_HOURS)
+
+    def record_crawl(self, new_posts: int, now: Optional[datetime] = None):
+        """Update the new-post rate after a newest-first crawl found new_posts posts past the watermark.
+
+        The first crawl has no interval to divide by, so it only sets the crawl time.
+        """
+        now = now or datetime.now(timezone.utc)
+        if self.last_crawled_at:
+            hours = (now - _parse(self.last_crawled_at)).total_seconds() / 3600
+            if hours > 0:
+                self.new_posts_per_hour = _smooth(self.new_posts_per_hour, new_posts / hours)
+        self.last_crawled_at = now.isoformat()
+
+    def record_vote_sweep(self, vote_changes: int, now: Optional[datetime] = None):
+        """Update the vote churn rate after a sweep found vote_changes re-voted discussions"""
+        now = now or datetime.now(timezone.utc)
+        if self.last_vote_sweep:
+            hours = (now - _parse(self.last_vote_sweep)).total_seconds() / 3600
+            if hours > 0:
+                self.vote_churn_per_hour = _smooth(self.vote_churn_per_hour, vote_changes / hours)
+        self.last_vote_sweep = now.isoformat()
+
+    def to_dict(self) -> Dict:
+        return {
+            'discussions_watermark': self.discussions_watermark,
+            'last_vote_sweep': self.last_vote_sweep,
+            'last_crawled_at': self.last_crawled_at,
+            'new_posts_per_hour': self.new_posts_per_hour,
+            'vote_churn_per_hour': self.vote_churn_per_hour,
+            'deadline': self.deadline,
+        }
+
+    @classmethod
+    def from_dict(cls, competition_id: str, data: Dict) -> "CrawlState":
+        return cls(competition_id, data.get('discussions_watermark'), data.get('last_vote_sweep'),
+                   data.get('last_crawled_at'), data.get('new_posts_per_hour'), data.get('vote_churn_per_hour'),
+                   data.get('deadline'))
+
+    @classmethod
+    def load_all(cls, db) -> Dict[str, "CrawlState"]:
+        return {doc.id: cls.from_dict(doc.id, doc.to_dict()) for doc in db.collection(CRAWL_STATE_COLLECTION).stream()}
+
+    def add_to_batch(self, db, batch):
+        batch.set(db.collection(CRAWL_STATE_COLLECTION).document(self.competition_id), self.to_dict())
+
+
+def _smooth(previous: Optional[float], latest: float) -> float:
+    return latest if previous is None else RATE_SMOOTHING * latest + (1 - RATE_SMOOTHING) * previous
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Lenient parse for stored values such as deadlines, which may be "Indefinite" or an error string"""
+    try:
+        return _parse(value) if value else None
+    except ValueError:
+        return None
+
+
+def _parse(iso: str) -> datetime:
+    parsed = datetime.fromisoformat(iso.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Scrape Kaggle with several worker processes sharing one crawl frontier.
+
+`seed` walks the active competition listing and queues the competitions the
+refresh scheduler finds due. Each `work` process then leases items from the
+frontier until none are left: a competition item scrapes the competition page
+and queues the first page of its discussion listings, a listing item queues
+the next page and the discussions worth scraping, and a detail item scrapes
+one discussion. The last page of a listing queues a finalize item, which
+waits for the discussions the listing queued and then updates crawl_state. Every item loads one page, so the frontier's per-host rate
+limit replaces the polite delays of scraper.py.
+
+    python crawl_worker.py seed
+    python crawl_worker.py work --worker-id w1 &
+    python crawl_worker.py work --worker-id w2 &
+    python crawl_worker.py stats
+
+Results go to Firestore as soon as an item is done. The watermark only moves
+to the newest post seen once every discussion of the listing was scraped
+without a failure.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import traceback
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from playwright.async_api import async_playwright
+from google.cloud import firestore
+
+from browser_pool import BrowserPool
+from crawl_frontier import (
+    COMPETITION, DISCUSSION_DETAIL, DISCUSSION_FINALIZE, DISCUSSION_LIST, FRONTIER_RETRY_BASE_DELAY, CrawlFrontier,
+    WorkItem
+)
+from corpus_archive import CorpusArchiveWriter
+from crawl_state import CRAWL_STATE_COLLECTION, CrawlState
+from detail_fetcher import DiscussionDetailFetcher
+from listing_extraction import DISCUSSION_LIST_ENDPOINTS, XhrCapture, list_discussions
+from profiling import REPORT_DIR, run_profile
+from refresh_scheduler import RefreshScheduler
+from scraper import KaggleScraper
+
+# Leasing prefers finishing competitions already started over starting new ones
+COMPETITION_PRIORITY = 0
+DISCUSSION_LIST_PRIORITY = 10
+DISCUSSION_DETAIL_PRIORITY = 20
+# Below everything else, so a listing is finalized once its details have drained
+DISCUSSION_FINALIZE_PRIORITY = -10
+# Seconds a finalize item waits before checking its details again
+FINALIZE_POLL_SECONDS = 30.0
+# Seconds an idle worker waits before asking the frontier again
+IDLE_POLL_SECONDS = 2.0
+# Finished items older than this are dropped when seeding a new run
+FINISHED_RETENTION_SECONDS = 7 * 86400
+MINVOTE = 10
+MAX_DISCUSSION_PAGES = 20
+
+
+class LeaseLost(Exception):
+    """The item's lease expired and another worker may be processing it"""
+
+
+class DetailsPending(Exception):
+    """Discussions queued by the listing are not finished yet"""
+
+
+async def seed(frontier: CrawlFrontier, max_pages: int = 5) -> int:
+    """Queue the due competitions of a new run; returns the number queued"""
+    unfinished = frontier.pending()
+    if unfinished:
+        print(f"⚠️ The previous run still has {unfinished} unfinished items; not seeding a new one")
+        return 0
+    purged = frontier.purge_finished(FINISHED_RETENTION_SECONDS)
+    if purged:
+        print(f"Dropped {purged} finished items from earlier runs")
+
+    scraper = KaggleScraper()
+    async with async_playwright() as p:
+        async with BrowserPool(p.chromium, headless=True) as pool:
+            listed_competitions = await scraper._list_active_competitions(pool, max_pages)
+
+    planned = RefreshScheduler(scraper.crawl_states).plan(listed_competitions)
+    run_profile.count("competitions_deferred", len(listed_competitions) - len(planned))
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    for rank, listed in enumerate(planned):
+        state = scraper.crawl_states.get(listed['id']) or CrawlState(listed['id'])
+        payload = {
+            "listed": listed,
+            "run_id": run_id,
+            # Resolved now, so every page of a listing compares against the same watermark
+            "watermark": state.discussions_watermark or scraper.last_scrape_datetime,
+            "vote_sweep": state.vote_sweep_due(),
+        }
+        # Most overdue first, as in a single-process run
+        priority = COMPETITION_PRIORITY + (len(planned) - rank) / len(planned)
+        frontier.enqueue(COMPETITION, f"{listed['id']}:{run_id}", listed['url'], payload, priority)
+    print(f"Queued {len(planned)} of {len(listed_competitions)} active competitions for run {run_id}")
+    return len(planned)
+
+
+class CrawlWorker:
+    """Leases frontier items and scrapes them with one browser pool"""
+
+    def __init__(self, frontier: CrawlFrontier, worker_id: str, kinds=None):
+        self.frontier = frontier
+        self.worker_id = worker_id
+        self.kinds = kinds
+        # Reuses the scraper's page handling, extraction modes and Firestore client
+        self.scraper = KaggleScraper()
+        self.db = self.scraper.db
+        self.pool = None
+
+    async def run(self) -> int:
+        """Process items until the frontier has no unfinished ones; returns the number of items done"""
+        done = 0
+        async with async_playwright() as p:
+            self.pool = await BrowserPool(p.chromium, headless=True).start()
+            if self.scraper.detail_mode == "http":
+                self.scraper.detail_fetcher = DiscussionDetailFetcher()
+            self.scraper.archive = CorpusArchiveWriter(writer_id=self.worker_id)
+            try:
+                while True:
+                    item = self.frontier.lease(self.worker_id, self.kinds)
+                    if item is None:
+                        if self.frontier.pending() == 0:
+                            break
+                        # Items are leased by other workers, waiting for a retry or for their host's next slot
+                        await asyncio.sleep(IDLE_POLL_SECONDS)
+                        continue
+                    done += await self._process(item)
+            finally:
+                with run_profile.stage("archive_write"):
+                    self.scraper.archive.flush()
+                if self.scraper.detail_fetcher:
+                    await self.scraper.detail_fetcher.aclose()
+                await self.pool.close()
+        return done
+
+    async def _process(self, item: WorkItem) -> bool:
+        handler = {
+            COMPETITION: self._crawl_competition,
+            DISCUSSION_LIST: self._crawl_listing_page,
+            DISCUSSION_DETAIL: self._crawl_discussion,
+            DISCUSSION_FINALIZE: self._finalize_listing,
+        }[item.kind]
+        print(f"[{self.worker_id}] {item.kind} {item.key} (attempt {item.attempts})")
+        try:
+            await handler(item)
+        except LeaseLost:
+            print(f"[{self.worker_id}] Lost the lease on {item.kind} {item.key}; dropping the result")
+            run_profile.count("frontier_leases_lost")
+            return False
+        except DetailsPending:
+            self.frontier.defer(item, self.worker_id, FINALIZE_POLL_SECONDS)
+            return False
+        except Exception as e:
+            traceback.print_exc()
+            status = self.frontier.fail(item, self.worker_id, f"{type(e).__name__}: {e}")
+            # Failures are mostly timeouts and throttling, so every worker backs off the host
+            self.frontier.delay_host(item.url, FRONTIER_RETRY_BASE_DELAY)
+            print(f"[{self.worker_id}] {item.kind} {item.key} failed ({status}): {e}")
+            run_profile.count(f"frontier_{status}")
+            return False
+        if not self.frontier.complete(item, self.worker_id):
+            run_profile.count("frontier_leases_lost")
+            return False
+        run_profile.count(f"frontier_{item.kind}_done")
+        return True
+
+    def _check_lease(self, item: WorkItem):
+        """Renew the lease before a write, so only the current lease holder writes"""
+        if not self.frontier.renew(item, self.worker_id):
+            raise LeaseLost(item.key)
+
+    async def _crawl_competition(self, item: WorkItem):
+        listed, run_id = item.payload['listed'], item.payload['run_id']
+        comp_id = listed['id']
+        details = await self.scraper._fetch_competition_details(self.pool, listed['url'])
+        competition_data = self.scraper._build_competition(listed, details)
+
+        self._check_lease(item)
+        with run_profile.stage("firestore_write"):
+            self.db.collection('competitions').document(comp_id).set(competition_data)
+            # The scheduler crawls competitions near their deadline more often
+            self.db.collection(CRAWL_STATE_COLLECTION).document(comp_id).set(
+                {'deadline': competition_data['deadline']}, merge=True
+            )
+        run_profile.count("competitions_scraped")
+        self.scraper.archive.add_competition(competition_data, details['raw_description'], details['raw_evaluation'])
+
+        sorts = ("published", "votes") if item.payload['vote_sweep'] else ("published",)
+        for sort in sorts:
+            self._enqueue_listing_page(comp_id, listed['url'], sort, 1, run_id, item.payload['watermark'])
+        if item.payload['vote_sweep']:
+            run_profile.count("vote_sweeps", competition_id=comp_id)
+
+    def _enqueue_listing_page(self, comp_id: str, comp_url: str, sort: str, page_number: int, run_id: str,
+                              watermark: Optional[str], newest: Optional[str] = None, changes: int = 0,
+                              details: List[str] = None):
+        payload = {
+            "competition_id": comp_id,
+            "competition_url": comp_url,
+            "sort": sort,
+            "page": page_number,
+            "run_id": run_id,
+            "watermark": watermark,
+            # Carried along the listing and saved to crawl_state once it is finalized
+            "newest": newest,
+            "changes": changes,
+            "details": details or [],
+        }
+        self.frontier.enqueue(
+            DISCUSSION_LIST, f"{comp_id}:{sort}:{page_number}:{run_id}",
+            f"{comp_url}/discussion?sort={sort}&page={page_number}", payload, DISCUSSION_LIST_PRIORITY,
+        )
+
+    async def _crawl_listing_page(self, item: WorkItem):
+        payload = item.payload
+        comp_id, sort, page_number = payload['competition_id'], payload['sort'], payload['page']
+        async with self.pool.page() as page:
+            capture = XhrCapture(page, DISCUSSION_LIST_ENDPOINTS) if self.scraper.extraction_mode == "xhr" else None
+            with run_profile.stage("navigation", comp_id):
+                await page.goto(item.url)
+                await page.wait_for_load_state('networkidle')
+            run_profile.count("discussion_list_pages", competition_id=comp_id)
+            rows = await list_discussions(page, capture, comp_id, page_number)
+            has_next_page = bool(rows) and await self.scraper._next_page_button(page) is not None
+
+        # The watermark from seeding, not the stored one that an earlier listing page may have moved
+        state = CrawlState(comp_id, payload['watermark'])
+        selected, reached_end, newest, changes = self.scraper._select_discussion_rows(
+            rows, comp_id, sort, state, MINVOTE, set(), first_page=page_number == 1
+        )
+        if payload['newest'] and (newest is None or payload['newest'] > newest):
+            newest = payload['newest']
+        changes += payload['changes']
+
+        # Keyed per run, so a discussion in both listings is scraped once
+        details = list(payload['details'])
+        for row in selected:
+            key = f"{row['id']}:{payload['run_id']}"
+            self.frontier.enqueue(
+                DISCUSSION_DETAIL, key, row['url'],
+                {"row": row, "competition_id": comp_id, "page": page_number}, DISCUSSION_DETAIL_PRIORITY,
+            )
+            details.append(key)
+
+        if has_next_page and not reached_end and page_number < MAX_DISCUSSION_PAGES:
+            self._enqueue_listing_page(comp_id, payload['competition_url'], sort, page_number + 1,
+                                       payload['run_id'], payload['watermark'], newest, changes, details)
+            return
+
+        # Stopping at the page cap above the watermark leaves newer posts on pages never listed
+        finalize_payload = {
+            "competition_id": comp_id,
+            "sort": sort,
+            "watermark": payload['watermark'],
+            "newest": newest,
+            "changes": changes,
+            "complete": reached_end or not has_next_page,
+            "details": details,
+        }
+        # No URL: it loads no page, so it takes no slot from the host's rate limit
+        self.frontier.enqueue(DISCUSSION_FINALIZE, f"{comp_id}:{sort}:{payload['run_id']}", "", finalize_payload,
+                              DISCUSSION_FINALIZE_PRIORITY)
+
+    async def _finalize_listing(self, item: WorkItem):
+        """Save a listing to crawl_state once every discussion it queued is done or parked as failed"""
+        payload = item.payload
+        comp_id = payload['competition_id']
+        counts = self.frontier.statuses(DISCUSSION_DETAIL, payload['details'])
+        if counts.get('pending') or counts.get('leased'):
+            raise DetailsPending(item.key)
+
+        complete = payload['complete']
+        if counts.get('failed'):
+            # A newer watermark would hide the failed discussions from the next run
+            print(f"⚠️ {counts['failed']} discussions of {comp_id} failed; keeping the watermark")
+            complete = False
+        self._check_lease(item)
+        with run_profile.stage("firestore_write"):
+            self._save_listing_result(comp_id, payload['sort'], payload['watermark'], payload['newest'],
+                                      payload['changes'], complete)
+
+    def _save_listing_result(self, comp_id: str, sort: str, watermark: Optional[str], newest: Optional[str], changes: int,
+                             complete: bool = True):
+        """Update crawl_state when a listing is finalized, in a transaction since both listings write it.
+
+        The watermark only moves to newest when the listing reached it (or there was none)
+        and none of its discussions failed.
+        """
+        doc_ref = self.db.collection(CRAWL_STATE_COLLECTION).document(comp_id)
+
+        @firestore.transactional
+        def update(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            state = CrawlState.from_dict(comp_id, snapshot.to_dict() or {})
+            if sort == "published":
+                state.record_crawl(changes)
+                # Without newer posts the seeded (possibly fallback) watermark still becomes this competition's own
+                state.advance(watermark)
+                if complete or watermark is None:
+                    state.advance(newest)
+            else:
+                state.record_vote_sweep(changes)
+            transaction.set(doc_ref, state.to_dict(), merge=True)
+
+        update(self.db.transaction())
+
+    async def _crawl_discussion(self, item: WorkItem):
+        row, comp_id = item.payload['row'], item.payload['competition_id']
+        content_data = await self.scraper._fetch_discussion_content(self.pool, row['id'], row['url'], comp_id)
+        discussion = self.scraper._build_discussion(row, comp_id, content_data, item.payload['page'])
+
+        self._check_lease(item)
+        with run_profile.stage("firestore_write"):
+            self.db.collection('discussions').document(discussion['id']).set(discussion)
+        run_profile.count("discussions_scraped", competition_id=comp_id)
+        self.scraper.archive.add_discussion(discussion, content_data.get('content'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frontier", help="Frontier SQLite file (default: FRONTIER_PATH or scraper/data/frontier.sqlite3)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    seed_parser = commands.add_parser("seed", help="Queue the due competitions of a new run")
+    seed_parser.add_argument("--max-pages", type=int, default=5, help="Competition listing pages to walk")
+    work_parser = commands.add_parser("work", help="Process items until the frontier is drained")
+    work_parser.add_argument("--worker-id", default=f"{os.uname().nodename}-{os.getpid()}")
+    work_parser.add_argument("--kinds", nargs="+", choices=(COMPETITION, DISCUSSION_LIST, DISCUSSION_DETAIL, DISCUSSION_FINALIZE),
+                             help="Only lease these item kinds")
+    commands.add_parser("stats", help="Print item counts per kind and status")
+    args = parser.parse_args()
+
+    frontier = CrawlFrontier(args.frontier)
+    try:
+        if args.command == "seed":
+            with run_profile.stage("scrape_total"):
+                asyncio.run(seed(frontier, args.max_pages))
+        elif args.command == "work":
+            start_time = time.time()
+            with run_profile.stage("scrape_total"):
+                done = asyncio.run(CrawlWorker(frontier, args.worker_id, args.kinds).run())
+            print(f"✅ [{args.worker_id}] Finished {done} items in {(time.time() - start_time) / 60:.2f} minutes")
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            run_profile.write_report(path=os.path.join(
+                REPORT_DIR, f"worker_{args.worker_id}_{run_profile.started_at.strftime('%Y%m%dT%H%M%SZ')}.json"
+            ))
+        print(json.dumps(frontier.stats(), indent=2))
+    finally:
+        frontier.close()
@@ -0,0 +1,165 @@
+"""
+Browserless discussion detail fetcher.
+
+A discussion page is a client-rendered React app whose content comes from one
+JSON call (discussions.DiscussionsService/GetForumTopicById). Posting that call
+over a pooled httpx connection and parsing the JSON in Python returns the same
+fields as extractDiscussionContent() in extract_content.js, without a Chromium
+page per discussion. fetch() returns None whenever the payload is unusable so
+the scraper can fall back to the browser for that discussion.
+"""
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, Optional
+import httpx
+from listing_extraction import KAGGLE_BASE_URL
+
+TOPIC_ENDPOINT = "/api/i/discussions.DiscussionsService/GetForumTopicById"
+# The scraper fetches one discussion at a time; a small pool keeps the connection warm
+MAX_CONNECTIONS = 4
+REQUEST_TIMEOUT_SECONDS = 30
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/136.0.0.0 Safari/537.36")
+
+# Kaggle tier enums -> the labels extractDiscussionContent() derives from avatar colors
+KAGGLE_TIERS = {
+    "GRANDMASTER": "Grandmaster",
+    "MASTER": "Master",
+    "EXPERT": "Expert",
+    "CONTRIBUTOR": "Contributor",
+    "NOVICE": "Novice",
+}
+MEDALS = {"GOLD": "Gold", "SILVER": "Silver", "BRONZE": "Bronze"}
+
+
+class _TextExtractor(HTMLParser):
+    """Approximates innerText of rendered post HTML: block elements on their own lines"""
+
+    BLOCK_TAGS = {"p", "div", "li", "ul", "ol", "pre", "blockquote", "table", "tr",
+                  "h1", "h2", "h3", "h4", "h5", "h6"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+
+    def _break(self, newlines: int):
+        # Adjacent block boundaries share line breaks, like innerText
+        trailing = len(self.parts[-1]) - len(self.parts[-1].rstrip("\n")) if self.parts else newlines
+        if trailing < newlines:
+            self.parts.append("\n" * (newlines - trailing))
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "br":
+            self.parts.append("\n")
+        elif tag in self.BLOCK_TAGS:
+            self._break(2 if tag in ("p", "pre") or tag.startswith("h") else 1)
+        elif tag in ("td", "th"):
+            self.parts.append("\t")
+
+    def handle_endtag(self, tag):
+        if tag in self.BLOCK_TAGS:
+            self._break(2 if tag in ("p", "pre", "ul", "ol") or tag.startswith("h") else 1)
+
+    def handle_data(self, data):
+        self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    text = re.sub(r"[ \t]*\n[ \t]*", "\n", "".join(parser.parts))
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _first(item: Dict, *keys, default=None):
+    for key in keys:
+        value = item.get(key)
+        if value not in (None, ""):
+            return value
+    return default
+
+
+def _ordinal(rank: int) -> str:
+    suffix = "th" if 10 <= rank % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(rank % 10, "th")
+    return f"{rank}{suffix}"
+
+
+def parse_discussion_detail(payload: Dict) -> Optional[Dict[str, Any]]:
+    """Same fields as extractDiscussionContent(), or None if the payload has no post content"""
+    topic = payload.get("forumTopic") or payload.get("topic") or {}
+    message = topic.get("firstMessage") or {}
+    author = message.get("author") or topic.get("authorUser") or {}
+
+    content = message.get("content")
+    content = html_to_text(content) if content else _first(message, "rawMarkdown", "markdown")
+    if not content:
+        return None
+
+    votes = message.get("votes")
+    upvotes = _first(votes, "totalVotes", default=0) if isinstance(votes, dict) else votes
+    rank = _first(message, "authorCompetitionRank", "competitionRanking", default=_first(topic, "authorCompetitionRank"))
+    medal = _first(message, "medal", default=_first(topic, "medal"))
+
+    return {
+        "title": (_first(topic, "name", "title", default="")).strip() or None,
+        "author": _first(author, "displayName", "userName"),
+        "posted_datetime": _first(message, "postDate", default=_first(topic, "postDate")),
+        "content": content,
+        "competitionRank": _ordinal(int(rank)) if str(rank or "").isdigit() and int(rank) > 0 else "Unranked",
+        "kaggleRank": KAGGLE_TIERS.get(str(_first(author, "tier", "performanceTier", default="")).upper(), "Unknown"),
+        "upvotes": int(upvotes or _first(topic, "totalVotes", "votes", default=0)),
+        "medalType": MEDALS.get(str(medal).upper(), "Unknown") if medal and medal != "NONE" else None,
+    }
+
+
+class DiscussionDetailFetcher:
+    """Pooled HTTP client for discussion details; use as an async context manager"""
+
+    def __init__(self, base_url: str = KAGGLE_BASE_URL):
+        self.base_url = base_url
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"User-Agent": USER_AGENT, "Accept": "application/json"},
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            timeout=REQUEST_TIMEOUT_SECONDS,
+            follow_redirects=True,
+        )
+        self._xsrf_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _ensure_session(self):
+        # The internal API rejects calls without the anti-forgery cookie a page visit sets
+        if self._xsrf_token is None:
+            await self.client.get("/", headers={"Accept": "text/html"})
+            self._xsrf_token = self.client.cookies.get("XSRF-TOKEN") or self.client.cookies.get("CSRF-TOKEN") or ""
+
+    async def fetch(self, disc_id: str, disc_url: str) -> Optional[Dict[str, Any]]:
+        """Discussion fields for one topic, or None when the browser should be used instead"""
+        if not str(disc_id).isdigit():
+            return None
+        try:
+            await self._ensure_session()
+            response = await self.client.post(
+                TOPIC_ENDPOINT,
+                json={"forumTopicId": int(disc_id), "includeComments": False},
+                headers={"x-xsrf-token": self._xsrf_token, "Referer": disc_url},
+            )
+            if response.status_code in (401, 403):
+                # Stale token: the next discussion starts a fresh session
+                self._xsrf_token = None
+            if response.status_code != 200:
+                print(f"HTTP detail fetch for {disc_id} returned {response.status_code}")
+                return None
+            return parse_discussion_detail(response.json())
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"HTTP detail fetch for {disc_id} failed: {e}")
+            return None
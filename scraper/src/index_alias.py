@@ -0,0 +1,107 @@
+"""
+Firestore alias naming the Pinecone index and namespace that serve searches.
+
+The backend (backend/services/vector_store.py) and the sync resolve the
+`index_aliases/kaggle-competitions` document instead of hard-coding where
+vectors live, so reindex.py can build a complete copy next to the live one
+and move every reader over with a single document write. Without the alias
+document everything uses the default namespace of `kaggle-competitions`.
+
+The alias also names the layout. In the shared layout every vector lives in
+`namespace` and queries filter on competition_id metadata. In the
+per-competition layout, competition vectors stay in `namespace` and the
+discussion chunks of each competition get a namespace of their own,
+`<namespace>--<competition id>`, so a scoped query only reads that
+competition's vectors and needs no filter.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+from google.cloud import firestore
+
+ALIAS_COLLECTION = 'index_aliases'
+ALIAS_NAME = 'kaggle-competitions'
+DEFAULT_INDEX_NAME = 'kaggle-competitions'
+DEFAULT_NAMESPACE = ''
+LAYOUT_SHARED = 'shared'
+LAYOUT_PER_COMPETITION = 'per_competition'
+LAYOUTS = (LAYOUT_SHARED, LAYOUT_PER_COMPETITION)
+# Joins the base namespace and a competition id; Kaggle slugs never contain it
+COMPETITION_NAMESPACE_SEPARATOR = '--'
+
+
+@dataclass(frozen=True)
+class IndexTarget:
+    index_name: str = DEFAULT_INDEX_NAME
+    namespace: str = DEFAULT_NAMESPACE
+    layout: str = LAYOUT_SHARED
+
+    def __post_init__(self):
+        if self.layout not in LAYOUTS:
+            raise ValueError(f"Unknown index layout {self.layout}")
+        if self.layout == LAYOUT_PER_COMPETITION and not self.namespace:
+            # Competition namespaces are found by prefix, which the default namespace cannot provide
+            raise ValueError("The per-competition layout needs a named base namespace")
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "IndexTarget":
+        data = data or {}
+        return cls(data.get('index_name') or DEFAULT_INDEX_NAME, data.get('namespace') or DEFAULT_NAMESPACE,
+                   data.get('layout') or LAYOUT_SHARED)
+
+    def to_dict(self) -> dict:
+        return {'index_name': self.index_name, 'namespace': self.namespace, 'layout': self.layout}
+
+    def namespace_for(self, doc_type: str, competition_id: Optional[str]) -> str:
+        """Namespace a vector of this type and competition is written to"""
+        if self.layout == LAYOUT_PER_COMPETITION and doc_type == 'discussion' and competition_id:
+            return f"{self.namespace}{COMPETITION_NAMESPACE_SEPARATOR}{competition_id}"
+        return self.namespace
+
+    def owns_namespace(self, namespace: str) -> bool:
+        """Whether a namespace holds vectors of this target"""
+        if namespace == self.namespace:
+            return True
+        return (self.layout == LAYOUT_PER_COMPETITION
+                and namespace.startswith(f"{self.namespace}{COMPETITION_NAMESPACE_SEPARATOR}"))
+
+    def __str__(self) -> str:
+        name = f"{self.index_name}/{self.namespace or '(default namespace)'}"
+        return name if self.layout == LAYOUT_SHARED else f"{name} ({self.layout})"
+
+
+class AliasMoved(Exception):
+    """The alias no longer points where the caller expected, e.g. another reindex switched it"""
+
+
+def read_alias(db) -> dict:
+    snapshot = db.collection(ALIAS_COLLECTION).document(ALIAS_NAME).get()
+    return snapshot.to_dict() if snapshot.exists else {}
+
+
+def resolve_alias(db) -> IndexTarget:
+    """Where searches currently read from and syncs write to"""
+    return IndexTarget.from_dict(read_alias(db))
+
+
+def switch_alias(db, target: IndexTarget, expected: IndexTarget, **details) -> dict:
+    """Point the alias at target if it still points at expected; the old target is kept as `previous`"""
+    doc_ref = db.collection(ALIAS_COLLECTION).document(ALIAS_NAME)
+
+    @firestore.transactional
+    def update(transaction):
+        snapshot = doc_ref.get(transaction=transaction)
+        current = IndexTarget.from_dict(snapshot.to_dict() if snapshot.exists else None)
+        if current != expected:
+            raise AliasMoved(f"Alias points at {current}, expected {expected}")
+        alias = {
+            **target.to_dict(),
+            'previous': current.to_dict(),
+            'switched_at': datetime.now(timezone.utc).isoformat(),
+            **details,
+        }
+        transaction.set(doc_ref, alias)
+        return alias
+
+    return update(db.transaction())
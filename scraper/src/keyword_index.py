@@ -0,0 +1,84 @@
+"""
+Per-competition BM25 keyword index over synced discussion chunks.
+
+Exact tokens such as metric names (RMSE, AUC), library names and feature names
+are often missed by dense search. The sync keeps one term-frequency index per
+competition, keyed by Pinecone vector id, and stores it zlib-compressed in the
+Firestore `keyword_indexes` collection. The backend loads it into memory and
+fuses BM25 hits with dense hits (backend/services/keyword_index.py).
+"""
+import json
+import re
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List
+
+# Bump when tokenize() changes; the backend refuses indexes built with another version
+TOKENIZER_VERSION = 1
+KEYWORD_INDEX_COLLECTION = 'keyword_indexes'
+# Firestore documents are capped at 1 MiB
+MAX_INDEX_BYTES = 1_000_000
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9_+#.\-]*[a-z0-9+#]|[a-z0-9]")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i if in into is it its of on or our so "
+    "that the their then there these this to was we were what when which while will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased keyword tokens; keeps tokens like xgboost, f1, log-loss, c++ and 0.95 intact.
+
+    Must stay identical to backend/services/keyword_index.py:tokenize.
+    """
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class KeywordIndex:
+    """Term frequencies per chunk for one competition"""
+
+    def __init__(self, competition_id: str, docs: Dict[str, list] = None):
+        self.competition_id = competition_id
+        # vector_id -> [parent_id, chunk length in tokens, {term: frequency}]
+        self.docs = docs or {}
+
+    def add(self, vector_id: str, parent_id: str, text: str):
+        """Index (or re-index) one chunk"""
+        tokens = tokenize(text)
+        self.docs[vector_id] = [parent_id, len(tokens), dict(Counter(tokens))]
+
+    def remove_parents(self, parent_ids: Iterable[str]):
+        """Drop every chunk of the given discussions, e.g. before re-indexing them"""
+        parent_ids = set(parent_ids)
+        self.docs = {vid: entry for vid, entry in self.docs.items() if entry[0] not in parent_ids}
+
+    def to_bytes(self) -> bytes:
+        payload = {'tokenizer_version': TOKENIZER_VERSION, 'docs': self.docs}
+        return zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), 9)
+
+    @classmethod
+    def from_bytes(cls, competition_id: str, blob: bytes) -> "KeywordIndex":
+        payload = json.loads(zlib.decompress(blob))
+        if payload.get('tokenizer_version') != TOKENIZER_VERSION:
+            # Stale tokenizer: start over, the next syncs rebuild it
+            return cls(competition_id)
+        return cls(competition_id, payload['docs'])
+
+    @classmethod
+    def load(cls, db, competition_id: str) -> "KeywordIndex":
+        snapshot = db.collection(KEYWORD_INDEX_COLLECTION).document(competition_id).get()
+        if not snapshot.exists:
+            return cls(competition_id)
+        return cls.from_bytes(competition_id, snapshot.to_dict()['index'])
+
+    def save(self, db) -> bool:
+        blob = self.to_bytes()
+        if len(blob) > MAX_INDEX_BYTES:
+            print(f"⚠️ Keyword index for {self.competition_id} is {len(blob)} bytes, over the Firestore limit; not saved")
+            return False
+        db.collection(KEYWORD_INDEX_COLLECTION).document(self.competition_id).set({
+            'index': blob,
+            'chunks': len(self.docs),
+            'tokenizer_version': TOKENIZER_VERSION,
+        })
+        return True
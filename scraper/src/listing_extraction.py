@@ -0,0 +1,265 @@
+"""
+Competition and discussion listing extraction.
+
+Kaggle's React pages fetch their lists from internal JSON endpoints
+(/api/i/<service>/<method>). XhrCapture listens to page responses and keeps
+those payloads, so a listing page yields every row from one parsed response
+instead of several DOM round-trips per row. When nothing was captured (the
+endpoint changed, or capture is off) the rows are read from the DOM instead.
+"""
+import asyncio
+import re
+from typing import Any, Dict, List
+from profiling import run_profile
+
+KAGGLE_BASE_URL = "https://www.kaggle.com"
+COMPETITION_LIST_ENDPOINTS = (
+    "competitions.CompetitionService/ListCompetitions",
+)
+DISCUSSION_LIST_ENDPOINTS = (
+    "discussions.DiscussionsService/GetTopicListByForumId",
+    "discussions.DiscussionsService/ListTopics",
+)
+
+
+class XhrCapture:
+    """Collects JSON responses from the listed endpoints while attached to a page"""
+
+    def __init__(self, page, endpoints: tuple):
+        self.endpoints = endpoints
+        self.payloads = []
+        self._pending = set()
+        page.on("response", self._on_response)
+
+    def _on_response(self, response):
+        if response.request.resource_type not in ("xhr", "fetch"):
+            return
+        if not any(endpoint in response.url for endpoint in self.endpoints):
+            return
+        # Bodies are read asynchronously; settle() waits for them
+        task = asyncio.ensure_future(self._read(response))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _read(self, response):
+        try:
+            if response.ok:
+                self.payloads.append(await response.json())
+        except Exception as e:
+            print(f"Could not read captured response {response.url}: {e}")
+
+    async def settle(self) -> List[Dict]:
+        """Wait for in-flight body reads and return every payload captured so far"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+        return self.payloads
+
+    def clear(self):
+        """Drop payloads from the previous page before navigating to the next one"""
+        self.payloads = []
+
+
+def _absolute_url(path: str) -> str:
+    return path if path.startswith("http") else f"{KAGGLE_BASE_URL}{path}"
+
+
+def _first(item: Dict, *keys, default=None):
+    for key in keys:
+        value = item.get(key)
+        if value not in (None, ""):
+            return value
+    return default
+
+
+def parse_competition_list(payloads: List[Dict]) -> List[Dict]:
+    """Competitions as {id, title, url}, in listing order, without duplicates"""
+    competitions, seen = [], set()
+    for payload in payloads:
+        for item in payload.get("competitions") or payload.get("result", {}).get("competitions") or []:
+            url = _first(item, "url", "urlNullable", default="")
+            comp_id = _first(item, "competitionName", "slug", default=url.rstrip("/").split("/")[-1])
+            # Same rule as the DOM extraction: skip navigation links and invalid ids
+            if not comp_id or comp_id == "competitions" or len(comp_id) < 3 or comp_id in seen:
+                continue
+            seen.add(comp_id)
+            competitions.append({
+                "id": comp_id,
+                "title": (_first(item, "title", "competitionTitle", default="Unknown title")).strip(),
+                "url": _absolute_url(url or f"/competitions/{comp_id}"),
+            })
+    return competitions
+
+
+def parse_discussion_list(payloads: List[Dict], comp_id: str) -> List[Dict]:
+    """Discussion rows as {id, url, title, upvotes, author, posted_at, pinned}, in listing order"""
+    rows, seen = [], set()
+    for payload in payloads:
+        for topic in payload.get("topics") or payload.get("forumTopics") or []:
+            disc_id = str(_first(topic, "id", "topicId", default=""))
+            if not disc_id or disc_id in seen:
+                continue
+            seen.add(disc_id)
+            author = topic.get("authorUser") or {}
+            rows.append({
+                "id": disc_id,
+                "url": _absolute_url(_first(topic, "topicUrl", "url",
+                                            default=f"/competitions/{comp_id}/discussion/{disc_id}")),
+                "title": (_first(topic, "title", "name", default="Unknown title")).strip(),
+                "upvotes": _to_int(_first(topic, "votes", "totalVotes", "voteCount", default=0)),
+                "author": _first(author, "displayName", "userName",
+                                 default=_first(topic, "authorUserDisplayName", default="Unknown author")),
+                "posted_at": _first(topic, "postDate", "createTime"),
+                "pinned": bool(_first(topic, "isSticky", "pinned", default=False)),
+            })
+    return rows
+
+
+def _to_int(value) -> int:
+    if isinstance(value, int):
+        return value
+    match = re.search(r"(\d+)", str(value))
+    return int(match.group(1)) if match else 0
+
+
+async def list_competitions(page, capture: XhrCapture, current_page: int) -> List[Dict[str, str]]:
+    """Competitions on the loaded listing page as {id, title, url}: captured JSON first, DOM as fallback"""
+    if capture:
+        competitions = parse_competition_list(await capture.settle())
+        if competitions:
+            run_profile.count("xhr_listings")
+            return competitions
+        print(f"No competition list payload captured on page {current_page}, reading the DOM")
+    run_profile.count("dom_listings")
+    with run_profile.stage("dom_extraction"):
+        return await _list_competitions_from_dom(page, current_page)
+
+
+async def _list_competitions_from_dom(page, current_page: int) -> List[Dict[str, str]]:
+    # Wait for competition list to load
+    specific_list_selector = "ul.MuiList-root.km-list.sc-ekhxZF.dPUdCH.css-1uzmcsd"
+    try:
+        await page.wait_for_selector(specific_list_selector, timeout=30000)
+    except Exception as e:
+        print(f"Could not find competition list on page {current_page}: {e}")
+        # Try an alternative selector
+        await page.wait_for_selector("ul.MuiList-root.km-list", timeout=30000)
+
+    # Wait for each competition link to load
+    await page.wait_for_selector("a[href^='/competitions/']", timeout=60000)
+
+    # Fetch all competition links on the current page
+    competition_links = await page.query_selector_all("a[href^='/competitions/']")
+
+    # Filter out duplicate links and non-competition links
+    competitions = []
+    processed_hrefs = set()
+
+    for link in competition_links:
+        href = await link.get_attribute('href')
+        comp_id = href.split('/')[-1] if href else ""
+
+        # Skip duplicates, non-competition links, and invalid competition IDs
+        if not href or href in processed_hrefs or not comp_id or comp_id == "competitions" or len(comp_id) < 3:
+            continue
+        processed_hrefs.add(href)
+
+        # Try to get the title using multiple selectors
+        title = "Unknown title"
+        for selector in ['.sc-dFaThA', 'h3', '.sc-jPkiSJ']:
+            title_elem = await link.query_selector(selector)
+            if title_elem:
+                title_text = await title_elem.text_content()
+                if title_text and title_text.strip():
+                    title = title_text.strip()
+                    break
+
+        competitions.append({"id": comp_id, "title": title, "url": f"https://www.kaggle.com{href}"})
+    return competitions
+
+
+async def list_discussions(page, capture: XhrCapture, comp_id: str, current_page: int) -> List[Dict[str, Any]]:
+    """Discussion rows on the loaded page as {id, url, title, upvotes, author, posted_at, pinned}: captured JSON first, DOM as fallback.
+
+    pinned is None for DOM rows without a pin marker, where it is unknown rather than False.
+    """
+    if capture:
+        rows = parse_discussion_list(await capture.settle(), comp_id)
+        if rows:
+            run_profile.count("xhr_listings", competition_id=comp_id)
+            return rows
+        print(f"No discussion list payload captured on page {current_page} for {comp_id}, reading the DOM")
+    run_profile.count("dom_listings", competition_id=comp_id)
+    with run_profile.stage("dom_extraction", comp_id):
+        return await _list_discussions_from_dom(page, comp_id, current_page)
+
+
+# Kaggle marks pinned topics with a push_pin Material icon; a labelled marker is accepted too
+PINNED_MARKER_SCRIPT = """item => Array.from(item.querySelectorAll('span, i, svg, [aria-label], [data-testid]')).some(node =>
+    node.textContent.trim() === 'push_pin'
+    || /^pinned/i.test(node.getAttribute('aria-label') || '')
+    || /pin/i.test(node.getAttribute('data-testid') || ''))"""
+
+
+async def _list_discussions_from_dom(page, comp_id: str, current_page: int) -> List[Dict[str, Any]]:
+    # Wait for discussion list to load
+    specific_list_selector = "ul.MuiList-root.km-list.css-1uzmcsd"
+    try:
+        await page.wait_for_selector(specific_list_selector, timeout=30000)
+    except Exception as e:
+        print(f"No discussion list found on page {current_page} for {comp_id}: {e}")
+        return []
+
+    # Wait for discussion items to load
+    try:
+        await page.wait_for_selector("ul.MuiList-root.km-list.css-1uzmcsd li.MuiListItem-root", timeout=60000)
+    except Exception as e:
+        print(f"No discussion items found on page {current_page} for {comp_id}: {e}")
+        return []
+
+    # Get all discussion list items
+    discussion_items = await page.query_selector_all("li.MuiListItem-root.MuiListItem-gutters.MuiListItem-divider.sc-inRxyr")
+
+    rows = []
+    for i, item in enumerate(discussion_items):
+        # Get the link to the discussion and extract disc_id
+        link_elem = await item.query_selector("a[href*='/discussion/']")
+        if not link_elem:
+            print(f"Could not find discussion link for item {i} on page {current_page}")
+            continue
+        href = await link_elem.get_attribute('href')
+
+        # Get the title
+        title = "Unknown title"
+        for selector in [".sc-dFaThA", ".sc-jPkiSJ", "h3"]:
+            title_elem = await item.query_selector(selector)
+            if title_elem:
+                title_text = await title_elem.text_content()
+                if title_text and title_text.strip():
+                    title = title_text.strip()
+                    break
+
+        # Get upvote count to filter by popularity
+        upvote_span = await item.query_selector("span[aria-live='polite']")
+        upvotes_text = await upvote_span.text_content() if upvote_span else "0"
+        upvotes = int(re.search(r"(\d+)", upvotes_text).group(1)) if re.search(r"(\d+)", upvotes_text) else 0
+
+        author_elem = await item.query_selector("a[emphasis]")
+        author = await author_elem.text_content() if author_elem else "Unknown author"
+
+        # Post date as the raw title attribute of the relative "x days ago" label
+        date_elem = await item.query_selector("span[title]")
+        posted_at = await date_elem.get_attribute("title") if date_elem else None
+
+        # None rather than False without a marker: the markup may change under the icon check
+        pinned = await item.evaluate(PINNED_MARKER_SCRIPT)
+
+        rows.append({
+            "id": href.split('/')[-1] if href else "unknown",
+            "url": f"https://www.kaggle.com{href}",
+            "title": title,
+            "upvotes": upvotes,
+            "author": author,
+            "posted_at": posted_at,
+            "pinned": True if pinned else None,
+        })
+    return rows
@@ -0,0 +1,208 @@
+"""
+In-memory stand-in for a Pinecone index, for offline checks and benchmarks.
+
+Covers the calls this repo makes - upsert, query (cosine, with metadata
+filters), query_namespaces, fetch, delete, list and describe_index_stats,
+all per namespace - with responses that have the same attributes as the
+client's (.matches, .vectors, .namespaces[...].vector_count). Queries are exact brute-force
+scans, so relative costs (e.g. how many vectors a filter has to skip) show
+up, but absolute latencies say nothing about the hosted service.
+
+    pc = LocalPinecone()
+    pc.create_index(name="kaggle-competitions", dimension=1536, metric="cosine")
+    index = pc.Index("kaggle-competitions")
+"""
+import operator
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+_COMPARISONS = {'$gt': operator.gt, '$gte': operator.ge, '$lt': operator.lt, '$lte': operator.le}
+
+
+class _Namespace:
+    """Vectors of one namespace; the matrix and metadata columns are rebuilt lazily after writes"""
+
+    def __init__(self):
+        self.records: Dict[str, tuple] = {}
+        self._ids: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def invalidate(self):
+        self._matrix = None
+        self._columns = {}
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._ids = list(self.records)
+            rows = np.asarray([self.records[vector_id][0] for vector_id in self._ids], dtype=np.float32)
+            norms = np.linalg.norm(rows, axis=1, keepdims=True) if len(rows) else rows
+            self._matrix = rows / np.where(norms == 0, 1, norms) if len(rows) else rows
+        return self._matrix
+
+    def column(self, field: str) -> np.ndarray:
+        if field not in self._columns:
+            column = np.empty(len(self._ids), dtype=object)
+            column[:] = [self.records[vector_id][1].get(field) for vector_id in self._ids]
+            self._columns[field] = column
+        return self._columns[field]
+
+    def mask(self, condition: dict) -> np.ndarray:
+        """Rows matching a Pinecone metadata filter"""
+        mask = np.ones(len(self._ids), dtype=bool)
+        for key, value in condition.items():
+            if key == '$and':
+                for sub in value:
+                    mask &= self.mask(sub)
+            elif key == '$or':
+                mask &= np.logical_or.reduce([self.mask(sub) for sub in value])
+            else:
+                mask &= self._field_mask(key, value if isinstance(value, dict) else {'$eq': value})
+        return mask
+
+    def _field_mask(self, field: str, operators: dict) -> np.ndarray:
+        column = self.column(field)
+        mask = np.ones(len(column), dtype=bool)
+        for op, value in operators.items():
+            if op == '$eq':
+                mask &= column == value
+            elif op == '$ne':
+                mask &= column != value
+            elif op == '$in':
+                mask &= np.isin(column, list(value))
+            elif op == '$nin':
+                mask &= ~np.isin(column, list(value))
+            elif op in _COMPARISONS:
+                compare = _COMPARISONS[op]
+                mask &= np.fromiter((x is not None and compare(x, value) for x in column), dtype=bool,
+                                    count=len(column))
+            else:
+                raise ValueError(f"Unsupported filter operator {op}")
+        return mask
+
+
+class LocalIndex:
+    def __init__(self, dimension: Optional[int] = None):
+        self.dimension = dimension
+        self.namespaces: Dict[str, _Namespace] = {}
+
+    def _namespace(self, namespace: Optional[str]) -> _Namespace:
+        return self.namespaces.setdefault(namespace or '', _Namespace())
+
+    def upsert(self, vectors: list, namespace: Optional[str] = None, **kwargs):
+        ns = self._namespace(namespace)
+        for vector in vectors:
+            if isinstance(vector, dict):
+                vector_id, values, metadata = vector['id'], vector['values'], vector.get('metadata')
+            else:
+                vector_id, values, metadata = (*vector, None)[:3]
+            if self.dimension is None:
+                self.dimension = len(values)
+            elif len(values) != self.dimension:
+                raise ValueError(f"Vector dimension {len(values)} does not match the index dimension {self.dimension}")
+            ns.records[vector_id] = (np.asarray(values, dtype=np.float32), dict(metadata or {}))
+        ns.invalidate()
+        return SimpleNamespace(upserted_count=len(vectors))
+
+    def query(self, vector: list = None, top_k: int = 10, namespace: Optional[str] = None, filter: dict = None,
+              include_values: bool = False, include_metadata: bool = False, id: str = None, **kwargs):
+        ns = self.namespaces.get(namespace or '')
+        if ns is None or not ns.records:
+            return SimpleNamespace(matches=[], namespace=namespace or '')
+        if id is not None:
+            vector = ns.records[id][0]
+        matrix = ns.matrix()
+        query = np.asarray(vector, dtype=np.float32)
+        scores = matrix @ (query / (np.linalg.norm(query) or 1))
+        if filter:
+            scores = np.where(ns.mask(filter), scores, -np.inf)
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        matches = []
+        for position in best:
+            if scores[position] == -np.inf:
+                break
+            vector_id = ns._ids[position]
+            values, metadata = ns.records[vector_id]
+            matches.append(SimpleNamespace(
+                id=vector_id,
+                score=float(scores[position]),
+                values=values.tolist() if include_values else [],
+                metadata=dict(metadata) if include_metadata else None,
+            ))
+        return SimpleNamespace(matches=matches, namespace=namespace or '')
+
+    def query_namespaces(self, vector: list, namespaces: List[str], metric: str = 'cosine', top_k: int = 10,
+                         filter: dict = None, include_values: bool = False, include_metadata: bool = False, **kwargs):
+        """Query several namespaces and merge the best top_k matches, like the client's fan-out"""
+        matches = []
+        for namespace in set(namespaces):
+            matches.extend(self.query(vector=vector, top_k=top_k, namespace=namespace, filter=filter,
+                                      include_values=include_values, include_metadata=include_metadata).matches)
+        matches.sort(key=lambda match: match.score, reverse=True)
+        return SimpleNamespace(matches=matches[:top_k])
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None, **kwargs):
+        ns = self.namespaces.get(namespace or '')
+        vectors = {}
+        for vector_id in ids:
+            if ns and vector_id in ns.records:
+                values, metadata = ns.records[vector_id]
+                vectors[vector_id] = SimpleNamespace(id=vector_id, values=values.tolist(), metadata=dict(metadata))
+        return SimpleNamespace(vectors=vectors, namespace=namespace or '')
+
+    def delete(self, ids: List[str] = None, delete_all: bool = False, namespace: Optional[str] = None,
+               filter: dict = None, **kwargs):
+        ns = self.namespaces.get(namespace or '')
+        if ns is None:
+            return {}
+        if delete_all:
+            del self.namespaces[namespace or '']
+            return {}
+        doomed = set(ids or [])
+        if filter:
+            ns.matrix()
+            doomed.update(vector_id for vector_id, keep in zip(ns._ids, ns.mask(filter)) if keep)
+        for vector_id in doomed:
+            ns.records.pop(vector_id, None)
+        ns.invalidate()
+        return {}
+
+    def list(self, prefix: str = '', namespace: Optional[str] = None, limit: int = 100, **kwargs) -> Iterator[List[str]]:
+        ns = self.namespaces.get(namespace or '')
+        ids = sorted(vector_id for vector_id in (ns.records if ns else ()) if vector_id.startswith(prefix))
+        for i in range(0, len(ids), limit):
+            yield ids[i:i + limit]
+
+    def describe_index_stats(self, **kwargs):
+        namespaces = {
+            name: SimpleNamespace(vector_count=len(ns.records))
+            for name, ns in self.namespaces.items() if ns.records
+        }
+        return SimpleNamespace(
+            dimension=self.dimension,
+            index_fullness=0.0,
+            namespaces=namespaces,
+            total_vector_count=sum(summary.vector_count for summary in namespaces.values()),
+        )
+
+
+class LocalPinecone:
+    """Client stand-in holding named in-memory indexes"""
+
+    def __init__(self, **kwargs):
+        self.indexes: Dict[str, LocalIndex] = {}
+
+    def create_index(self, name: str, dimension: int = None, **kwargs):
+        self.indexes.setdefault(name, LocalIndex(dimension))
+
+    def has_index(self, name: str) -> bool:
+        return name in self.indexes
+
+    def Index(self, name: str, **kwargs) -> LocalIndex:
+        if name not in self.indexes:
+            raise KeyError(f"Index {name} not found")
+        return self.indexes[name]
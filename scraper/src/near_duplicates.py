@@ -0,0 +1,273 @@
+"""
+Per-competition near-duplicate index over synced discussions.
+
+Reposted solution write-ups and quoted or forked content would otherwise be
+embedded again and crowd the top-k results of a competition. Each discussion
+gets a MinHash signature of its word shingles; an LSH band table finds
+candidates and the estimated Jaccard similarity decides. The sync keeps one
+index per competition in the Firestore `near_duplicate_indexes` collection,
+zlib-compressed like the keyword index, and updates it incrementally.
+
+A discussion already in the index stays canonical, since its vectors exist.
+A new discussion that matches an indexed one above NEAR_DUPLICATE_THRESHOLD
+is not embedded and is marked with `duplicate_of` instead:
+
+    python near_duplicates.py report --discussions discussions_backup_20250101_000000.json
+    python near_duplicates.py backfill   # index the discussions already in Pinecone
+"""
+import argparse
+import base64
+import hashlib
+import json
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Bump when shingling or hashing changes; indexes built with another version are rebuilt
+SIGNATURE_VERSION = 1
+NEAR_DUPLICATE_COLLECTION = 'near_duplicate_indexes'
+# Words per shingle; texts with fewer words get no signature and are never near-duplicates
+SHINGLE_SIZE = 5
+# 16 bands of 8 rows put the LSH candidate threshold near a Jaccard similarity of 0.71
+NUM_PERM = 128
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+# Estimated Jaccard similarity of word shingles above which a discussion is a near-duplicate
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Firestore documents are capped at 1 MiB
+MAX_INDEX_BYTES = 1_000_000
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Fixed seed: signatures must be comparable across runs and machines
+_rng = np.random.RandomState(20250101)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def shingles(text: str) -> Set[str]:
+    words = _WORD_PATTERN.findall(text.lower())
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """NUM_PERM uint32 minimum hashes of the text's word shingles, or None for very short texts"""
+    shingle_set = shingles(text)
+    if not shingle_set:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingle_set),
+        dtype=np.uint64, count=len(shingle_set),
+    )
+    # (a * h + b) mod p stays below 2**64 because a and h are both under 2**32
+    permuted = ((np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def estimated_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Fraction of equal minimum hashes, an unbiased estimate of the Jaccard similarity"""
+    return float(np.mean(a == b))
+
+
+def _band_keys(signature: np.ndarray) -> List[bytes]:
+    return [bytes([band]) + signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes() for band in range(LSH_BANDS)]
+
+
+class NearDuplicateIndex:
+    """MinHash signatures of one competition's canonical discussions with an in-memory LSH table"""
+
+    def __init__(self, competition_id: str, signatures: Dict[str, np.ndarray] = None):
+        self.competition_id = competition_id
+        self.signatures: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[bytes, Set[str]] = defaultdict(set)
+        for discussion_id, signature in (signatures or {}).items():
+            self.add(discussion_id, signature)
+
+    def __contains__(self, discussion_id: str) -> bool:
+        return discussion_id in self.signatures
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def add(self, discussion_id: str, signature: np.ndarray):
+        """Index (or re-index) one discussion"""
+        self.remove(discussion_id)
+        self.signatures[discussion_id] = signature
+        for key in _band_keys(signature):
+            self._buckets[key].add(discussion_id)
+
+    def remove(self, discussion_id: str):
+        signature = self.signatures.pop(discussion_id, None)
+        if signature is None:
+            return
+        for key in _band_keys(signature):
+            self._buckets[key].discard(discussion_id)
+            if not self._buckets[key]:
+                del self._buckets[key]
+
+    def query(self, signature: np.ndarray, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Optional[Tuple[str, float]]:
+        """Most similar indexed discussion at or above threshold, as (id, similarity), or None"""
+        candidates = set()
+        for key in _band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        best = None
+        for candidate in candidates:
+            similarity = estimated_similarity(signature, self.signatures[candidate])
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best
+
+    def to_bytes(self) -> bytes:
+        payload = {
+            'signature_version': SIGNATURE_VERSION,
+            'signatures': {
+                discussion_id: base64.b64encode(signature.tobytes()).decode('ascii')
+                for discussion_id, signature in self.signatures.items()
+            },
+        }
+        return zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), 9)
+
+    @classmethod
+    def from_bytes(cls, competition_id: str, blob: bytes) -> "NearDuplicateIndex":
+        payload = json.loads(zlib.decompress(blob))
+        if payload.get('signature_version') != SIGNATURE_VERSION:
+            # Incomparable signatures: start over, `backfill` rebuilds it
+            return cls(competition_id)
+        return cls(competition_id, {
+            discussion_id: np.frombuffer(base64.b64decode(encoded), dtype=np.uint32)
+            for discussion_id, encoded in payload['signatures'].items()
+        })
+
+    @classmethod
+    def load(cls, db, competition_id: str) -> "NearDuplicateIndex":
+        snapshot = db.collection(NEAR_DUPLICATE_COLLECTION).document(competition_id).get()
+        if not snapshot.exists:
+            return cls(competition_id)
+        return cls.from_bytes(competition_id, snapshot.to_dict()['index'])
+
+    def save(self, db) -> bool:
+        blob = self.to_bytes()
+        if len(blob) > MAX_INDEX_BYTES:
+            print(f"⚠️ Near-duplicate index for {self.competition_id} is {len(blob)} bytes, over the Firestore limit; not saved")
+            return False
+        db.collection(NEAR_DUPLICATE_COLLECTION).document(self.competition_id).set({
+            'index': blob,
+            'discussions': len(self.signatures),
+            'signature_version': SIGNATURE_VERSION,
+        })
+        return True
+
+
+class NearDuplicateFilter:
+    """Near-duplicate check for one sync run over the indexes of the competitions it touches"""
+
+    def __init__(self, db, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.db = db
+        self.threshold = threshold
+        self.indexes: Dict[str, NearDuplicateIndex] = {}
+        # Discussions added in this run; dropped again unless they end up in Pinecone
+        self.added: Dict[str, Set[str]] = defaultdict(set)
+
+    def split(self, discussions: List[Dict]) -> Tuple[List[Dict], Dict[str, str]]:
+        """Discussions to embed, and near-duplicates as {discussion id: canonical discussion id}.
+
+        Within a run the most upvoted of several near-duplicates becomes canonical.
+        """
+        keep, duplicate_of = [], {}
+        for disc in sorted(discussions, key=lambda d: d.get('upvotes') or 0, reverse=True):
+            competition_id = disc.get('competition_id')
+            signature = minhash_signature(disc.get('content') or '')
+            index = self._index(competition_id) if competition_id and signature is not None else None
+            if index is None:
+                keep.append(disc)
+                continue
+            match = None if disc['id'] in index else index.query(signature, self.threshold)
+            if match:
+                duplicate_of[disc['id']] = match[0]
+                print(f"♊ Discussion {disc['id']} is a near-duplicate of {match[0]} ({match[1]:.2f})")
+                continue
+            index.add(disc['id'], signature)
+            self.added[competition_id].add(disc['id'])
+            keep.append(disc)
+        return keep, duplicate_of
+
+    def commit(self, synced_ids: Iterable[str]):
+        """Save the indexes, keeping only the newly added discussions that were synced"""
+        synced_ids = set(synced_ids)
+        for competition_id, index in self.indexes.items():
+            for discussion_id in self.added[competition_id] - synced_ids:
+                index.remove(discussion_id)
+            try:
+                index.save(self.db)
+            except Exception as e:
+                # Best effort like the keyword index; duplicates of unsaved entries are caught once re-synced
+                print(f"⚠️ Could not save near-duplicate index for {competition_id}: {str(e)}")
+
+    def _index(self, competition_id: str) -> Optional[NearDuplicateIndex]:
+        if competition_id not in self.indexes:
+            try:
+                self.indexes[competition_id] = NearDuplicateIndex.load(self.db, competition_id)
+            except Exception as e:
+                print(f"⚠️ Could not load near-duplicate index for {competition_id}: {str(e)}")
+                return None
+        return self.indexes[competition_id]
+
+
+def find_clusters(discussions: List[Dict], threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Dict[str, List[str]]:
+    """Canonical id -> near-duplicate ids, as the sync would decide for this batch of discussions"""
+    indexes: Dict[str, NearDuplicateIndex] = {}
+    clusters = defaultdict(list)
+    for disc in sorted(discussions, key=lambda d: d.get('upvotes') or 0, reverse=True):
+        signature = minhash_signature(disc.get('content') or '')
+        if signature is None or not disc.get('competition_id'):
+            continue
+        index = indexes.setdefault(disc['competition_id'], NearDuplicateIndex(disc['competition_id']))
+        match = index.query(signature, threshold)
+        if match:
+            clusters[match[0]].append(disc['id'])
+        else:
+            index.add(disc['id'], signature)
+    return dict(clusters)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Near-duplicate clusters in a discussion dump")
+    report_parser.add_argument("--discussions", required=True, help="JSON list of discussions")
+    report_parser.add_argument("--threshold", type=float, default=NEAR_DUPLICATE_THRESHOLD)
+    subparsers.add_parser("backfill", help="Index the already synced discussions in Firestore as canonical")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        with open(args.discussions) as f:
+            discussions = json.load(f)
+        clusters = find_clusters(discussions, args.threshold)
+        duplicates = sum(len(ids) for ids in clusters.values())
+        by_id = {disc['id']: disc for disc in discussions}
+        saved_chars = sum(len(by_id[disc_id].get('content') or '') for ids in clusters.values() for disc_id in ids)
+        print(json.dumps({
+            "discussions": len(discussions),
+            "near_duplicates": duplicates,
+            "share": round(duplicates / len(discussions), 4) if discussions else 0.0,
+            "content_chars_not_embedded": saved_chars,
+            "clusters": clusters,
+        }, indent=2))
+    else:
+        from google.cloud import firestore
+        db = firestore.Client()
+        indexes: Dict[str, NearDuplicateIndex] = {}
+        for doc in db.collection('discussions').where('updated', '==', False).stream():
+            disc = doc.to_dict()
+            signature = minhash_signature(disc.get('content') or '')
+            if signature is None or not disc.get('competition_id') or disc.get('duplicate_of') or not disc.get('last_synced'):
+                continue
+            competition_id = disc['competition_id']
+            indexes.setdefault(competition_id, NearDuplicateIndex(competition_id)).add(doc.id, signature)
+        for index in indexes.values():
+            index.save(db)
+        print(f"Indexed {sum(len(index) for index in indexes.values())} synced discussions in {len(indexes)} competitions")
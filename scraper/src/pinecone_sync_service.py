@@ -1,27 +1,90 @@
 import os
 import time
 import json
+import argparse
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import List, Dict
+from typing import List, Dict, Set
 from google.cloud import firestore
 from pinecone import Pinecone
 from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from dotenv import find_dotenv, load_dotenv
+from chunking import EMBEDDING_MODEL, count_tokens, token_chunker, token_length
+from index_alias import IndexTarget, resolve_alias
+from keyword_index import KeywordIndex
+from near_duplicates import NearDuplicateFilter
+from related_competitions import (
+    FIRESTORE_BATCH_LIMIT, fetch_centroids, save_top_discussions, top_discussions, update_related_competitions
+)
+from profiling import run_profile
 
 load_dotenv(find_dotenv())
 
+# Pinecone upsert retries: delays are SYNC_RETRY_BASE_DELAY * 2 ** (attempt - 1) seconds
+SYNC_MAX_RETRIES = 4
+SYNC_RETRY_BASE_DELAY = 2.0
+# Author ranks whose Gold discussions are synced
+EXPERT_RANKS = ["Expert", "Master", "Grandmaster"]
+
+# Chunk budgets in text-embedding-3-small tokens (roughly the old 2000/4000/1000 char limits)
+DISCUSSION_SINGLE_CHUNK_TOKENS = 512
+DISCUSSION_PARAGRAPH_SPLIT_TOKENS = 1024
+DISCUSSION_CHUNK_TOKENS = 512
+DISCUSSION_CHUNK_OVERLAP_TOKENS = 50
+DISCUSSION_SECTION_TOKENS = 400
+DISCUSSION_SECTION_OVERLAP_TOKENS = 40
+COMPETITION_CHUNK_TOKENS = 256
+COMPETITION_CHUNK_OVERLAP_TOKENS = 25
+# Stale-vector lookups (one id listing per source) run concurrently before each upsert
+STALE_LOOKUP_WORKERS = 8
+# Pinecone delete accepts at most 1000 ids
+PINECONE_DELETE_BATCH_SIZE = 1000
+
 class PineconeSyncService:
-    def __init__(self):
+    def __init__(self, connect: bool = True, target: IndexTarget = None):
+        """Set up chunking, plus Pinecone, OpenAI and Firestore clients unless connect=False.
+
+        Vectors go to target, by default wherever the index alias points.
+        """
+        if connect:
+            self._connect(target)
+        
+        # 🚀 NEW: Smart content chunking strategy, measured in embedding tokens
+        self.discussion_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=DISCUSSION_CHUNK_TOKENS,  # Larger chunks to preserve context
+            chunk_overlap=DISCUSSION_CHUNK_OVERLAP_TOKENS,
+            separators=["\n\n\n", "\n\n"],  # Only split on paragraph breaks
+            length_function=token_length,
+        )
+        
+        # Long discussions: pack natural sections (headers, lists, updates) by token count
+        self.section_chunker = token_chunker(DISCUSSION_SECTION_TOKENS, DISCUSSION_SECTION_OVERLAP_TOKENS)
+        
+        # Different strategy for competitions (can be split more)
+        self.competition_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=COMPETITION_CHUNK_TOKENS,
+            chunk_overlap=COMPETITION_CHUNK_OVERLAP_TOKENS,
+            separators=["\n\n", "\n", ". "],
+            length_function=token_length,
+        )
+    
+    def _connect(self, target: IndexTarget = None):
+        """Connect to Firestore, Pinecone and OpenAI embeddings"""
+        # Initialize Firestore
+        self.db = firestore.Client()
+        
         # Initialize Pinecone
         self.pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
-        self.index_name = 'kaggle-competitions'
+        self.target = target or resolve_alias(self.db)
+        self.index_name = self.target.index_name
+        self.namespace = self.target.namespace
         
         try:
             self.index = self.pc.Index(self.index_name)
-            print(f"✅ Connected to existing Pinecone index: {self.index_name}")
+            print(f"✅ Connected to existing Pinecone index: {self.target}")
         except Exception:
             # Create index if needed
             self.pc.create_index(
@@ -32,31 +95,8 @@ class PineconeSyncService:
             )
             self.index = self.pc.Index(self.index_name)
         
-        # Initialize embeddings and vector store
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        self.vector_store = PineconeVectorStore(
-            index=self.index,
-            embedding=self.embeddings
-        )
-        
-        # Initialize Firestore
-        self.db = firestore.Client()
-        
-        # 🚀 NEW: Smart content chunking strategy
-        self.discussion_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=2000,  # Larger chunks to preserve context
-            chunk_overlap=200,
-            separators=["\n\n\n", "\n\n"],  # Only split on paragraph breaks
-            length_function=len,
-        )
-        
-        # Different strategy for competitions (can be split more)
-        self.competition_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=100,
-            separators=["\n\n", "\n", ". "],
-            length_function=len,
-        )
+        # Initialize embeddings (vectors are upserted straight to the index)
+        self.embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
     
     def prepare_discussion_docs_for_rag(self, doc: Dict) -> Dict:
         """Enhanced discussion preparation that preserves coherence"""
@@ -119,123 +159,300 @@ class PineconeSyncService:
     
     def sync_discussions_to_pinecone(self, discussions: List[Dict]):
         """Sync discussions with smart chunking that preserves coherence"""
+        # Reposts and quoted copies of indexed discussions are not embedded again
+        near_duplicates = NearDuplicateFilter(self.db)
+        by_id = {disc['id']: disc for disc in discussions}
+        with run_profile.stage("near_duplicates"):
+            discussions, duplicate_of = near_duplicates.split(discussions)
+        
+        with run_profile.stage("chunking"):
+            documents = self.build_discussion_documents(discussions)
+        run_profile.count("discussion_chunks", len(documents))
+        
+        # Batch processing to avoid Pinecone limits
+        chunked_ids = {doc.metadata['id'] for doc in documents}
+        synced_ids = self._add_documents_in_batches(documents, "discussions") if documents else set()
+        
+        # Discussions that produced no chunks failed validation and have nothing to retry
+        done_ids = [disc['id'] for disc in discussions if disc['id'] in synced_ids or disc['id'] not in chunked_ids]
+        failed_ids = [disc['id'] for disc in discussions if disc['id'] in chunked_ids and disc['id'] not in synced_ids]
+        # A near-duplicate of a discussion from this run only counts once that one is in Pinecone
+        batch_ids = {disc['id'] for disc in discussions}
+        duplicate_of = {
+            disc_id: canonical_id for disc_id, canonical_id in duplicate_of.items()
+            if canonical_id not in batch_ids or canonical_id in synced_ids
+        }
+        with run_profile.stage("near_duplicates"):
+            near_duplicates.commit(synced_ids)
+        if duplicate_of:
+            # Duplicates embedded by an earlier run lose their vectors; the rest are retried next run
+            cleared_ids = self.delete_discussion_vectors([by_id[disc_id] for disc_id in duplicate_of])
+            failed_ids += [disc_id for disc_id in duplicate_of if disc_id not in cleared_ids]
+            duplicate_of = {disc_id: canonical_id for disc_id, canonical_id in duplicate_of.items() if disc_id in cleared_ids}
+        if synced_ids:
+            with run_profile.stage("keyword_index"):
+                self.update_keyword_indexes([doc for doc in documents if doc.metadata['id'] in synced_ids])
+            with run_profile.stage("related_competitions"):
+                self.update_top_discussions([disc for disc in discussions if disc['id'] in synced_ids])
+        with run_profile.stage("firestore_write"):
+            if done_ids:
+                self.mark_discussions_synced(done_ids)
+            if duplicate_of:
+                self.mark_discussions_duplicate(duplicate_of)
+            if failed_ids:
+                self.mark_sync_failed('discussions', failed_ids)
+        run_profile.count("discussions_synced", len(synced_ids))
+        run_profile.count("discussions_near_duplicate", len(duplicate_of))
+        run_profile.count("discussions_failed", len(failed_ids))
+    
+    def update_top_discussions(self, discussions: List[Dict]):
+        """Merge synced discussions into their competitions' top lists for the related-competitions response"""
+        try:
+            save_top_discussions(self.db, top_discussions(discussions))
+        except Exception as e:
+            # Derived data; the next sync of the competition's discussions or a reindex rebuilds it
+            print(f"⚠️ Could not update top discussions: {str(e)}")
+    
+    def build_discussion_documents(self, discussions: List[Dict]) -> List[Document]:
+        """Prepare and chunk discussions into embeddable documents"""
         documents = []
         
-        for disc in discussions:
-            processed_disc = self.prepare_discussion_docs_for_rag(disc)
-            
-            # Quality validation
-            if (not processed_disc["competition_id"] or 
-                not processed_disc["text"] or 
-                len(processed_disc["text"].strip()) < 100):
-                continue
-            
+        processed = [self.prepare_discussion_docs_for_rag(disc) for disc in discussions]
+        # Quality validation
+        processed = [
+            disc for disc in processed
+            if disc["competition_id"] and disc["text"] and len(disc["text"].strip()) >= 100
+        ]
+        # Token counts for every discussion in one batched encode
+        token_counts = count_tokens([disc["text"] for disc in processed])
+        
+        for processed_disc, n_tokens in zip(processed, token_counts):
             # 🎯 SMART CHUNKING STRATEGY
-            text_length = len(processed_disc["text"])
-            
-            if text_length <= 2000:
+            if n_tokens <= DISCUSSION_SINGLE_CHUNK_TOKENS:
                 # Small discussions: Keep as single chunk (preserve full context)
-                doc = Document(
-                    page_content=processed_disc["text"],
-                    metadata={k: v for k, v in processed_disc.items() if k != "text"}
-                )
+                metadata = {k: v for k, v in processed_disc.items() if k != "text"}
+                metadata.update({
+                    'parent_id': processed_disc['id'],
+                    'chunk_index': 0,
+                    'total_chunks': 1,
+                    'chunk_type': 'complete_discussion'
+                })
+                doc = Document(page_content=processed_disc["text"], metadata=metadata)
                 documents.append(doc)
-                
-            elif text_length <= 4000:
+                continue
+            
+            if n_tokens <= DISCUSSION_PARAGRAPH_SPLIT_TOKENS:
                 # Medium discussions: Split carefully on paragraph breaks only
                 chunks = self.discussion_splitter.split_text(processed_disc["text"])
-                for i, chunk in enumerate(chunks):
-                    metadata = {k: v for k, v in processed_disc.items() if k != "text"}
-                    metadata.update({
-                        'chunk_index': i,
-                        'total_chunks': len(chunks),
-                        'chunk_type': 'discussion_part'
-                    })
-                    
-                    doc = Document(page_content=chunk, metadata=metadata)
-                    documents.append(doc)
-            
+                chunk_type = 'discussion_part'
             else:
                 # Very long discussions: Use semantic splitting
                 # Try to split on natural discussion sections
-                semantic_chunks = self._split_discussion_semantically(processed_disc["text"])
+                chunks = self._split_discussion_semantically(processed_disc["text"])
+                chunk_type = 'discussion_section'
+            
+            for i, chunk in enumerate(chunks):
+                metadata = {k: v for k, v in processed_disc.items() if k != "text"}
+                metadata.update({
+                    'parent_id': processed_disc['id'],
+                    'chunk_index': i,
+                    'total_chunks': len(chunks),
+                    'chunk_type': chunk_type
+                })
                 
-                for i, chunk in enumerate(semantic_chunks):
-                    metadata = {k: v for k, v in processed_disc.items() if k != "text"}
-                    metadata.update({
-                        'chunk_index': i,
-                        'total_chunks': len(semantic_chunks),
-                        'chunk_type': 'discussion_section'
-                    })
-                    
-                    doc = Document(page_content=chunk, metadata=metadata)
-                    documents.append(doc)
+                doc = Document(page_content=chunk, metadata=metadata)
+                documents.append(doc)
         
-        # Batch processing to avoid Pinecone limits
-        if documents:
-            self._add_documents_in_batches(documents, "discussions")
-            self.mark_discussions_synced([disc['id'] for disc in discussions])
+        return documents
     
+    def update_keyword_indexes(self, documents: List[Document]):
+        """Re-index synced discussion chunks in their competitions' BM25 keyword indexes"""
+        by_competition = defaultdict(list)
+        for doc in documents:
+            by_competition[doc.metadata['competition_id']].append(doc)
+        
+        for competition_id, comp_docs in by_competition.items():
+            try:
+                index = KeywordIndex.load(self.db, competition_id)
+                # Replace every chunk of a re-synced discussion so shrunk discussions leave no stale chunks
+                index.remove_parents(doc.metadata['parent_id'] for doc in comp_docs)
+                for doc in comp_docs:
+                    index.add(vector_id(doc), doc.metadata['parent_id'], doc.page_content)
+                if index.save(self.db):
+                    print(f"🔤 Keyword index for {competition_id}: {len(index.docs)} chunks")
+            except Exception as e:
+                # The keyword side is best effort; dense search still has the vectors
+                print(f"⚠️ Could not update keyword index for {competition_id}: {str(e)}")
+    
+    def delete_discussion_vectors(self, discussions: List[Dict]) -> Set[str]:
+        """Delete every chunk stored for the discussions, and their keyword index entries.
+
+        Used for discussions now marked as near-duplicates: one embedded by an
+        earlier run would otherwise still be returned next to its canonical
+        discussion. Returns the ids whose chunks are gone (or never existed).
+        """
+        with ThreadPoolExecutor(max_workers=min(STALE_LOOKUP_WORKERS, len(discussions))) as executor:
+            listed = list(executor.map(self._discussion_vector_ids, discussions))
+
+        cleared, deleted_by_competition = set(), defaultdict(list)
+        for disc, ids in zip(discussions, listed):
+            if ids is None:
+                continue
+            try:
+                namespace = self.target.namespace_for('discussion', disc.get('competition_id'))
+                for i in range(0, len(ids), PINECONE_DELETE_BATCH_SIZE):
+                    self.index.delete(ids=ids[i:i + PINECONE_DELETE_BATCH_SIZE], namespace=namespace)
+            except Exception as e:
+                print(f"⚠️ Could not delete the vectors of discussion {disc['id']}: {str(e)}")
+                continue
+            cleared.add(disc['id'])
+            if ids:
+                deleted_by_competition[disc.get('competition_id')].append(disc['id'])
+                print(f"🗑️ Deleted {len(ids)} chunks of near-duplicate discussion {disc['id']}")
+            run_profile.count("duplicate_vectors_deleted", len(ids), competition_id=disc.get('competition_id'))
+
+        for competition_id, parent_ids in deleted_by_competition.items():
+            try:
+                index = KeywordIndex.load(self.db, competition_id)
+                index.remove_parents(parent_ids)
+                index.save(self.db)
+            except Exception as e:
+                # Best effort as in update_keyword_indexes; hits without a vector are dropped at query time
+                print(f"⚠️ Could not update keyword index for {competition_id}: {str(e)}")
+        return cleared
+
+    def _discussion_vector_ids(self, disc: Dict):
+        """Chunk ids stored for a discussion, or None if the listing failed"""
+        prefix = f"discussion-{disc['id']}-"
+        namespace = self.target.namespace_for('discussion', disc.get('competition_id'))
+        try:
+            return [
+                existing_id
+                for page in self.index.list(prefix=prefix, namespace=namespace)
+                for existing_id in page if existing_id[len(prefix):].isdigit()
+            ]
+        except Exception as e:
+            print(f"⚠️ Could not list the vectors of discussion {disc['id']}: {str(e)}")
+            return None
+
     def _split_discussion_semantically(self, text: str) -> List[str]:
         """Smart semantic splitting for very long discussions"""
-        # Look for natural discussion sections
-        section_markers = [
-            "\n\n**",  # Bold headers
-            "\n\n##",  # Markdown headers
-            "\n\n1.",  # Numbered lists
-            "\n\n-",   # Bullet points
-            "\nConclusion",
-            "\nSummary",
-            "\nUpdate:",
-            "\nEdit:",
-        ]
-        
-        # Try to split on semantic boundaries first
-        for marker in section_markers:
-            if marker in text:
-                parts = text.split(marker)
-                if len(parts) > 1:
-                    # Rejoin with markers and ensure minimum chunk size
-                    chunks = []
-                    current_chunk = parts[0]
-                    
-                    for i, part in enumerate(parts[1:], 1):
-                        section = marker + part
-                        if len(current_chunk) > 1500:  # Start new chunk
-                            chunks.append(current_chunk.strip())
-                            current_chunk = section
-                        else:  # Continue building current chunk
-                            current_chunk += section
-                    
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    
-                    return [chunk for chunk in chunks if len(chunk.strip()) > 100]
-        
-        # Fallback to paragraph-based splitting if no semantic markers found
-        return self.discussion_splitter.split_text(text)
+        # Split on every section marker in one pass, then pack sections under a hard size cap
+        return self.section_chunker.split_text(text)
     
-    def _add_documents_in_batches(self, documents: List[Document], doc_type: str):
-        """Add documents to Pinecone in batches to avoid size limits"""
+    def _add_documents_in_batches(self, documents: List[Document], doc_type: str) -> Set[str]:
+        """Add documents to Pinecone in batches, returning the ids of fully synced sources.
+
+        A source (competition or discussion) only counts as synced when every one of
+        its chunks was upserted. Failed batches go to a retry queue that is drained
+        with exponential backoff once the first pass is done.
+        """
         batch_size = 40  # Conservative batch size
-        total_batches = (len(documents) + batch_size - 1) // batch_size
+        # Per-competition namespaces: keep each competition's chunks together so a batch spans few namespaces
+        documents = sorted(documents, key=self._namespace_for)
+        batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+        total_batches = len(batches)
         
         print(f"📦 Processing {len(documents)} {doc_type} in {total_batches} batches...")
         
-        for i in range(0, len(documents), batch_size):
-            batch_docs = documents[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            
+        retry_queue = deque()
+        for batch_num, batch_docs in enumerate(batches, 1):
             try:
-                self.vector_store.add_documents(batch_docs)
+                self._upsert_batch(batch_docs)
                 print(f"  ✅ Batch {batch_num}/{total_batches}: {len(batch_docs)} chunks")
                 time.sleep(0.5)  # Rate limiting
                 
             except Exception as e:
-                print(f"  ❌ Error in batch {batch_num}: {str(e)}")
-                continue
-        
-        print(f"✅ Synced {len(documents)} {doc_type} chunks to Pinecone")
+                print(f"  ❌ Error in batch {batch_num}: {str(e)} (queued for retry)")
+                retry_queue.append((batch_num, batch_docs, 1))
+        
+        failed_ids = set()
+        while retry_queue:
+            batch_num, batch_docs, attempt = retry_queue.popleft()
+            delay = SYNC_RETRY_BASE_DELAY * (2 ** (attempt - 1))
+            print(f"  🔁 Retrying batch {batch_num} (attempt {attempt}/{SYNC_MAX_RETRIES}) in {delay:.1f}s...")
+            time.sleep(delay)
+            try:
+                self._upsert_batch(batch_docs)
+                print(f"  ✅ Batch {batch_num}/{total_batches}: {len(batch_docs)} chunks (after retry)")
+            except Exception as e:
+                if attempt < SYNC_MAX_RETRIES:
+                    retry_queue.append((batch_num, batch_docs, attempt + 1))
+                else:
+                    print(f"  ❌ Giving up on batch {batch_num}: {str(e)}")
+                    failed_ids.update(doc.metadata['id'] for doc in batch_docs)
+        
+        synced_ids = {doc.metadata['id'] for doc in documents} - failed_ids
+        print(f"✅ Synced {len(synced_ids)} {doc_type} to Pinecone ({len(failed_ids)} failed, left pending)")
+        return synced_ids
+
+    def _upsert_batch(self, batch_docs: List[Document]):
+        """Embed and upsert a batch with deterministic vector ids so retries overwrite instead of duplicating"""
+        texts = [doc.page_content for doc in batch_docs]
+        with run_profile.stage("embedding"):
+            embeddings = self.embeddings.embed_documents(texts)
+        # Tokens are billed per embedding call, retries included
+        for doc, n_tokens in zip(batch_docs, count_tokens(texts)):
+            run_profile.count("tokens_embedded", n_tokens, competition_id=doc.metadata.get('competition_id'))
+        
+        # Same vector layout LangChain's PineconeVectorStore wrote: chunk text under metadata['text']
+        vectors_by_namespace = defaultdict(list)
+        for doc, embedding in zip(batch_docs, embeddings):
+            vectors_by_namespace[self._namespace_for(doc)].append(
+                (vector_id(doc), embedding, {**doc.metadata, 'text': doc.page_content})
+            )
+        with run_profile.stage("stale_vectors"):
+            self._delete_stale_vectors(batch_docs)
+        with run_profile.stage("upsert"):
+            for namespace, vectors in vectors_by_namespace.items():
+                self.index.upsert(vectors=vectors, namespace=namespace)
+        for competition_id, n_vectors in Counter(doc.metadata.get('competition_id') for doc in batch_docs).items():
+            run_profile.count("vectors_upserted", n_vectors, competition_id=competition_id)
+
+    def _delete_stale_vectors(self, batch_docs: List[Document]):
+        """Delete chunks of the batch's sources that the upsert would not overwrite.
+
+        A re-synced source that shrank keeps its chunks past the new total_chunks.
+        Each source is handled once, in the batch holding its first chunk. Vectors
+        LangChain wrote under random ids are removed once by `reindex.py purge-legacy`.
+        """
+        first_chunks = [doc for doc in batch_docs if doc.metadata.get('chunk_index', 0) == 0]
+        if not first_chunks:
+            return
+        with ThreadPoolExecutor(max_workers=min(STALE_LOOKUP_WORKERS, len(first_chunks))) as executor:
+            stale_ids = list(executor.map(self._stale_vector_ids, first_chunks))
+        
+        stale_by_namespace = defaultdict(list)
+        for doc, ids in zip(first_chunks, stale_ids):
+            stale_by_namespace[self._namespace_for(doc)].extend(ids)
+        for namespace, ids in stale_by_namespace.items():
+            for i in range(0, len(ids), PINECONE_DELETE_BATCH_SIZE):
+                self.index.delete(ids=ids[i:i + PINECONE_DELETE_BATCH_SIZE], namespace=namespace)
+        run_profile.count("stale_vectors_deleted", sum(len(ids) for ids in stale_ids))
+
+    def _stale_vector_ids(self, doc: Document) -> List[str]:
+        """Chunk ids stored for doc's source at or past its new total_chunks"""
+        prefix = f"{doc.metadata['type']}-{doc.metadata['id']}-"
+        total_chunks = doc.metadata.get('total_chunks', 1)
+        stale = []
+        for page in self.index.list(prefix=prefix, namespace=self._namespace_for(doc)):
+            for existing_id in page:
+                suffix = existing_id[len(prefix):]
+                # Slugs contain hyphens, so competition-foo- also prefixes competition-foo-bar-0
+                if suffix.isdigit() and int(suffix) >= total_chunks:
+                    stale.append(existing_id)
+        return stale
+
+    def _namespace_for(self, doc: Document) -> str:
+        return self.target.namespace_for(doc.metadata['type'], doc.metadata.get('competition_id'))
+
+    def _commit_updates_in_chunks(self, collection: str, doc_ids: List[str], fields: Dict):
+        """Apply the same field update to many documents, committing at most 500 writes per batch"""
+        for i in range(0, len(doc_ids), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for doc_id in doc_ids[i:i + FIRESTORE_BATCH_LIMIT]:
+                batch.update(self.db.collection(collection).document(doc_id), fields)
+            batch.commit()
 
 
     # Add these missing methods to your PineconeSyncService class:
@@ -245,12 +462,14 @@ class PineconeSyncService:
         print("🔄 Starting enhanced RAG-optimized Pinecone sync...")
         
         # Sync competitions
-        updated_competitions = self.get_updated_competitions()
+        with run_profile.stage("firestore_read"):
+            updated_competitions = self.get_updated_competitions()
         if updated_competitions:
             self.sync_competitions_to_pinecone(updated_competitions)
         
         # Sync high-quality discussions with enhanced RAG preparation
-        updated_discussions = self.get_updated_gold_expert_discussions()
+        with run_profile.stage("firestore_read"):
+            updated_discussions = self.get_updated_gold_expert_discussions()
         if updated_discussions:
             self.sync_discussions_to_pinecone(updated_discussions)
         
@@ -274,11 +493,10 @@ class PineconeSyncService:
         """Get ONLY Gold medal discussions from Expert+ authors with updated=True"""
         discussions_ref = self.db.collection('discussions')
         
-        expert_ranks = ["Expert", "Master", "Grandmaster"]
         discussions = []
         
         # Query for each expert rank separately (Firestore limitation)
-        for rank in expert_ranks:
+        for rank in EXPERT_RANKS:
             query = (discussions_ref
                     .where('updated', '==', True)
                     .where('medal_type', '==', 'Gold')
@@ -323,6 +541,44 @@ class PineconeSyncService:
 
     def sync_competitions_to_pinecone(self, competitions: List[Dict]):
         """Sync competitions to Pinecone with enhanced preparation"""
+        with run_profile.stage("chunking"):
+            documents = self.build_competition_documents(competitions)
+        run_profile.count("competition_chunks", len(documents))
+        
+        chunked_ids = {doc.metadata['id'] for doc in documents}
+        synced_ids = self._add_documents_in_batches(documents, "competitions") if documents else set()
+        
+        # Competitions that produced no chunks failed validation and have nothing to retry
+        done_ids = [comp['id'] for comp in competitions if comp['id'] in synced_ids or comp['id'] not in chunked_ids]
+        failed_ids = [comp['id'] for comp in competitions if comp['id'] in chunked_ids and comp['id'] not in synced_ids]
+        if synced_ids:
+            with run_profile.stage("related_competitions"):
+                self.update_competition_similarity([doc for doc in documents if doc.metadata['id'] in synced_ids])
+        with run_profile.stage("firestore_write"):
+            if done_ids:
+                self.mark_competitions_synced(done_ids)
+            if failed_ids:
+                self.mark_sync_failed('competitions', failed_ids)
+        run_profile.count("competitions_synced", len(synced_ids))
+        run_profile.count("competitions_failed", len(failed_ids))
+
+    def update_competition_similarity(self, documents: List[Document]):
+        """Refresh centroids of synced competitions and the related-competitions table"""
+        chunk_ids = defaultdict(list)
+        info = {}
+        for doc in documents:
+            chunk_ids[doc.metadata['id']].append(vector_id(doc))
+            info[doc.metadata['id']] = {key: doc.metadata.get(key, '') for key in ('title', 'url', 'deadline')}
+        
+        try:
+            centroids = fetch_centroids(self.index, chunk_ids, namespace=self.namespace)
+            update_related_competitions(self.db, centroids, info)
+        except Exception as e:
+            # Similarity is derived data; the next competition sync rebuilds it
+            print(f"⚠️ Could not update related competitions: {str(e)}")
+
+    def build_competition_documents(self, competitions: List[Dict]) -> List[Document]:
+        """Prepare and chunk competitions into embeddable documents"""
         documents = []
         
         # Process competitions
@@ -333,10 +589,11 @@ class PineconeSyncService:
             doc for doc in processed_competitions 
             if len(doc["text"].strip()) > 100
         ]
+        token_counts = count_tokens([comp["text"] for comp in quality_competitions])
         
-        for comp in quality_competitions:
+        for comp, n_tokens in zip(quality_competitions, token_counts):
             # Split competitions if they're too long
-            if len(comp["text"]) <= 1000:
+            if n_tokens <= COMPETITION_CHUNK_TOKENS:
                 # Small competitions: Keep whole
                 doc = Document(
                     page_content=comp["text"],
@@ -357,9 +614,7 @@ class PineconeSyncService:
                     doc = Document(page_content=chunk, metadata=metadata)
                     documents.append(doc)
         
-        if documents:
-            self._add_documents_in_batches(documents, "competitions")
-            self.mark_competitions_synced([comp['id'] for comp in competitions])
+        return documents
 
     def prepare_competition_docs(self, doc: Dict) -> Dict:
         """Enhanced competition document preparation with better formatting"""
@@ -391,65 +646,143 @@ class PineconeSyncService:
 
     def mark_competitions_synced(self, competition_ids: List[str]):
         """Mark competitions as synced in Firestore"""
-        batch = self.db.batch()
-        for comp_id in competition_ids:
-            doc_ref = self.db.collection('competitions').document(comp_id)
-            batch.update(doc_ref, {
-                'updated': False,
-                'last_synced': datetime.now(timezone.utc).isoformat()
-            })
-        batch.commit()
+        self._commit_updates_in_chunks('competitions', competition_ids, {
+            'updated': False,
+            'last_synced': datetime.now(timezone.utc).isoformat(),
+            'last_sync_failure': firestore.DELETE_FIELD
+        })
         print(f"📝 Marked {len(competition_ids)} competitions as synced")
 
     def mark_discussions_synced(self, discussion_ids: List[str]):
         """Mark discussions as synced in Firestore"""
-        batch = self.db.batch()
-        for disc_id in discussion_ids:
-            doc_ref = self.db.collection('discussions').document(disc_id)
-            batch.update(doc_ref, {
-                'updated': False,
-                'last_synced': datetime.now(timezone.utc).isoformat()
-            })
-        batch.commit()
+        self._commit_updates_in_chunks('discussions', discussion_ids, {
+            'updated': False,
+            'last_synced': datetime.now(timezone.utc).isoformat(),
+            'last_sync_failure': firestore.DELETE_FIELD
+        })
         print(f"📝 Marked {len(discussion_ids)} discussions as synced")
 
+    def mark_discussions_duplicate(self, duplicate_of: Dict[str, str]):
+        """Mark near-duplicates as synced without vectors, pointing at the discussion that was embedded"""
+        synced_at = datetime.now(timezone.utc).isoformat()
+        items = list(duplicate_of.items())
+        for i in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for disc_id, canonical_id in items[i:i + FIRESTORE_BATCH_LIMIT]:
+                batch.update(self.db.collection('discussions').document(disc_id), {
+                    'updated': False,
+                    'last_synced': synced_at,
+                    'duplicate_of': canonical_id,
+                    'last_sync_failure': firestore.DELETE_FIELD
+                })
+            batch.commit()
+        print(f"📝 Marked {len(items)} discussions as near-duplicates")
+
+    def mark_sync_failed(self, collection: str, doc_ids: List[str]):
+        """Record a failed sync attempt, leaving updated=True so the next run retries it"""
+        self._commit_updates_in_chunks(collection, doc_ids, {
+            'sync_attempts': firestore.Increment(1),
+            'last_sync_failure': datetime.now(timezone.utc).isoformat()
+        })
+        print(f"⚠️ {len(doc_ids)} {collection} failed to sync and remain pending")
+
     def get_stats(self) -> dict:
         """Get statistics about the vector store and sync status"""
-        try:
-            # Pinecone stats
-            pinecone_stats = self.index.describe_index_stats()
-            
-            # Firestore stats
-            competitions_pending = len(list(self.db.collection('competitions').where('updated', '==', True).stream()))
-            discussions_pending = 0
-            
-            # Count pending discussions by rank
-            expert_ranks = ["Expert", "Master", "Grandmaster"]
-            for rank in expert_ranks:
-                query = (self.db.collection('discussions')
-                        .where('updated', '==', True)
-                        .where('medal_type', '==', 'Gold')
-                        .where('author_kaggle_rank', '==', rank))
-                rank_pending = len(list(query.stream()))
-                discussions_pending += rank_pending
-            
-            return {
-                'pinecone': {
-                    'total_vectors': pinecone_stats.total_vector_count,
-                    'dimension': pinecone_stats.dimension,
-                    'index_fullness': pinecone_stats.index_fullness,
-                },
-                'firestore_pending': {
-                    'competitions': competitions_pending,
-                    'discussions': discussions_pending
-                }
+        return collect_sync_stats(self.index, self.db, self.target)
+
+
+def vector_id(doc: Document) -> str:
+    """Deterministic Pinecone id for a chunk, shared by upserts and the keyword index"""
+    return f"{doc.metadata['type']}-{doc.metadata['id']}-{doc.metadata.get('chunk_index', 0)}"
+
+
+def _count_query(query) -> int:
+    """Count matching documents server-side with an aggregation query (no document reads)"""
+    return int(query.count(alias="count").get()[0][0].value)
+
+
+def collect_sync_stats(index, db, target: IndexTarget = None) -> dict:
+    """Collect vector store and pending-sync statistics.
+
+    Uses Firestore count() aggregations and a single describe_index_stats call,
+    all issued concurrently, so it is cheap enough to call before and after every run.
+    index is the target's index; live_vectors counts the namespaces the target reads.
+    """
+    target = target or IndexTarget()
+    discussions_ref = db.collection('discussions')
+    count_queries = {
+        'competitions': db.collection('competitions').where('updated', '==', True),
+    }
+    for rank in EXPERT_RANKS:
+        count_queries[f'discussions_{rank}'] = (discussions_ref
+                .where('updated', '==', True)
+                .where('medal_type', '==', 'Gold')
+                .where('author_kaggle_rank', '==', rank))
+    
+    try:
+        with ThreadPoolExecutor(max_workers=len(count_queries) + 1) as executor:
+            pinecone_future = executor.submit(index.describe_index_stats)
+            count_futures = {name: executor.submit(_count_query, query) for name, query in count_queries.items()}
+            counts = {name: future.result() for name, future in count_futures.items()}
+            pinecone_stats = pinecone_future.result()
+        
+        namespaces = {
+            name or '__default__': summary.vector_count
+            for name, summary in (pinecone_stats.namespaces or {}).items()
+        }
+        
+        return {
+            'pinecone': {
+                'total_vectors': pinecone_stats.total_vector_count,
+                'dimension': pinecone_stats.dimension,
+                'index_fullness': pinecone_stats.index_fullness,
+                'namespaces': namespaces,
+                'target': target.to_dict(),
+                'live_vectors': sum(
+                    summary.vector_count for name, summary in (pinecone_stats.namespaces or {}).items()
+                    if target.owns_namespace(name)
+                ),
+            },
+            'firestore_pending': {
+                'competitions': counts['competitions'],
+                'discussions': sum(counts[f'discussions_{rank}'] for rank in EXPERT_RANKS),
+                'discussions_by_rank': {rank: counts[f'discussions_{rank}'] for rank in EXPERT_RANKS},
             }
-        except Exception as e:
-            print(f"❌ Error getting stats: {str(e)}")
-            return {'error': str(e)}
+        }
+    except Exception as e:
+        print(f"❌ Error getting stats: {str(e)}")
+        return {'error': str(e)}
+
+
+def print_stats(stats: dict):
+    """Print the output of collect_sync_stats in the pipeline's log format"""
+    if 'error' in stats:
+        print(f"  Error getting stats: {stats['error']}")
+        return
+    print(f"  Pinecone vectors: {stats['pinecone']['total_vectors']}")
+    print(f"  Live target {IndexTarget.from_dict(stats['pinecone']['target'])}: "
+          f"{stats['pinecone']['live_vectors']} vectors")
+    for namespace, count in sorted(stats['pinecone']['namespaces'].items()):
+        print(f"    {namespace}: {count}")
+    print(f"  Pending competitions: {stats['firestore_pending']['competitions']}")
+    print(f"  Pending Gold+Expert discussions: {stats['firestore_pending']['discussions']}")
+
 
-# Add this at the end of the file:
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync updated Firestore items to Pinecone")
+    parser.add_argument("--stats", action="store_true", help="Only print index and pending-sync statistics")
+    args = parser.parse_args()
+    
+    if args.stats:
+        # Stats only need the index handle and Firestore, not embeddings or splitters
+        db = firestore.Client()
+        pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
+        # Whatever index and namespace the alias points at, as the sync and the backend use
+        target = resolve_alias(db)
+        stats = collect_sync_stats(pc.Index(target.index_name), db, target)
+        print(json.dumps(stats, indent=2))
+        raise SystemExit(0 if 'error' not in stats else 1)
+    
     print("🚀 Starting Enhanced RAG-Optimized Pinecone Sync")
     print("=" * 60)
     
@@ -457,13 +790,7 @@ if __name__ == "__main__":
     
     # Print current stats
     print("\n📊 CURRENT STATS:")
-    stats = sync_service.get_stats()
-    if 'error' not in stats:
-        print(f"  Pinecone vectors: {stats['pinecone']['total_vectors']}")
-        print(f"  Pending competitions: {stats['firestore_pending']['competitions']}")
-        print(f"  Pending Gold+Expert discussions: {stats['firestore_pending']['discussions']}")
-    else:
-        print(f"  Error getting stats: {stats['error']}")
+    print_stats(sync_service.get_stats())
     
     # Run enhanced sync
     print(f"\n🔄 STARTING ENHANCED RAG SYNC:")
@@ -473,13 +800,10 @@ if __name__ == "__main__":
     
     sync_time = time.time() - start_time
     print(f"\n⏱️ Sync completed in {sync_time:.2f} seconds")
+    run_profile.write_report()
     
     # Print updated stats
     print(f"\n📊 AFTER SYNC:")
-    stats = sync_service.get_stats()
-    if 'error' not in stats:
-        print(f"  Pinecone vectors: {stats['pinecone']['total_vectors']}")
-        print(f"  Pending competitions: {stats['firestore_pending']['competitions']}")
-        print(f"  Pending Gold+Expert discussions: {stats['firestore_pending']['discussions']}")
+    print_stats(sync_service.get_stats())
     
-    print(f"\n🎉 Enhanced RAG sync pipeline completed!")
\ No newline at end of file
+    print(f"\n🎉 Enhanced RAG sync pipeline completed!")
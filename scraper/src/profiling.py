@@ -0,0 +1,135 @@
+"""
+Run profile for the scrape + sync pipeline.
+
+KaggleScraper and PineconeSyncService record stage timings, counters and peak
+values (such as browser memory) into
+the shared `run_profile`; the entry points write it as a JSON report at the end
+of every run so stage times can be compared between scheduled runs:
+
+    python profiling.py compare reports/run_A.json reports/run_B.json
+"""
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+REPORT_DIR = os.environ.get(
+    "PROFILE_REPORT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reports")
+)
+# Stage slowdowns below this fraction are treated as noise by `compare`
+REGRESSION_THRESHOLD = 0.25
+
+
+class RunProfile:
+    """Wall-clock time per stage plus counters, overall and per competition"""
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.stages = defaultdict(lambda: {"total_s": 0.0, "calls": 0, "max_s": 0.0})
+        self.counters = defaultdict(int)
+        self.peaks = {}
+        self.competitions = defaultdict(lambda: {"counters": defaultdict(int), "stages_s": defaultdict(float)})
+
+    @contextmanager
+    def stage(self, name: str, competition_id: Optional[str] = None):
+        """Time a block (sync or inside a coroutine) as one call of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stage = self.stages[name]
+            stage["total_s"] += elapsed
+            stage["calls"] += 1
+            stage["max_s"] = max(stage["max_s"], elapsed)
+            if competition_id:
+                self.competitions[competition_id]["stages_s"][name] += elapsed
+
+    def count(self, name: str, n: int = 1, competition_id: Optional[str] = None):
+        self.counters[name] += n
+        if competition_id:
+            self.competitions[competition_id]["counters"][name] += n
+
+    def peak(self, name: str, value: float):
+        """Keep the largest value seen, e.g. memory sampled during the run"""
+        self.peaks[name] = max(self.peaks.get(name, value), value)
+
+    def report(self, status: str = "ok") -> Dict:
+        return {
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "duration_s": round(time.perf_counter() - self._start, 3),
+            "status": status,
+            "stages": {
+                name: {
+                    "total_s": round(stage["total_s"], 3),
+                    "calls": stage["calls"],
+                    "mean_ms": round(stage["total_s"] / stage["calls"] * 1000, 2) if stage["calls"] else 0.0,
+                    "max_ms": round(stage["max_s"] * 1000, 2),
+                }
+                for name, stage in sorted(self.stages.items())
+            },
+            "counters": dict(sorted(self.counters.items())),
+            "peaks": {name: round(value, 1) for name, value in sorted(self.peaks.items())},
+            "competitions": {
+                competition_id: {
+                    "counters": dict(sorted(data["counters"].items())),
+                    "stages_s": {name: round(seconds, 3) for name, seconds in sorted(data["stages_s"].items())},
+                }
+                for competition_id, data in sorted(self.competitions.items())
+            },
+        }
+
+    def write_report(self, status: str = "ok", path: Optional[str] = None) -> str:
+        """Write the report as JSON; defaults to reports/run_<UTC timestamp>.json"""
+        if path is None:
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            path = os.path.join(REPORT_DIR, f"run_{self.started_at.strftime('%Y%m%dT%H%M%SZ')}.json")
+        with open(path, "w") as f:
+            json.dump(self.report(status), f, indent=2)
+        print(f"📈 Profile report written to {path}")
+        return path
+
+
+def compare_reports(previous: Dict, current: Dict, threshold: float = REGRESSION_THRESHOLD) -> Dict:
+    """Per-stage mean latency change between two reports, flagging slowdowns above threshold"""
+    changes = {}
+    for name, stage in current["stages"].items():
+        before = previous["stages"].get(name)
+        if not before or not before["mean_ms"]:
+            continue
+        change = (stage["mean_ms"] - before["mean_ms"]) / before["mean_ms"]
+        changes[name] = {
+            "mean_ms": [before["mean_ms"], stage["mean_ms"]],
+            "change": round(change, 3),
+            "regression": change > threshold,
+        }
+    return changes
+
+
+# Shared by the scraper and the sync service within one pipeline run
+run_profile = RunProfile()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compare_parser = subparsers.add_parser("compare", help="Compare stage latencies of two run reports")
+    compare_parser.add_argument("previous")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    with open(args.previous) as f:
+        previous = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    changes = compare_reports(previous, current, args.threshold)
+    print(json.dumps(changes, indent=2))
+    raise SystemExit(1 if any(change["regression"] for change in changes.values()) else 0)
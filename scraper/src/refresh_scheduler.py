@@ -0,0 +1,76 @@
+"""
+Adaptive per-competition refresh scheduling.
+
+Every run still walks the active competition listing, but only crawls the
+competitions that are due. A competition's refresh interval is the time in
+which its smoothed change rate (new posts plus re-voted discussions per hour,
+from CrawlState) is expected to produce TARGET_CHANGES_PER_CRAWL changes, and
+it shrinks as the deadline approaches. Due competitions are taken from a
+priority queue, most overdue first, up to an optional per-run cap.
+
+simulate_schedule.py replays change logs through this scheduler.
+"""
+import heapq
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from crawl_state import CrawlState, parse_datetime
+
+# Cadence of the scheduled scraper run (.github/workflows/scrape.yml)
+RUN_INTERVAL_HOURS = 4
+MIN_REFRESH_HOURS = float(os.environ.get('MIN_REFRESH_HOURS', RUN_INTERVAL_HOURS))
+MAX_REFRESH_HOURS = float(os.environ.get('MAX_REFRESH_HOURS', 96))
+# Crawl once about this many changes are expected since the last crawl
+TARGET_CHANGES_PER_CRAWL = 2
+# Within this many days of the deadline the interval shrinks linearly towards MIN_REFRESH_HOURS
+DEADLINE_WINDOW_DAYS = 14
+# Competitions crawled per run at most; 0 means every due competition
+MAX_COMPETITIONS_PER_RUN = int(os.environ.get('MAX_COMPETITIONS_PER_RUN', 0))
+
+
+def refresh_interval_hours(state: CrawlState, now: Optional[datetime] = None) -> float:
+    """Hours between crawls of one competition, from its change rates and deadline"""
+    now = now or datetime.now(timezone.utc)
+    rate = (state.new_posts_per_hour or 0.0) + (state.vote_churn_per_hour or 0.0)
+    interval = TARGET_CHANGES_PER_CRAWL / rate if rate > 0 else MAX_REFRESH_HOURS
+
+    deadline = parse_datetime(state.deadline)
+    if deadline and deadline > now:
+        days_left = (deadline - now).total_seconds() / 86400
+        if days_left < DEADLINE_WINDOW_DAYS:
+            interval *= days_left / DEADLINE_WINDOW_DAYS
+    return min(max(interval, MIN_REFRESH_HOURS), MAX_REFRESH_HOURS)
+
+
+def overdue_ratio(state: Optional[CrawlState], now: Optional[datetime] = None) -> float:
+    """Time since the last crawl over the refresh interval; >= 1 means due, never-crawled is infinitely overdue"""
+    if state is None or not state.last_crawled_at:
+        return float('inf')
+    now = now or datetime.now(timezone.utc)
+    # Half a run of slack, so a competition due a few minutes after this run is not left for the next one
+    elapsed = (now - parse_datetime(state.last_crawled_at)).total_seconds() / 3600 + RUN_INTERVAL_HOURS / 2
+    return elapsed / refresh_interval_hours(state, now)
+
+
+class RefreshScheduler:
+    """Picks the competitions to crawl in one run"""
+
+    def __init__(self, states: Dict[str, CrawlState], max_competitions: int = MAX_COMPETITIONS_PER_RUN):
+        self.states = states
+        self.max_competitions = max_competitions
+
+    def plan(self, listed: List[Dict], now: Optional[datetime] = None) -> List[Dict]:
+        """Due competitions of the listing ({id, ...} rows), most overdue first"""
+        now = now or datetime.now(timezone.utc)
+        queue = []
+        for position, row in enumerate(listed):
+            ratio = overdue_ratio(self.states.get(row['id']), now)
+            if ratio >= 1:
+                # Listing position breaks ties, so equal priorities keep the listing order
+                heapq.heappush(queue, (-ratio, position, row))
+
+        planned = []
+        while queue and (not self.max_competitions or len(planned) < self.max_competitions):
+            planned.append(heapq.heappop(queue)[2])
+        return planned
@@ -0,0 +1,528 @@
+"""
+Rebuild every vector from Firestore into a fresh namespace, then switch searches to it.
+
+Changes to document preparation or chunking only reach discussions that are
+re-synced. A reindex re-chunks and re-embeds the whole synced corpus - every
+competition and every Gold discussion by an Expert+ author that is not a
+near-duplicate - into a new namespace next to the live one.
+Each competition is one task in a process pool: the task streams its own
+documents from Firestore, chunks, embeds and upserts them.
+
+The index alias (index_alias.py) is switched only when every competition
+succeeded and the new namespace holds exactly the vectors that were written,
+so searches never see a partial index. Backends pick up the switch within
+VECTOR_ALIAS_REFRESH_SECONDS while the old namespace keeps serving; it is
+only deleted by `drop`. Competitions re-synced into the old namespace during
+the rebuild are rebuilt again right after the switch, and keyword indexes and
+related competitions are rewritten from the new chunks.
+
+`migrate` moves the live vectors into another layout (see index_alias.py),
+e.g. one namespace per competition, by copying them without re-embedding,
+then verifies and switches the same way:
+
+    python reindex.py run --workers 4
+    python reindex.py run --index kaggle-competitions-v2    # into another index, created if missing
+    python reindex.py migrate --layout per_competition
+    python reindex.py status
+    python reindex.py rollback                              # back to the previous target
+    python reindex.py drop --namespace reindex-20250101T000000Z
+    python reindex.py purge-legacy --dry-run                # once: LangChain's random-id duplicates
+    python reindex.py backfill-related                      # related competitions and top discussions, no re-embedding
+
+The lifecycle is checked offline by check_reindex.py.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from google.cloud import firestore
+from pinecone import Pinecone
+
+from index_alias import LAYOUT_PER_COMPETITION, LAYOUTS, IndexTarget, read_alias, resolve_alias, switch_alias
+from keyword_index import KeywordIndex
+from pinecone_sync_service import EXPERT_RANKS, PINECONE_DELETE_BATCH_SIZE, PineconeSyncService, vector_id
+from profiling import REPORT_DIR, run_profile
+from related_competitions import fetch_centroids, save_top_discussions, top_discussions, update_related_competitions
+
+REINDEX_WORKERS = int(os.environ.get("REINDEX_WORKERS", 4))
+# describe_index_stats is eventually consistent; wait this long for the count to settle
+VERIFY_TIMEOUT_SECONDS = 300
+VERIFY_POLL_SECONDS = 10
+# Refuse to switch to a namespace with fewer vectors than this share of the live one (--force overrides)
+MIN_LIVE_RATIO = 0.5
+# Backends re-read the alias every minute; keep a replaced namespace at least this long
+DROP_GRACE_SECONDS = 10 * 60
+# Ids per list page (Pinecone's maximum) and vectors per upsert when copying (1536 floats plus chunk text each)
+COPY_PAGE_SIZE = 100
+COPY_UPSERT_BATCH_SIZE = 50
+# Deterministic vector ids (type-id-chunk_index) start with a document type; LangChain's random ids never do
+VECTOR_TYPE_PREFIXES = ('competition-', 'discussion-')
+
+# One sync service per pool process, connected to the reindex target
+_service: Optional[PineconeSyncService] = None
+
+
+@dataclass
+class CompetitionResult:
+    competition_id: str
+    vectors: int = 0
+    failed_ids: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    keyword_index: Optional[KeywordIndex] = None
+    # Competition chunk ids and display fields for the related-competitions table
+    chunk_ids: List[str] = field(default_factory=list)
+    info: Dict = field(default_factory=dict)
+    # Most-upvoted synced Gold discussions, for the related-competitions response
+    top_discussions: List[Dict] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.failed_ids
+
+
+def _init_worker(target: IndexTarget):
+    global _service
+    _service = PineconeSyncService(target=target)
+
+
+def _rebuild_competition(competition_id: str) -> CompetitionResult:
+    """Chunk, embed and upsert one competition and its synced discussions into the worker's target"""
+    db = _service.db
+    competitions = []
+    snapshot = db.collection('competitions').document(competition_id).get()
+    if snapshot.exists:
+        competitions.append({**snapshot.to_dict(), 'id': competition_id})
+
+    # Same selection as the sync, minus the updated flag; near-duplicates were never embedded
+    discussions = []
+    query = (db.collection('discussions')
+             .where('competition_id', '==', competition_id)
+             .where('medal_type', '==', 'Gold'))
+    for doc in query.stream():
+        data = {**doc.to_dict(), 'id': doc.id}
+        if (data.get('author_kaggle_rank') in EXPERT_RANKS and not data.get('duplicate_of')
+                and _service._is_quality_discussion(data)):
+            discussions.append(data)
+
+    documents = _service.build_competition_documents(competitions) + _service.build_discussion_documents(discussions)
+    synced_ids = _service._add_documents_in_batches(documents, f"chunks of {competition_id}") if documents else set()
+    synced = [doc for doc in documents if doc.metadata['id'] in synced_ids]
+
+    result = CompetitionResult(
+        competition_id,
+        vectors=len(synced),
+        failed_ids=sorted({doc.metadata['id'] for doc in documents} - synced_ids),
+        keyword_index=KeywordIndex(competition_id),
+    )
+    result.top_discussions = top_discussions(
+        disc for disc in discussions if disc['id'] in synced_ids
+    ).get(competition_id, [])
+    for doc in synced:
+        if doc.metadata['type'] == 'discussion':
+            result.keyword_index.add(vector_id(doc), doc.metadata['parent_id'], doc.page_content)
+        else:
+            result.chunk_ids.append(vector_id(doc))
+            result.info = {key: doc.metadata.get(key, '') for key in ('title', 'url', 'deadline')}
+    return result
+
+
+def rebuild(competition_ids: Iterable[str], target: IndexTarget, workers: int = REINDEX_WORKERS) -> List[CompetitionResult]:
+    """Rebuild competitions in parallel; a competition that raises comes back with its error"""
+    competition_ids = list(competition_ids)
+    results = []
+    # Spawned, not forked: forked children would inherit the parent's gRPC channels
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(target,)) as executor:
+        futures = {executor.submit(_rebuild_competition, competition_id): competition_id
+                   for competition_id in competition_ids}
+        for done, future in enumerate(as_completed(futures), 1):
+            competition_id = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = CompetitionResult(competition_id, error=str(e))
+            run_profile.count("vectors_upserted", result.vectors, competition_id=competition_id)
+            status = "✅" if result.ok else f"❌ {result.error or f'{len(result.failed_ids)} documents failed'}"
+            print(f"[{done}/{len(competition_ids)}] {competition_id}: {result.vectors} vectors {status}")
+            results.append(result)
+    return results
+
+
+def list_competition_ids(db) -> List[str]:
+    """Every competition with a competition document or a synced-quality discussion"""
+    competition_ids = {doc.id for doc in db.collection('competitions').select([]).stream()}
+    for rank in EXPERT_RANKS:
+        query = (db.collection('discussions')
+                 .where('medal_type', '==', 'Gold')
+                 .where('author_kaggle_rank', '==', rank)
+                 .select(['competition_id']))
+        competition_ids.update(doc.get('competition_id') for doc in query.stream() if doc.get('competition_id'))
+    return sorted(competition_ids)
+
+
+def synced_since(db, since: datetime) -> List[str]:
+    """Competitions with a competition or discussion synced (to the old target) since a point in time"""
+    since = since.isoformat()
+    competition_ids = {doc.id for doc in db.collection('competitions').where('last_synced', '>=', since).select([]).stream()}
+    query = db.collection('discussions').where('last_synced', '>=', since).select(['competition_id'])
+    competition_ids.update(doc.get('competition_id') for doc in query.stream() if doc.get('competition_id'))
+    return sorted(competition_ids)
+
+
+def namespace_counts(index, target: IndexTarget) -> Dict[str, int]:
+    """Vector count of every namespace holding the target's vectors"""
+    return {
+        name: summary.vector_count
+        for name, summary in (index.describe_index_stats().namespaces or {}).items()
+        if target.owns_namespace(name)
+    }
+
+
+def vector_count(index, target: IndexTarget) -> int:
+    return sum(namespace_counts(index, target).values())
+
+
+def verify_count(index, target: IndexTarget, expected: int, timeout: Optional[float] = None) -> bool:
+    """Wait (by default VERIFY_TIMEOUT_SECONDS) for the target's vector count to reach exactly the number of vectors written"""
+    deadline = time.monotonic() + (VERIFY_TIMEOUT_SECONDS if timeout is None else timeout)
+    while True:
+        count = vector_count(index, target)
+        if count == expected or time.monotonic() >= deadline:
+            print(f"🔢 {target}: {count} vectors, expected {expected}")
+            return count == expected
+        time.sleep(VERIFY_POLL_SECONDS)
+
+
+def copy_vectors(pc, source: IndexTarget, target: IndexTarget, workers: int = REINDEX_WORKERS) -> int:
+    """Copy every vector of source into the target's layout without re-embedding; returns the number copied"""
+    source_index, target_index = pc.Index(source.index_name), pc.Index(target.index_name)
+    namespaces = list(namespace_counts(source_index, source))
+
+    def copy_page(namespace: str, ids: List[str]) -> int:
+        fetched = source_index.fetch(ids=ids, namespace=namespace).vectors
+        by_namespace = defaultdict(list)
+        for source_id, vector in fetched.items():
+            metadata = vector.metadata or {}
+            by_namespace[target.namespace_for(metadata.get('type'), metadata.get('competition_id'))].append(
+                (source_id, vector.values, metadata)
+            )
+        for target_namespace, vectors in by_namespace.items():
+            for i in range(0, len(vectors), COPY_UPSERT_BATCH_SIZE):
+                target_index.upsert(vectors=vectors[i:i + COPY_UPSERT_BATCH_SIZE], namespace=target_namespace)
+        return len(fetched)
+
+    # Listing ids is cheap; fetching and upserting the pages is the slow part, so that runs in threads
+    pages = [(namespace, ids) for namespace in namespaces
+             for ids in source_index.list(namespace=namespace, limit=COPY_PAGE_SIZE)]
+    copied = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for done, n_copied in enumerate(executor.map(lambda page: copy_page(*page), pages), 1):
+            copied += n_copied
+            if done % 50 == 0 or done == len(pages):
+                print(f"  📋 {done}/{len(pages)} pages, {copied} vectors copied")
+    return copied
+
+
+def write_derived_data(service: PineconeSyncService, results: List[CompetitionResult]):
+    """Replace keyword indexes, top discussions and related competitions with ones built from the new chunks"""
+    for result in results:
+        try:
+            result.keyword_index.save(service.db)
+        except Exception as e:
+            print(f"⚠️ Could not save keyword index for {result.competition_id}: {str(e)}")
+    try:
+        save_top_discussions(service.db, {result.competition_id: result.top_discussions for result in results},
+                             replace=True)
+    except Exception as e:
+        print(f"⚠️ Could not update top discussions: {str(e)}")
+    chunk_ids = {result.competition_id: result.chunk_ids for result in results if result.chunk_ids}
+    try:
+        centroids = fetch_centroids(service.index, chunk_ids, namespace=service.namespace)
+        update_related_competitions(service.db, centroids, {result.competition_id: result.info for result in results})
+    except Exception as e:
+        # Derived data; the next competition sync rebuilds it
+        print(f"⚠️ Could not update related competitions: {str(e)}")
+
+
+def _prepare_target(db, index_name: Optional[str], namespace: Optional[str], layout: Optional[str],
+                    default_prefix: str, started_at: datetime):
+    """Live target, new target and a sync service connected to the new one"""
+    live = resolve_alias(db)
+    target = IndexTarget(index_name or live.index_name,
+                         namespace or f"{default_prefix}-{started_at:%Y%m%dT%H%M%SZ}",
+                         layout or live.layout)
+    if (target.index_name, target.namespace) == (live.index_name, live.namespace):
+        raise SystemExit(f"{target} is the live target; use a new namespace or index")
+    # Connecting here also creates a new index before any worker starts
+    service = PineconeSyncService(target=target)
+    if vector_count(service.index, target):
+        raise SystemExit(f"{target} already has vectors; drop it first or pick another namespace")
+    return live, target, service
+
+
+def _verify(service: PineconeSyncService, live: IndexTarget, target: IndexTarget, expected: int, force: bool) -> bool:
+    """Exact count in the new target, and not implausibly smaller than the live one"""
+    with run_profile.stage("verify"):
+        if not verify_count(service.index, target, expected):
+            print("❌ Vector count mismatch; alias not switched")
+            return False
+    live_count = vector_count(service.pc.Index(live.index_name), live)
+    print(f"🔢 Live {live}: {live_count} vectors")
+    if not force and live_count and expected < live_count * MIN_LIVE_RATIO:
+        print(f"❌ {expected} vectors is under {MIN_LIVE_RATIO:.0%} of the live {live_count}; "
+              f"alias not switched (--force to override)")
+        return False
+    return True
+
+
+def _switch(db, service: PineconeSyncService, live: IndexTarget, target: IndexTarget, started_at: datetime,
+            workers: int, results: List[CompetitionResult] = (), **details) -> dict:
+    """Switch the alias, then rebuild competitions that syncs wrote to the old target in the meantime"""
+    alias = switch_alias(db, target, live, started_at=started_at.isoformat(), **details)
+    print(f"🔀 Alias switched from {live} to {target}")
+    if results:
+        with run_profile.stage("derived_data"):
+            write_derived_data(service, results)
+
+    late_ids = synced_since(db, started_at)
+    if late_ids:
+        print(f"🔁 {len(late_ids)} competitions were synced to {live} meanwhile; rebuilding them in {target}")
+        with run_profile.stage("rebuild"):
+            late_results = rebuild(late_ids, target, workers)
+        with run_profile.stage("derived_data"):
+            write_derived_data(service, [result for result in late_results if result.ok])
+        late_failed = [result.competition_id for result in late_results if not result.ok]
+        if late_failed:
+            print(f"⚠️ Catch-up failed for {', '.join(late_failed)}; flag them updated=True to re-sync")
+
+    print(f"✅ Searches use {target}; drop {live} after {DROP_GRACE_SECONDS // 60} minutes")
+    print(json.dumps(alias, indent=2))
+    return alias
+
+
+def run(workers: int, index_name: Optional[str] = None, namespace: Optional[str] = None, layout: Optional[str] = None,
+        competition_ids: Optional[List[str]] = None, switch: bool = True, force: bool = False) -> bool:
+    """Rebuild into a new target and, if it verifies, switch the alias to it"""
+    started_at = datetime.now(timezone.utc)
+    db = firestore.Client()
+    live, target, service = _prepare_target(db, index_name, namespace, layout, "reindex", started_at)
+    print(f"🏗️ Rebuilding {live} into {target} with {workers} workers")
+
+    with run_profile.stage("firestore_read"):
+        competition_ids = competition_ids or list_competition_ids(db)
+    with run_profile.stage("rebuild"):
+        results = rebuild(competition_ids, target, workers)
+
+    failed = [result.competition_id for result in results if not result.ok]
+    expected = sum(result.vectors for result in results)
+    if failed:
+        print(f"❌ {len(failed)} competitions failed ({', '.join(failed[:10])}); alias not switched")
+        return False
+    if not _verify(service, live, target, expected, force):
+        return False
+    if not switch:
+        print(f"✅ Built {target} ({expected} vectors); alias not switched")
+        return True
+
+    _switch(db, service, live, target, started_at, workers, results, vectors=expected, competitions=len(results))
+    return True
+
+
+def migrate(workers: int, layout: str, index_name: Optional[str] = None, namespace: Optional[str] = None,
+            force: bool = False) -> bool:
+    """Copy the live vectors into a new layout without re-embedding and switch to it"""
+    started_at = datetime.now(timezone.utc)
+    db = firestore.Client()
+    live, target, service = _prepare_target(db, index_name, namespace, layout, "migrate", started_at)
+    print(f"🚚 Copying {live} into {target} with {workers} threads")
+
+    with run_profile.stage("copy"):
+        copied = copy_vectors(service.pc, live, target, workers)
+    run_profile.count("vectors_copied", copied)
+    if not _verify(service, live, target, copied, force):
+        return False
+    # Vector ids are unchanged, so keyword indexes and related competitions stay valid
+    _switch(db, service, live, target, started_at, workers, vectors=copied, migrated_from=live.to_dict())
+    return True
+
+
+def rollback(db) -> dict:
+    alias = read_alias(db)
+    if not alias.get('previous'):
+        raise SystemExit("The alias has no previous target")
+    current, previous = IndexTarget.from_dict(alias), IndexTarget.from_dict(alias['previous'])
+    alias = switch_alias(db, previous, current, rolled_back_from=current.to_dict())
+    print(f"↩️ Alias switched back to {previous}")
+    print("⚠️ Keyword indexes and related competitions stay on the newer chunks until those competitions re-sync")
+    return alias
+
+
+def indexed_chunk_ids(index, target: IndexTarget, doc_type: str) -> Dict[str, List[str]]:
+    """Source id -> its deterministic chunk ids in the target, found by listing ids only"""
+    prefix = f"{doc_type}-"
+    chunk_ids = defaultdict(list)
+    for namespace in namespace_counts(index, target):
+        for ids in index.list(prefix=prefix, namespace=namespace, limit=COPY_PAGE_SIZE):
+            for existing_id in ids:
+                source_id, _, chunk_index = existing_id[len(prefix):].rpartition('-')
+                if source_id and chunk_index.isdigit():
+                    chunk_ids[source_id].append(existing_id)
+    return chunk_ids
+
+
+def backfill_related(db, index, target: IndexTarget):
+    """Build centroids, related competitions and top discussions from the vectors already in target.
+
+    The sync only derives them for competitions and discussions it syncs, and past
+    competitions are never re-synced. Nothing is embedded: centroids average the
+    stored competition vectors, and top lists take the Gold discussions that have chunks.
+    """
+    with run_profile.stage("pinecone_list"):
+        competition_chunks = indexed_chunk_ids(index, target, 'competition')
+        indexed_discussions = set(indexed_chunk_ids(index, target, 'discussion'))
+    print(f"📚 {target}: {len(competition_chunks)} competitions and {len(indexed_discussions)} discussions indexed")
+
+    with run_profile.stage("firestore_read"):
+        info = {
+            doc.id: {key: (doc.to_dict() or {}).get(key, '') for key in ('title', 'url', 'deadline')}
+            for doc in db.collection('competitions').select(['title', 'url', 'deadline']).stream()
+        }
+        fields = ['competition_id', 'medal_type', 'upvotes', 'title', 'url', 'author']
+        discussions = [
+            {**doc.to_dict(), 'id': doc.id}
+            for doc in db.collection('discussions').where('medal_type', '==', 'Gold').select(fields).stream()
+            if doc.id in indexed_discussions
+        ]
+    with run_profile.stage("related_competitions"):
+        centroids = fetch_centroids(index, competition_chunks, namespace=target.namespace)
+        update_related_competitions(db, centroids, info)
+        by_competition = top_discussions(discussions)
+        save_top_discussions(db, by_competition, replace=True)
+    print(f"🏅 Top discussions for {len(by_competition)} competitions")
+
+
+def purge_legacy(index, target: IndexTarget, dry_run: bool = False) -> int:
+    """Delete vectors LangChain wrote under random ids whose source now has deterministic ids.
+
+    A one-time cleanup: the sync only writes deterministic ids, so an upsert never
+    replaced these and the source's chunks are found twice. Sources that were
+    never re-synced keep their legacy vectors, or they would drop out of search.
+    """
+    doomed, unsynced = defaultdict(list), set()
+    for namespace in namespace_counts(index, target):
+        for ids in index.list(namespace=namespace, limit=COPY_PAGE_SIZE):
+            legacy = [existing_id for existing_id in ids if not existing_id.startswith(VECTOR_TYPE_PREFIXES)]
+            if not legacy:
+                continue
+            fetched = index.fetch(ids=legacy, namespace=namespace).vectors
+            first_chunks = {legacy_id: f"{(vector.metadata or {}).get('type')}-{(vector.metadata or {}).get('id')}-0"
+                            for legacy_id, vector in fetched.items()}
+            replaced = index.fetch(ids=sorted(set(first_chunks.values())), namespace=namespace).vectors
+            for legacy_id, first_chunk in first_chunks.items():
+                if first_chunk in replaced:
+                    doomed[namespace].append(legacy_id)
+                else:
+                    unsynced.add(first_chunk.rsplit('-', 1)[0])
+
+    deleted = sum(len(ids) for ids in doomed.values())
+    print(f"🧹 {deleted} legacy vectors duplicated under deterministic ids in {target}")
+    if unsynced:
+        print(f"⚠️ {len(unsynced)} sources only have legacy vectors; flag them updated=True to re-sync: "
+              f"{', '.join(sorted(unsynced)[:10])}")
+    if dry_run:
+        return 0
+    for namespace, ids in doomed.items():
+        for i in range(0, len(ids), PINECONE_DELETE_BATCH_SIZE):
+            index.delete(ids=ids[i:i + PINECONE_DELETE_BATCH_SIZE], namespace=namespace)
+    run_profile.count("stale_vectors_deleted", deleted)
+    return deleted
+
+
+def drop(db, pc, index_name: str, namespace: str):
+    """Delete a namespace, and its competition namespaces, that no backend reads any more"""
+    alias = read_alias(db)
+    live, previous = IndexTarget.from_dict(alias), IndexTarget.from_dict(alias.get('previous'))
+    if (index_name, namespace) == (live.index_name, live.namespace):
+        raise SystemExit(f"{live} is the live target")
+    switched_at = alias.get('switched_at')
+    if switched_at and alias.get('previous') and (index_name, namespace) == (previous.index_name, previous.namespace):
+        age = (datetime.now(timezone.utc) - datetime.fromisoformat(switched_at)).total_seconds()
+        if age < DROP_GRACE_SECONDS:
+            raise SystemExit(f"{previous} was live {age:.0f}s ago; backends may still read it")
+    index = pc.Index(index_name)
+    # Whatever layout it had, its competition namespaces share the prefix
+    doomed = IndexTarget(index_name, namespace, LAYOUT_PER_COMPETITION) if namespace else IndexTarget(index_name)
+    for name in namespace_counts(index, doomed):
+        index.delete(delete_all=True, namespace=name)
+        print(f"🗑️ Deleted {index_name}/{name or '(default namespace)'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Rebuild into a new namespace, verify and switch the alias")
+    run_parser.add_argument("--workers", type=int, default=REINDEX_WORKERS)
+    run_parser.add_argument("--index", help="Target index (default: the live index)")
+    run_parser.add_argument("--namespace", help="Target namespace (default: reindex-<UTC timestamp>)")
+    run_parser.add_argument("--layout", choices=LAYOUTS, help="Target layout (default: the live layout)")
+    run_parser.add_argument("--competition", action="append", dest="competition_ids",
+                            help="Only these competitions (repeatable); a trial run that never switches the alias")
+    run_parser.add_argument("--no-switch", action="store_true", help="Build and verify, but leave the alias alone")
+    run_parser.add_argument("--force", action="store_true", help=f"Switch even below {MIN_LIVE_RATIO:.0%} of the live vectors")
+    migrate_parser = subparsers.add_parser("migrate", help="Copy the live vectors into another layout and switch the alias")
+    migrate_parser.add_argument("--layout", choices=LAYOUTS, default=LAYOUT_PER_COMPETITION)
+    migrate_parser.add_argument("--workers", type=int, default=REINDEX_WORKERS, help="Copy threads")
+    migrate_parser.add_argument("--index", help="Target index (default: the live index)")
+    migrate_parser.add_argument("--namespace", help="Target base namespace (default: migrate-<UTC timestamp>)")
+    migrate_parser.add_argument("--force", action="store_true", help=f"Switch even below {MIN_LIVE_RATIO:.0%} of the live vectors")
+    subparsers.add_parser("status", help="Alias and vector counts per namespace")
+    subparsers.add_parser("rollback", help="Point the alias back at its previous target")
+    drop_parser = subparsers.add_parser("drop", help="Delete a namespace (and its competition namespaces) that is no longer live")
+    drop_parser.add_argument("--namespace", required=True, help="Namespace to delete ('' for the default namespace)")
+    drop_parser.add_argument("--index", help="Index holding the namespace (default: the live index)")
+    subparsers.add_parser("backfill-related",
+                          help="Build related competitions and top discussions from the live vectors")
+    purge_parser = subparsers.add_parser("purge-legacy",
+                                         help="Delete random-id vectors of sources since synced under deterministic ids")
+    purge_parser.add_argument("--dry-run", action="store_true", help="Only count them")
+    args = parser.parse_args()
+
+    if args.command in ("run", "migrate"):
+        if args.command == "run":
+            ok = run(args.workers, args.index, args.namespace, args.layout, args.competition_ids,
+                     switch=not (args.no_switch or args.competition_ids), force=args.force)
+        else:
+            ok = migrate(args.workers, args.layout, args.index, args.namespace, args.force)
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        run_profile.write_report("ok" if ok else "failed", os.path.join(
+            REPORT_DIR, f"{args.command}_{run_profile.started_at.strftime('%Y%m%dT%H%M%SZ')}.json"))
+        raise SystemExit(0 if ok else 1)
+
+    db = firestore.Client()
+    pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
+    if args.command == "status":
+        alias = read_alias(db)
+        target = IndexTarget.from_dict(alias)
+        stats = pc.Index(target.index_name).describe_index_stats()
+        print(json.dumps({
+            "alias": alias or target.to_dict(),
+            "namespaces": {name or '__default__': summary.vector_count
+                           for name, summary in (stats.namespaces or {}).items()},
+        }, indent=2))
+    elif args.command == "rollback":
+        rollback(db)
+    elif args.command == "backfill-related":
+        target = resolve_alias(db)
+        backfill_related(db, pc.Index(target.index_name), target)
+    elif args.command == "purge-legacy":
+        target = resolve_alias(db)
+        purge_legacy(pc.Index(target.index_name), target, args.dry_run)
+    else:
+        drop(db, pc, args.index or resolve_alias(db).index_name, args.namespace)
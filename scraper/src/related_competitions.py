@@ -0,0 +1,169 @@
+"""
+Precomputed competition-to-competition similarity table.
+
+Each competition is represented by the centroid of its chunk embeddings. The
+sync keeps centroids in Firestore and maintains, per competition, its most
+similar competitions, so the backend answers "related competitions" with a
+single document read instead of live vector queries. Each competition's
+most-upvoted Gold discussions are kept next to it, so the related-competitions
+response needs one more batched read instead of scanning discussions.
+Competitions that are no longer synced get both from the vectors already in
+the index with `reindex.py backfill-related`.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+CENTROID_COLLECTION = 'competition_centroids'
+RELATED_COLLECTION = 'related_competitions'
+RELATED_TOP_N = 10
+TOP_DISCUSSIONS_COLLECTION = 'competition_top_discussions'
+# Stored per competition; the backend serves the first few
+TOP_DISCUSSIONS_PER_COMPETITION = 5
+TOP_DISCUSSION_FIELDS = ('competition_id', 'title', 'url', 'author')
+# Pinecone fetch accepts at most 1000 ids; stay well under the request size limit
+FETCH_BATCH_SIZE = 100
+# Firestore rejects batches with more than 500 writes
+FIRESTORE_BATCH_LIMIT = 500
+
+
+def _set_in_batches(db, collection: str, docs: Dict[str, Dict]):
+    """Set documents by id, committing at most FIRESTORE_BATCH_LIMIT writes per batch"""
+    collection_ref = db.collection(collection)
+    items = list(docs.items())
+    for i in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for doc_id, data in items[i:i + FIRESTORE_BATCH_LIMIT]:
+            batch.set(collection_ref.document(doc_id), data)
+        batch.commit()
+
+
+def fetch_centroids(index, chunk_ids: Dict[str, List[str]], namespace: str = '') -> Dict[str, np.ndarray]:
+    """Average the stored chunk embeddings of each competition into a unit-length centroid"""
+    all_ids = [vector_id for ids in chunk_ids.values() for vector_id in ids]
+    vectors = {}
+    for i in range(0, len(all_ids), FETCH_BATCH_SIZE):
+        fetched = index.fetch(ids=all_ids[i:i + FETCH_BATCH_SIZE], namespace=namespace).vectors
+        vectors.update({vector_id: vector.values for vector_id, vector in fetched.items()})
+
+    centroids = {}
+    for competition_id, ids in chunk_ids.items():
+        rows = [vectors[vector_id] for vector_id in ids if vector_id in vectors]
+        if not rows:
+            continue
+        centroid = np.mean(np.asarray(rows, dtype=np.float32), axis=0)
+        norm = np.linalg.norm(centroid)
+        if norm > 0:
+            centroids[competition_id] = centroid / norm
+    return centroids
+
+
+def update_related_competitions(db, new_centroids: Dict[str, np.ndarray], info: Dict[str, Dict],
+                                top_n: int = RELATED_TOP_N):
+    """Store new centroids and refresh only the similarity rows they affect.
+
+    Changed competitions get their whole row recomputed. Every other row only
+    has the changed competitions merged in, and is rewritten only if its top-n changed.
+    """
+    if not new_centroids:
+        return
+
+    _set_in_batches(db, CENTROID_COLLECTION, {
+        competition_id: {'centroid': centroid.astype(np.float32).tobytes(), **info.get(competition_id, {})}
+        for competition_id, centroid in new_centroids.items()
+    })
+    centroid_ref = db.collection(CENTROID_COLLECTION)
+
+    # Load every centroid (a few KB each) into one matrix
+    ids, rows, meta = [], [], {}
+    for snapshot in centroid_ref.stream():
+        data = snapshot.to_dict()
+        ids.append(snapshot.id)
+        rows.append(np.frombuffer(data['centroid'], dtype=np.float32))
+        meta[snapshot.id] = {key: data.get(key, '') for key in ('title', 'url', 'deadline')}
+    matrix = np.vstack(rows)
+    position = {competition_id: i for i, competition_id in enumerate(ids)}
+
+    changed = [competition_id for competition_id in new_centroids if competition_id in position]
+    changed_rows = np.array([position[competition_id] for competition_id in changed])
+    # (all competitions) x (changed competitions) cosine similarities
+    similarities = matrix @ matrix[changed_rows].T
+
+    def entry(competition_id: str, score: float) -> Dict:
+        return {'competition_id': competition_id, 'score': round(float(score), 4), **meta[competition_id]}
+
+    related_ref = db.collection(RELATED_COLLECTION)
+    writes = {}
+    # Full rows for changed competitions
+    for j, competition_id in enumerate(changed):
+        column = similarities[:, j].copy()
+        column[position[competition_id]] = -np.inf
+        best = np.argsort(-column)[:top_n]
+        writes[competition_id] = [entry(ids[i], column[i]) for i in best if np.isfinite(column[i])]
+
+    # Merge changed competitions into every other row. A row can shrink below top_n when a
+    # changed competition drops out; it is rebuilt in full the next time its competition syncs.
+    changed_set = set(changed)
+    for snapshot in related_ref.stream():
+        if snapshot.id in changed_set or snapshot.id not in position:
+            continue
+        current = snapshot.to_dict().get('related', [])
+        merged = [item for item in current if item['competition_id'] not in changed_set]
+        row = similarities[position[snapshot.id]]
+        merged += [entry(competition_id, row[j]) for j, competition_id in enumerate(changed)]
+        merged = sorted(merged, key=lambda item: item['score'], reverse=True)[:top_n]
+        if merged != current:
+            writes[snapshot.id] = merged
+
+    _set_in_batches(db, RELATED_COLLECTION, {competition_id: {'related': related}
+                                             for competition_id, related in writes.items()})
+    print(f"🔗 Updated related competitions for {len(writes)} competitions ({len(changed)} changed)")
+
+
+def _upvotes(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def top_discussions(discussions: Iterable[Dict], top_n: int = TOP_DISCUSSIONS_PER_COMPETITION) -> Dict[str, List[Dict]]:
+    """Most-upvoted Gold discussions per competition, as stored for the related-competitions response"""
+    by_competition = defaultdict(list)
+    for disc in discussions:
+        if disc.get('medal_type') == 'Gold' and disc.get('competition_id'):
+            by_competition[disc['competition_id']].append({
+                'id': disc['id'],
+                **{key: disc.get(key, '') for key in TOP_DISCUSSION_FIELDS},
+                'upvotes': _upvotes(disc.get('upvotes')),
+            })
+    return {
+        competition_id: sorted(entries, key=lambda entry: entry['upvotes'], reverse=True)[:top_n]
+        for competition_id, entries in by_competition.items()
+    }
+
+
+def save_top_discussions(db, by_competition: Dict[str, List[Dict]], replace: bool = False,
+                         top_n: int = TOP_DISCUSSIONS_PER_COMPETITION):
+    """Merge top_discussions() entries into their competitions' stored lists.
+
+    A re-synced discussion replaces its old entry, so upvote changes are picked
+    up. With replace, the stored lists are overwritten instead (a reindex passes
+    the entries of every synced discussion of the competition).
+    """
+    if not by_competition:
+        return
+    top_ref = db.collection(TOP_DISCUSSIONS_COLLECTION)
+    current = {}
+    if not replace:
+        refs = [top_ref.document(competition_id) for competition_id in by_competition]
+        current = {snapshot.id: snapshot.to_dict().get('discussions', [])
+                   for snapshot in db.get_all(refs) if snapshot.exists}
+
+    lists = {}
+    for competition_id, entries in by_competition.items():
+        new_ids = {entry['id'] for entry in entries}
+        merged = [entry for entry in current.get(competition_id, []) if entry['id'] not in new_ids] + entries
+        lists[competition_id] = {'discussions': sorted(merged, key=lambda entry: entry['upvotes'], reverse=True)[:top_n]}
+    _set_in_batches(db, TOP_DISCUSSIONS_COLLECTION, lists)
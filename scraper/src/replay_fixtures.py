@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Replay recorded Kaggle pages and compare JSON and browser extraction.
+
+Serves scraper/fixtures/kaggle on localhost (pages plus the /api/i/ JSON
+endpoints they call), loads each listing in headless Chromium in both
+extraction modes, and checks that both return the expected rows. The
+discussion detail is fetched both over HTTP and from a browser page. Reports
+the extraction time per mode; exits non-zero on any mismatch:
+
+    python replay_fixtures.py
+    python replay_fixtures.py --parse-only   # parsers against the recorded JSON, no browser
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from detail_fetcher import DiscussionDetailFetcher, parse_discussion_detail
+from listing_extraction import (
+    COMPETITION_LIST_ENDPOINTS, DISCUSSION_LIST_ENDPOINTS, XhrCapture,
+    list_competitions, list_discussions, parse_competition_list, parse_discussion_list
+)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "kaggle")
+FIXTURE_COMPETITION = "arc-prize-2025"
+FIXTURE_DISCUSSION = "586012"
+EXTRACT_CONTENT_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extract_content.js")
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Static fixture pages; POST /api/i/<service>/<method> answers with api/<service>__<method>.json"""
+
+    def do_POST(self):
+        endpoint = self.path.split("?")[0].removeprefix("/api/i/")
+        path = os.path.join(FIXTURE_DIR, "api", endpoint.replace("/", "__") + ".json")
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_fixture(*parts):
+    with open(os.path.join(FIXTURE_DIR, *parts)) as f:
+        return json.load(f)
+
+
+def check(name: str, mode: str, rows, expected, elapsed: float) -> bool:
+    ok = rows == expected
+    print(f"{'✅' if ok else '❌'} {name} [{mode}]: {len(rows)} {'rows' if isinstance(rows, list) else 'fields'} "
+          f"in {elapsed * 1000:.1f} ms")
+    if not ok:
+        print(json.dumps({"expected": expected, "got": rows}, indent=2))
+    return ok
+
+
+def parse_only() -> bool:
+    """Parsers against the recorded payloads"""
+    ok = True
+    start = time.perf_counter()
+    rows = parse_competition_list([load_fixture("api", "competitions.CompetitionService__ListCompetitions.json")])
+    ok &= check("competitions", "parse", rows, load_fixture("expected", "competitions.json"), time.perf_counter() - start)
+    start = time.perf_counter()
+    rows = parse_discussion_list([load_fixture("api", "discussions.DiscussionsService__GetTopicListByForumId.json")],
+                                 FIXTURE_COMPETITION)
+    ok &= check("discussions", "parse", rows, load_fixture("expected", "discussions.json"), time.perf_counter() - start)
+    start = time.perf_counter()
+    detail = parse_discussion_detail(load_fixture("api", "discussions.DiscussionsService__GetForumTopicById.json"))
+    ok &= check("discussion detail", "parse", detail, load_fixture("expected", "discussion_detail.json"),
+                time.perf_counter() - start)
+    return ok
+
+
+def comparable_detail(detail: dict) -> dict:
+    """innerText and the HTML parser agree on text but not on every line break"""
+    return {**detail, "content": " ".join((detail.get("content") or "").split())}
+
+
+async def replay(base_url: str) -> bool:
+    from playwright.async_api import async_playwright
+
+    ok = True
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        for mode in ("xhr", "dom"):
+            page = await browser.new_page()
+            capture = XhrCapture(page, COMPETITION_LIST_ENDPOINTS) if mode == "xhr" else None
+            await page.goto(f"{base_url}/competitions.html")
+            await page.wait_for_load_state("networkidle")
+            start = time.perf_counter()
+            rows = await list_competitions(page, capture, 1)
+            ok &= check("competitions", mode, rows, load_fixture("expected", "competitions.json"),
+                        time.perf_counter() - start)
+            await page.close()
+
+            page = await browser.new_page()
+            capture = XhrCapture(page, DISCUSSION_LIST_ENDPOINTS) if mode == "xhr" else None
+            await page.goto(f"{base_url}/discussions.html")
+            await page.wait_for_load_state("networkidle")
+            start = time.perf_counter()
+            rows = await list_discussions(page, capture, FIXTURE_COMPETITION, 1)
+            ok &= check("discussions", mode, rows, load_fixture("expected", "discussions.json"),
+                        time.perf_counter() - start)
+            await page.close()
+
+        expected = comparable_detail(load_fixture("expected", "discussion_detail.json"))
+        disc_url = f"{base_url}/discussion.html"
+        async with DiscussionDetailFetcher(base_url=base_url) as fetcher:
+            start = time.perf_counter()
+            detail = await fetcher.fetch(FIXTURE_DISCUSSION, disc_url)
+            ok &= check("discussion detail", "http", comparable_detail(detail or {}), expected,
+                        time.perf_counter() - start)
+
+        with open(EXTRACT_CONTENT_JS) as f:
+            js_code = f.read()
+        start = time.perf_counter()
+        page = await browser.new_page()
+        await page.goto(disc_url)
+        await page.wait_for_load_state("networkidle")
+        detail = await page.evaluate(f"""() => {{
+            {js_code}
+            return extractDiscussionContent();
+        }}""")
+        await page.close()
+        ok &= check("discussion detail", "browser", comparable_detail(detail), expected, time.perf_counter() - start)
+        await browser.close()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parse-only", action="store_true", help="Only run the parsers on the recorded JSON")
+    args = parser.parse_args()
+
+    ok = parse_only()
+    if not args.parse_only:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(FixtureHandler, directory=FIXTURE_DIR))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            ok &= asyncio.run(replay(f"http://127.0.0.1:{server.server_address[1]}"))
+        finally:
+            server.shutdown()
+    raise SystemExit(0 if ok else 1)
@@ -6,30 +6,55 @@ import time
 import os
 import json
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import asyncio
 from datetime import datetime, timezone, timedelta
-from playwright.sync_api import Browser
 from playwright.async_api import async_playwright
 from google.cloud import firestore
 from utils import normalize_text_spacy, str_to_utc_iso, update_env_variable
+from profiling import run_profile
+from listing_extraction import (
+    COMPETITION_LIST_ENDPOINTS, DISCUSSION_LIST_ENDPOINTS, XhrCapture, list_competitions, list_discussions
+)
+from detail_fetcher import DiscussionDetailFetcher
+from browser_pool import BrowserPool
+from corpus_archive import CorpusArchiveWriter
+from crawl_state import CrawlState
+from refresh_scheduler import RefreshScheduler
 from dotenv import load_dotenv, find_dotenv
 import random
 
+# "xhr" parses listings from the JSON the Kaggle frontend loads, falling back to the DOM; "dom" only reads the DOM
+EXTRACTION_MODES = ("xhr", "dom")
+# "http" fetches discussion details without a browser, falling back to Playwright; "browser" always uses Playwright
+DETAIL_MODES = ("http", "browser")
+# Old rows heading a newest-first first page that may be pinned topics the DOM did not flag (pinned=None)
+MAX_UNFLAGGED_PINNED = 5
+
 
 class KaggleScraper:
     """Class for scraping Kaggle competitions and discussions."""
     
-    def __init__(self):
+    def __init__(self, extraction_mode: str = None, detail_mode: str = None):
         """Initialize the Kaggle scraper."""
         load_dotenv()
+        self.extraction_mode = extraction_mode or os.environ.get('SCRAPER_EXTRACTION_MODE', 'xhr')
+        if self.extraction_mode not in EXTRACTION_MODES:
+            raise ValueError(f"extraction_mode must be one of {EXTRACTION_MODES}, got {self.extraction_mode!r}")
+        self.detail_mode = detail_mode or os.environ.get('SCRAPER_DETAIL_MODE', 'http')
+        if self.detail_mode not in DETAIL_MODES:
+            raise ValueError(f"detail_mode must be one of {DETAIL_MODES}, got {self.detail_mode!r}")
+        self.detail_fetcher = None
+        self.archive = None
         creds_path = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
         print(creds_path)
         self.current_dir = os.path.dirname(os.path.abspath(__file__))
         self.js_file_path = os.path.join(self.current_dir, 'extract_content.js')
         self.last_scrape_datetime = os.environ.get('LAST_SCRAPE_DATETIME', None)
         self.db = firestore.Client()
-        self.existing_discussions = self.get_existing_discussions()
+        with run_profile.stage("firestore_read"):
+            self.existing_discussions = self.get_existing_discussions()
+            self.crawl_states = CrawlState.load_all(self.db)
 
         if self.last_scrape_datetime == "None" or self.last_scrape_datetime is None:
             hundred_years_ago = datetime.now(timezone.utc) - timedelta(days=365*100)
@@ -40,6 +65,9 @@ class KaggleScraper:
         """
         Fetch Kaggle competitions with pagination support.
         
+        Walks the whole active listing, then crawls the competitions the refresh
+        scheduler finds due.
+        
         Args:
             max_pages: Maximum number of pages to scrape
             
@@ -48,157 +76,62 @@ class KaggleScraper:
         """
         competitions = []
         all_discussions = []
+        run_started_at = datetime.now(timezone.utc).isoformat()
+        self.archive = CorpusArchiveWriter()
 
         async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+            pool = await BrowserPool(p.chromium, headless=True).start()
+            self.detail_fetcher = DiscussionDetailFetcher() if self.detail_mode == "http" else None
+            listed_competitions = await self._list_active_competitions(pool, max_pages)
             
-            # Start with the first page of competitions
-            current_page = 1
-            has_next_page = True
+            # Crawl only the competitions that are due, most overdue first
+            planned = RefreshScheduler(self.crawl_states).plan(listed_competitions)
+            print(f"\nScheduled {len(planned)} of {len(listed_competitions)} active competitions for this run")
+            run_profile.count("competitions_deferred", len(listed_competitions) - len(planned))
             
-            while has_next_page and current_page <= max_pages:
-                # Navigate to the page with active competitions
-                page_url = f"https://www.kaggle.com/competitions?listOption=active&page={current_page}"
-                print(f"Fetching competition page {current_page}: {page_url}")
-                
-                await page.goto(page_url)
-                await page.wait_for_load_state('networkidle')
-                
-                # Wait for competition list to load
-                specific_list_selector = "ul.MuiList-root.km-list.sc-ekhxZF.dPUdCH.css-1uzmcsd"
+            # Process each scheduled competition
+            for i, listed in enumerate(planned):
                 try:
-                    await page.wait_for_selector(specific_list_selector, timeout=30000)
-                except Exception as e:
-                    print(f"Could not find competition list on page {current_page}: {e}")
-                    # Try an alternative selector
-                    await page.wait_for_selector("ul.MuiList-root.km-list", timeout=30000)
-                
-                # Wait for each competition link to load
-                await page.wait_for_selector("a[href^='/competitions/']", timeout=60000)
-
-                # Fetch all competition links on the current page
-                competition_links = await page.query_selector_all("a[href^='/competitions/']")
-                
-                # Filter out duplicate links and non-competition links
-                unique_links = []
-                processed_hrefs = set()
-                
-                for link in competition_links:
-                    href = await link.get_attribute('href')
-                    comp_id = href.split('/')[-1] if href else ""
+                    comp_id = listed['id']
+                    comp_url = listed['url']
+                    title = listed['title']
                     
-                    # Skip duplicates, non-competition links, and invalid competition IDs
-                    if not href or href in processed_hrefs or not comp_id or comp_id == "competitions" or len(comp_id) < 3:
-                        continue
-                        
-                    processed_hrefs.add(href)
-                    unique_links.append(link)
+                    # Process competition details
+                    print(f"\n--- Competition #{i+1} ---")
+                    print(f"ID: {comp_id}")
+                    print(f"Title: {title}")
                     
-                competition_links = unique_links
-                print(f"Found {len(competition_links)} unique competition links on page {current_page}")
-                
-                if len(competition_links) == 0:
-                    # No more competitions to process
-                    has_next_page = False
-                    break
+                    # Fetch detailed information about the competition
+                    details = await self._fetch_competition_details(pool, comp_url)
                     
-                # Process each competition on this page
-                for i, link in enumerate(competition_links):
-                    try:
-                        # Get competition URL and ID
-                        href = await link.get_attribute('href')
-                        comp_url = f"https://www.kaggle.com{href}"
-                        comp_id = href.split('/')[-1] if href else "unknown"
-                        
-                        # Try to get the title using multiple selectors
-                        title = "Unknown title"
-                        for selector in ['.sc-dFaThA', 'h3', '.sc-jPkiSJ']:
-                            title_elem = await link.query_selector(selector)
-                            if title_elem:
-                                title_text = await title_elem.text_content()
-                                if title_text and title_text.strip():
-                                    title = title_text.strip()
-                                    break
-                        
-                        # Process competition details
-                        print(f"\n--- Competition #{(current_page-1)*len(competition_links) + i+1} ---")
-                        print(f"ID: {comp_id}")
-                        print(f"Title: {title}")
-                        
-                        # Check if we already have this competition in our list
-                        if any(comp['id'] == comp_id for comp in competitions):
-                            print(f"Skipping duplicate competition: {comp_id}")
-                            continue
-                        
-                        # Fetch detailed information about the competition
-                        details = await self._fetch_competition_details(browser, comp_url)
-                        
-                        # Create the competition data dictionary
-                        competition_data = {
-                            "id": comp_id,
-                            "title": title,
-                            "url": comp_url,
-                            "description": details['description'],
-                            "evaluation": details['evaluation'],
-                            "deadline": details.get('deadline', None),
-                            "start_time": details.get('start_time', None),
-                            "page_found": current_page,
-                            "scraped_at": datetime.now(timezone.utc).isoformat(),
-                            "updated": True
-                        }
-                        
-                        competitions.append(competition_data)
-                        
-                        # Print competition details
-                        print(f"URL: {comp_url}")
-                        print(f"Description: {details['description'][:50]}...")
-                        print(f"Evaluation: {details['evaluation'][:50]}...")
-                        print(f"Start: {details['start_time']} | Deadline: {details['deadline']}")
-                        print("----------------------------")
-                        
-                        # Fetch discussions with pagination
-                        competition_discussions = await self._fetch_competition_discussions(browser, comp_id, comp_url, max_pages=20)
-                        print(f"Found {len(competition_discussions)} discussions for {comp_id}")
-                        
-                        # Store discussions
-                        if competition_discussions and len(competition_discussions) > 0:
-                            all_discussions.extend(competition_discussions)
-                        
-                        update_env_variable('LAST_SCRAPE_DATETIME', datetime.now(timezone.utc).isoformat())
-                        
-                    except Exception as e:
-                        print(f"Error processing competition on page {current_page}, item {i+1}: {e}")
-                        import traceback
-                        traceback.print_exc()
-                
-                # Check for next page button using the specific Kaggle selector
-                next_page_button = await page.query_selector("button[aria-label='Go to next page']")
-                if not next_page_button:
-                    # Try alternative selector
-                    next_page_button = await page.query_selector("button.MuiPaginationItem-previousNext[aria-label*='next']")
-                
-                # Check if the button exists and is not disabled
-                is_disabled = await next_page_button.get_attribute("disabled") if next_page_button else "true"
-                is_disabled_class = await next_page_button.get_attribute("class") if next_page_button else ""
-                is_disabled_by_class = "Mui-disabled" in is_disabled_class if is_disabled_class else True
-                
-                if is_disabled == "true" or is_disabled_by_class or not next_page_button:
-                    has_next_page = False
-                    print("No more pages available")
-                else:
-                    print(f"Going to next page (page {current_page + 1})")
-                    current_page += 1
-                    # Click the next page button instead of constructing a new URL
-                    try:
-                        await next_page_button.click()
-                        # Wait for the page to load
-                        await page.wait_for_load_state('networkidle')
-                        await asyncio.sleep(random.randint(5, 10)) 
-                    except Exception as e:
-                        print(f"Error navigating to next page: {e}")
-                        # Fallback to direct URL navigation
-                        has_next_page = False
+                    competition_data = self._build_competition(listed, details)
+                    
+                    competitions.append(competition_data)
+                    self.archive.add_competition(competition_data, details['raw_description'], details['raw_evaluation'])
+                    run_profile.count("competitions_scraped")
+                    # The scheduler crawls competitions near their deadline more often
+                    self.crawl_states.setdefault(comp_id, CrawlState(comp_id)).deadline = competition_data['deadline']
+                    
+                    # Print competition details
+                    print(f"URL: {comp_url}")
+                    print(f"Description: {details['description'][:50]}...")
+                    print(f"Evaluation: {details['evaluation'][:50]}...")
+                    print(f"Start: {details['start_time']} | Deadline: {details['deadline']}")
+                    print("----------------------------")
+                    
+                    # Fetch discussions with pagination
+                    competition_discussions = await self._fetch_competition_discussions(pool, comp_id, comp_url, max_pages=20)
+                    print(f"Found {len(competition_discussions)} discussions for {comp_id}")
+                    
+                    # Store discussions
+                    if competition_discussions and len(competition_discussions) > 0:
+                        all_discussions.extend(competition_discussions)
+                    run_profile.count("discussions_scraped", len(competition_discussions), competition_id=comp_id)
+                    
+                except Exception as e:
+                    print(f"Error processing competition {listed['id']}: {e}")
+                    import traceback
+                    traceback.print_exc()
             
             # Output summary statistics
             print(f"\nExtracted {len(competitions)} competitions and {len(all_discussions)} discussions.")
@@ -206,21 +139,33 @@ class KaggleScraper:
             # Save data to database
             try:
                 # Save competitions
-                batch = self.db.batch()
-                for comp in competitions:
-                    doc_ref = self.db.collection('competitions').document(comp['id'])
-                    batch.set(doc_ref, comp)
-                batch.commit()
+                with run_profile.stage("firestore_write"):
+                    batch = self.db.batch()
+                    for comp in competitions:
+                        doc_ref = self.db.collection('competitions').document(comp['id'])
+                        batch.set(doc_ref, comp)
+                    batch.commit()
                 print(f"Saved {len(competitions)} competitions to Firestore.")
 
                 # Save discussions
                 if all_discussions:
+                    with run_profile.stage("firestore_write"):
+                        batch = self.db.batch()
+                        for disc in all_discussions:
+                            doc_ref = self.db.collection('discussions').document(disc['id'])
+                            batch.set(doc_ref, disc)
+                        batch.commit()
+                    print(f"Saved {len(all_discussions)} discussions to Firestore.")
+
+                # Advance the crawl watermarks only now that the discussions are stored
+                with run_profile.stage("firestore_write"):
                     batch = self.db.batch()
-                    for disc in all_discussions:
-                        doc_ref = self.db.collection('discussions').document(disc['id'])
-                        batch.set(doc_ref, disc)
+                    for comp in competitions:
+                        if comp['id'] in self.crawl_states:
+                            self.crawl_states[comp['id']].add_to_batch(self.db, batch)
                     batch.commit()
-                    print(f"Saved {len(all_discussions)} discussions to Firestore.")
+                # Fallback watermark for competitions first seen in a later run
+                update_env_variable('LAST_SCRAPE_DATETIME', run_started_at)
             except Exception as e:
                 print(f"Error saving to Firestore: {e}")
                 # Save to backup JSON file just in case
@@ -229,48 +174,139 @@ class KaggleScraper:
                 with open(f'discussions_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json', 'w') as f:
                     json.dump(all_discussions, f)
             
-            await browser.close()
+            # Local archive for offline reprocessing, written whether or not Firestore took the data
+            try:
+                with run_profile.stage("archive_write"):
+                    self.archive.flush()
+                print(f"Archived this run's records in {len(self.archive.paths)} Parquet files.")
+            except Exception as e:
+                print(f"Error writing the corpus archive: {e}")
+            
+            if self.detail_fetcher:
+                await self.detail_fetcher.aclose()
+            await pool.close()
     
-    async def _fetch_competition_details(self, browser: Browser, url: str) -> Dict[str, Any]:
+    async def _list_active_competitions(self, pool: BrowserPool, max_pages: int) -> List[Dict[str, Any]]:
+        """Every competition on the active listing as {id, title, url, page_found}, in listing order"""
+        listed_competitions = []
+        
+        # Start with the first page of competitions
+        current_page = 1
+        has_next_page = True
+        
+        async with pool.page() as page:
+            capture = XhrCapture(page, COMPETITION_LIST_ENDPOINTS) if self.extraction_mode == "xhr" else None
+            while has_next_page and current_page <= max_pages:
+                # Navigate to the page with active competitions
+                page_url = f"https://www.kaggle.com/competitions?listOption=active&page={current_page}"
+                print(f"Fetching competition page {current_page}: {page_url}")
+                
+                if capture:
+                    capture.clear()
+                with run_profile.stage("navigation"):
+                    await page.goto(page_url)
+                    await page.wait_for_load_state('networkidle')
+                run_profile.count("listing_pages")
+                
+                competition_links = await list_competitions(page, capture, current_page)
+                print(f"Found {len(competition_links)} unique competition links on page {current_page}")
+                
+                if len(competition_links) == 0:
+                    # No more competitions to process
+                    has_next_page = False
+                    break
+                
+                for listed in competition_links:
+                    # Skip competitions already listed on an earlier page
+                    if any(known['id'] == listed['id'] for known in listed_competitions):
+                        continue
+                    listed_competitions.append({**listed, "page_found": current_page})
+                
+                next_page_button = await self._next_page_button(page)
+                if not next_page_button:
+                    has_next_page = False
+                    print("No more pages available")
+                else:
+                    print(f"Going to next page (page {current_page + 1})")
+                    current_page += 1
+                    # Click the next page button instead of constructing a new URL
+                    try:
+                        with run_profile.stage("navigation"):
+                            await next_page_button.click()
+                            # Wait for the page to load
+                            await page.wait_for_load_state('networkidle')
+                        with run_profile.stage("polite_delay"):
+                            await asyncio.sleep(random.randint(5, 10)) 
+                    except Exception as e:
+                        print(f"Error navigating to next page: {e}")
+                        # Fallback to direct URL navigation
+                        has_next_page = False
+        return listed_competitions
+    
+    def _build_competition(self, listed: Dict[str, Any], details: Dict[str, Any]) -> Dict[str, Any]:
+        """Competition document from its listing row and detail page"""
+        return {
+            "id": listed['id'],
+            "title": listed['title'],
+            "url": listed['url'],
+            "description": details['description'],
+            "evaluation": details['evaluation'],
+            "deadline": details.get('deadline', None),
+            "start_time": details.get('start_time', None),
+            "page_found": listed['page_found'],
+            "scraped_at": datetime.now(timezone.utc).isoformat(),
+            "updated": True
+        }
+    
+    async def _fetch_competition_details(self, pool: BrowserPool, url: str) -> Dict[str, Any]:
         """
         Fetch detailed information about a competition.
         
         Args:
-            browser: Playwright browser instance
+            pool: Browser pool to open the page from
             url: URL of the competition
             
         Returns:
             Dictionary containing competition details
         """
-        page = await browser.new_page()
-        await page.goto(url)
         details = {}
         
-        # Get Description    
-        await page.wait_for_load_state('networkidle')
-        
-        details['description'] = await self._get_competition_description(page)    
-        details['evaluation'] = await self._get_competition_evaluation(page)    
-        details['deadline'] = await self._get_competition_deadline(page)    
-        details['start_time'] = await self._get_competition_start_time(page)    
+        async with pool.page() as page:
+            # Get Description    
+            with run_profile.stage("navigation"):
+                await page.goto(url)
+                await page.wait_for_load_state('networkidle')
+            
+            details['raw_description'] = await self._get_competition_description(page)    
+            details['raw_evaluation'] = await self._get_competition_evaluation(page)    
+            details['deadline'] = await self._get_competition_deadline(page)    
+            details['start_time'] = await self._get_competition_start_time(page)    
         
-        await page.close()
+        # Use enhanced RAG normalization for descriptions and evaluation criteria;
+        # the raw text is kept for the corpus archive
+        with run_profile.stage("spacy_normalization"):
+            for field in ('description', 'evaluation'):
+                raw = details[f'raw_{field}']
+                details[field] = normalize_text_spacy(raw, for_rag=True) if raw else ""
         return details
     
     async def _get_competition_description(self, page) -> str:
-        """Extract competition description using JavaScript."""
+        """Extract the raw competition description using JavaScript."""
         # Load the JS file
         with open(self.js_file_path, 'r') as f:
             js_code = f.read()
         
         # Use the extractDescription function from the JS file
-        description = await page.evaluate(f"""() => {{
-            {js_code}
-            return extractDescription();
-        }}""")
+        with run_profile.stage("js_extraction"):
+            description = await page.evaluate(f"""() => {{
+                {js_code}
+                return extractDescription();
+            }}""")
         
-        # Use enhanced RAG normalization for competition descriptions
-        return normalize_text_spacy(description, for_rag=True) if description else ""
+        if not description:
+            return ""
+        run_profile.count("bytes_scraped", len(description.encode("utf-8")))
+        return description
     
     async def _get_competition_deadline(self, page) -> str:
         """Extract competition deadline using JavaScript."""
@@ -279,10 +315,11 @@ class KaggleScraper:
             js_code = f.read()
         
         # Use the extractDeadline function from the JS file
-        deadline_timestamp = await page.evaluate(f"""() => {{
-            {js_code}
-            return extractDeadline();
-        }}""")
+        with run_profile.stage("js_extraction"):
+            deadline_timestamp = await page.evaluate(f"""() => {{
+                {js_code}
+                return extractDeadline();
+            }}""")
         
         return str_to_utc_iso(deadline_timestamp) if deadline_timestamp else "Indefinite"
     
@@ -293,239 +330,335 @@ class KaggleScraper:
             js_code = f.read()
         
         # Use the extractDeadline function from the JS file
-        start_timestamp = await page.evaluate(f"""() => {{
-            {js_code}
-            return extractStartTime();
-        }}""")
+        with run_profile.stage("js_extraction"):
+            start_timestamp = await page.evaluate(f"""() => {{
+                {js_code}
+                return extractStartTime();
+            }}""")
         
         return str_to_utc_iso(start_timestamp) if start_timestamp else "Indefinite"
     
     async def _get_competition_evaluation(self, page) -> str:
-        """Extract competition evaluation criteria using JavaScript."""
+        """Extract the raw competition evaluation criteria using JavaScript."""
         # Load the JS file
         with open(self.js_file_path, 'r') as f:
             js_code = f.read()
         
         # Use the extractEvaluation function from the JS file
-        evaluation = await page.evaluate(f"""() => {{
-            {js_code}
-            return extractEvaluation();
-        }}""")
+        with run_profile.stage("js_extraction"):
+            evaluation = await page.evaluate(f"""() => {{
+                {js_code}
+                return extractEvaluation();
+            }}""")
         
-        # Use enhanced RAG normalization for evaluation criteria
-        return normalize_text_spacy(evaluation, for_rag=True) if evaluation else ""
+        if not evaluation:
+            return ""
+        run_profile.count("bytes_scraped", len(evaluation.encode("utf-8")))
+        return evaluation
     
-    async def _fetch_competition_discussions(self, browser: Browser, comp_id: str, comp_url: str, minvote=10, max_pages=20) -> List[Dict[str, Any]]:
+    async def _fetch_competition_discussions(self, pool: BrowserPool, comp_id: str, comp_url: str, minvote=10, max_pages=20) -> List[Dict[str, Any]]:
         """
-        Fetch popular discussions for a competition with pagination support.
+        Fetch new and re-voted popular discussions for a competition.
+        
+        Walks the newest discussions down to the competition's watermark, then
+        refreshes vote counts with a vote-sorted sweep when one is due.
         
         Args:
-            browser: Playwright browser instance
+            pool: Browser pool to open pages from
             comp_id: Competition ID
             comp_url: Competition URL
             minvote: Minimum number of votes for a discussion to be included
-            max_pages: Maximum number of pages to scrape
+            max_pages: Maximum number of pages to scrape per listing
             
         Returns:
             List of discussion data dictionaries
         """
         discussions = []
+        state = self.crawl_states.get(comp_id) or CrawlState(comp_id)
+        
+        watermark = state.discussions_watermark or self.last_scrape_datetime
+        newest, new_posts, complete = await self._crawl_discussion_listing(pool, comp_id, comp_url, "published", discussions, state, minvote, max_pages)
+        if state.vote_sweep_due():
+            run_profile.count("vote_sweeps", competition_id=comp_id)
+            _, vote_changes, _ = await self._crawl_discussion_listing(pool, comp_id, comp_url, "votes", discussions, state, minvote, max_pages)
+            state.record_vote_sweep(vote_changes)
+        
+        # Change rates drive the refresh scheduler; saved with the discussions,
+        # so the watermark only moves once they are stored
+        state.record_crawl(new_posts)
+        if complete or watermark is None:
+            state.advance(newest)
+        else:
+            # The walk stopped (error or page cap) above the watermark: posts on the pages it never
+            # reached are newer than the watermark, so the next run walks back to the same point
+            print(f"⚠️ Newest-first walk of {comp_id} stopped before the watermark; keeping it at {watermark}")
+            state.advance(watermark)
+        self.crawl_states[comp_id] = state
+        return discussions
+    
+    async def _crawl_discussion_listing(self, pool: BrowserPool, comp_id: str, comp_url: str, sort: str, discussions: List[Dict[str, Any]],
+                                        state: CrawlState, minvote: int, max_pages: int) -> Tuple[Optional[str], int, bool]:
+        """
+        Scrape discussions with minvote+ upvotes from one sort order of a competition's discussion list.
+        
+        "published" lists newest first and stops at the first post at or before the watermark;
+        "votes" lists most voted first and stops at the first post below minvote.
+        New or changed discussions are appended to discussions.
+        
+        Returns:
+            Newest post date seen (UTC ISO 8601) or None, the number of changes seen:
+            posts newer than the watermark ("published") or popular discussions with new votes ("votes"),
+            and whether the walk reached its stopping point or the end of the listing with every
+            selected discussion stored, rather than stopping early on an error, an empty later page
+            or the max_pages cap, or dropping a discussion whose detail fetch failed
+        """
+        newest = None
+        changes = 0
+        complete = False
+        detail_failed = False
         
         try:
             # Start with the first page of discussions
             current_page = 1
             has_next_page = True
-            total_items_with_enough_votes = 0
+            items_selected = 0
             
             # Navigate to the discussions tab
-            page = await browser.new_page()
+            async with pool.page() as page:
+                capture = XhrCapture(page, DISCUSSION_LIST_ENDPOINTS) if self.extraction_mode == "xhr" else None
             
-            while has_next_page and current_page <= max_pages:
-                # Construct the URL with page parameter
-                discussion_url = f"{comp_url}/discussion?sort=votes&page={current_page}"
-                print(f"Fetching discussion page {current_page} for {comp_id}: {discussion_url}")
+                while has_next_page and current_page <= max_pages:
+                    # Construct the URL with page parameter
+                    discussion_url = f"{comp_url}/discussion?sort={sort}&page={current_page}"
+                    print(f"Fetching discussion page {current_page} for {comp_id}: {discussion_url}")
                 
-                await page.goto(discussion_url)
-                await page.wait_for_load_state('networkidle')
+                    if capture:
+                        capture.clear()
+                    with run_profile.stage("navigation", comp_id):
+                        await page.goto(discussion_url)
+                        await page.wait_for_load_state('networkidle')
+                    run_profile.count("discussion_list_pages", competition_id=comp_id)
                   
-                # Wait for discussion list to load
-                specific_list_selector = "ul.MuiList-root.km-list.css-1uzmcsd"
-                try:
-                    await page.wait_for_selector(specific_list_selector, timeout=30000)
-                except Exception as e:
-                    print(f"No discussion list found on page {current_page} for {comp_id}: {e}")
-                    break
-                
-                # Wait for discussion items to load
-                try:
-                    await page.wait_for_selector("ul.MuiList-root.km-list.css-1uzmcsd li.MuiListItem-root", timeout=60000)
-                except Exception as e:
-                    print(f"No discussion items found on page {current_page} for {comp_id}: {e}")
-                    break
+                    discussion_rows = await list_discussions(page, capture, comp_id, current_page)
+                    print(f"Found {len(discussion_rows)} discussion items on page {current_page} for {comp_id}")
                 
-                # Get all discussion list items
-                discussion_items = await page.query_selector_all("li.MuiListItem-root.MuiListItem-gutters.MuiListItem-divider.sc-inRxyr")
-                print(f"Found {len(discussion_items)} discussion items on page {current_page} for {comp_id}")
+                    if len(discussion_rows) == 0:
+                        # An empty first page is an empty listing; a later one means the page or its
+                        # extraction failed, and the posts on it and beyond were never seen
+                        complete = current_page == 1
+                        break
                 
-                if len(discussion_items) == 0:
-                    # No discussions on this page, we've reached the end
-                    break
+                    # Pick the new and changed popular discussions on this page
+                    selected, reached_end, page_newest, page_changes = self._select_discussion_rows(
+                        discussion_rows, comp_id, sort, state, minvote, {disc['id'] for disc in discussions},
+                        first_page=current_page == 1,
+                    )
+                    changes += page_changes
+                    if page_newest and (newest is None or page_newest > newest):
+                        newest = page_newest
+                    items_selected += len(selected)
                 
-                # Process each discussion item on the current page
-                items_with_enough_votes = 0
-                for i, item in enumerate(discussion_items):
-                    disc_page = None  # Initialize disc_page outside the try block
-                    try:
-                        # Get the link to the discussion and extract disc_id
-                        link_elem = await item.query_selector("a[href*='/discussion/']")
-                        if link_elem:
-                            href = await link_elem.get_attribute('href')
-                            disc_url = f"https://www.kaggle.com{href}"
-                            disc_id = href.split('/')[-1] if href else "unknown"
-                        else:
-                            print(f"Could not find discussion link for item {i} on page {current_page}")
-                            continue
+                    # Process each selected discussion on the current page
+                    for i, row in enumerate(selected):
+                        try:
+                            print(f"Processing discussion: {row['title']} ({row['upvotes']} upvotes)")
+                            content_data = await self._fetch_discussion_content(pool, row['id'], row['url'], comp_id)
+                            discussion = self._build_discussion(row, comp_id, content_data, current_page)
+                            discussions.append(discussion)
+                            if self.archive:
+                                self.archive.add_discussion(discussion, content_data.get('content'))
 
-                        # Get the title
-                        title = "Unknown title"
-                        for selector in [".sc-dFaThA", ".sc-jPkiSJ", "h3"]:
-                            title_elem = await item.query_selector(selector)
-                            if title_elem:
-                                title_text = await title_elem.text_content()
-                                if title_text and title_text.strip():
-                                    title = title_text.strip()
-                                    break
+                            # Add a small delay between requests
+                            with run_profile.stage("polite_delay", comp_id):
+                                await asyncio.sleep(random.randint(5, 10)) 
+                        except Exception as e:
+                            print(f"Error processing discussion item {i} on page {current_page}: {e}")
+                            # Dropped: keep the watermark so the next walk lists it again
+                            detail_failed = True
+                
+                    if reached_end:
+                        complete = not detail_failed
+                        break
+                    
+                    next_page_button = await self._next_page_button(page)
+                    if not next_page_button:
+                        has_next_page = False
+                        complete = not detail_failed
+                        print(f"No more discussion pages available for {comp_id}")
+                    else:
+                        current_page += 1
+                        print(f"Going to next discussion page (page {current_page}) for {comp_id}")
+                    
+                        # Click the next page button instead of constructing a new URL
+                        try:
+                            with run_profile.stage("navigation", comp_id):
+                                await next_page_button.click()
+                                # Wait for the page to load
+                                await page.wait_for_load_state('networkidle')
+                            with run_profile.stage("polite_delay", comp_id):
+                                await asyncio.sleep(random.randint(5, 10)) 
+                        except Exception as e:
+                            print(f"Error navigating to next discussion page: {e}")
+                            has_next_page = False
+            
+            print(f"New or changed discussions with {minvote}+ upvotes in the {sort} listing of {comp_id}: {items_selected}")
+            
+        except Exception as e:
+            print(f"Error fetching discussions for {comp_id}: {e}")
+            import traceback
+            traceback.print_exc()
+            
+        return newest, changes, complete
 
-                        # Get upvote count to filter by popularity
-                        upvote_span = await item.query_selector("span[aria-live='polite']")
-                        upvotes_text = await upvote_span.text_content() if upvote_span else "0"
-                        upvotes = int(re.search(r"(\d+)", upvotes_text).group(1)) if re.search(r"(\d+)", upvotes_text) else 0
+    async def _next_page_button(self, page):
+        """The enabled "next page" pagination button of a listing, or None on the last page"""
+        # Check for next page button using the specific Kaggle selector
+        next_page_button = await page.query_selector("button[aria-label='Go to next page']")
+        if not next_page_button:
+            # Try alternative selector
+            next_page_button = await page.query_selector("button.MuiPaginationItem-previousNext[aria-label*='next']")
+        if not next_page_button:
+            return None
+        
+        # Check if the button is not disabled
+        is_disabled = await next_page_button.get_attribute("disabled")
+        is_disabled_class = await next_page_button.get_attribute("class")
+        is_disabled_by_class = "Mui-disabled" in is_disabled_class if is_disabled_class else True
+        if is_disabled == "true" or is_disabled_by_class:
+            return None
+        return next_page_button
 
-                        # Only process discussions with enough upvotes
-                        if upvotes >= minvote:
-                            # Check if discussion exists and upvotes/title are unchanged
-                            existing = self.existing_discussions.get(disc_id)
-                            if existing and existing.get("upvotes") == upvotes and existing.get("title") == title:
-                                print(f"Skipping unchanged discussion: {disc_id} (upvotes: {upvotes})")
-                                continue
+    def _select_discussion_rows(self, rows: List[Dict[str, Any]], comp_id: str, sort: str, state: CrawlState, minvote: int,
+                                known_ids: set, first_page: bool = False) -> Tuple[List[Dict[str, Any]], bool, Optional[str], int]:
+        """
+        Pick the rows of one listing page whose discussion needs scraping.
 
-                            items_with_enough_votes += 1
-                            total_items_with_enough_votes += 1
+        Pinned topics head the first page of the newest-first listing whatever their date,
+        so they never end the walk. DOM rows only know a topic is pinned when a pin marker
+        was found; up to MAX_UNFLAGGED_PINNED old rows before the first new one are passed
+        over as possibly pinned instead of ending the walk there.
+        
+        Returns:
+            Selected rows, whether the listing ends on this page (watermark or minvote reached),
+            the newest post date seen (UTC ISO 8601) or None, and the number of changes seen
+        """
+        selected = []
+        newest = None
+        changes = 0
+        # Still ahead of the first new row at the top of the listing, and old unflagged rows passed over
+        leading = first_page
+        passed_over = 0
+        for row in rows:
+            disc_id = row['id']
+            upvotes = row['upvotes']
+            posted_at = str_to_utc_iso(row['posted_at']) if row.get('posted_at') else None
+            if posted_at and posted_at.startswith("Error"):
+                posted_at = None
 
-                            # Check if we already have this discussion in our list
-                            if any(disc['id'] == disc_id for disc in discussions):
-                                print(f"Skipping duplicate discussion: {disc_id}")
-                                continue
+            # Pinned posts head the newest-first list whatever their date
+            if sort == "published" and posted_at and not row.get('pinned'):
+                if not state.is_new(posted_at, self.last_scrape_datetime):
+                    if leading and row.get('pinned') is None and passed_over < MAX_UNFLAGGED_PINNED:
+                        print(f"Passing over old discussion {disc_id} ({posted_at}) at the top of {comp_id}: may be pinned")
+                        passed_over += 1
+                    else:
+                        print(f"Reached the watermark of {comp_id} at discussion {disc_id} ({posted_at})")
+                        return selected, True, newest, changes
+                else:
+                    leading = False
+                    changes += 1
+                    if newest is None or posted_at > newest:
+                        newest = posted_at
 
-                            # Get author
-                            author_elem = await item.query_selector("a[emphasis]")
-                            author = await author_elem.text_content() if author_elem else "Unknown author"
+            # Only process discussions with enough upvotes
+            if upvotes < minvote:
+                if sort == "votes":
+                    # Sorted by votes: everything after this is below minvote too
+                    return selected, True, newest, changes
+                continue
 
-                            print(f"Processing discussion: {title} ({upvotes} upvotes)")
+            # Check if discussion exists and upvotes/title are unchanged
+            existing = self.existing_discussions.get(disc_id)
+            if existing and existing.get("upvotes") == upvotes and existing.get("title") == row['title']:
+                print(f"Skipping unchanged discussion: {disc_id} (upvotes: {upvotes})")
+                run_profile.count("discussions_unchanged", competition_id=comp_id)
+                continue
 
-                            # Now visit the discussion page to get its content
-                            disc_page = await browser.new_page()
-                            await disc_page.goto(disc_url)
-                            await disc_page.wait_for_load_state('networkidle')
+            # Check if we already have this discussion in our list
+            if disc_id in known_ids or any(picked['id'] == disc_id for picked in selected):
+                print(f"Skipping duplicate discussion: {disc_id}")
+                continue
+            if sort == "votes":
+                changes += 1
+            selected.append(row)
+        return selected, False, newest, changes
 
-                            # Get the discussion content using JavaScript
-                            with open(self.js_file_path, 'r') as f:
-                                js_code = f.read()
+    def _build_discussion(self, row: Dict[str, Any], comp_id: str, content_data: Dict[str, Any], page_found: int) -> Dict[str, Any]:
+        """Discussion document from its listing row and the extracted page content"""
+        # Check for errors in extraction
+        if content_data.get('error'):
+            print(f"Error extracting discussion content: {content_data['error']}")
+            content = ""
+        else:
+            raw_content = content_data.get('content') or ""
+            run_profile.count("bytes_scraped", len(raw_content.encode("utf-8")), competition_id=comp_id)
+            # Process the content text with enhanced RAG normalization
+            with run_profile.stage("spacy_normalization", comp_id):
+                content = normalize_text_spacy(raw_content, for_rag=True) if raw_content else ""
 
-                            content_data = await disc_page.evaluate(f"""() => {{
-                                {js_code}
-                                return extractDiscussionContent();
-                            }}""")
+        competition_rank = content_data.get('competitionRank')
+        if competition_rank:
+            # Extract just the number from strings like "2nd", "3rd", "1357th"
+            rank_match = re.match(r'(\d+)', competition_rank)
+            if rank_match:
+                competition_rank = int(rank_match.group(1))
 
-                            # Check for errors in extraction
-                            if content_data.get('error'):
-                                print(f"Error extracting discussion content: {content_data['error']}")
-                                content = ""
-                            else:
-                                # Process the content text with enhanced RAG normalization
-                                content = normalize_text_spacy(content_data.get('content', ""), for_rag=True) if content_data.get('content') else ""
+        # Add all the extracted info to the discussion data
+        return {
+            "id": row['id'],
+            "competition_id": comp_id,
+            "title": row['title'],
+            "url": row['url'],
+            "author": row['author'].strip(),
+            "content": content,
+            "upvotes": row['upvotes'],
+            "post_date": str_to_utc_iso(content_data.get('posted_datetime') or row.get('posted_at')),
+            "author_competition_rank": competition_rank,
+            "author_kaggle_rank": content_data.get('kaggleRank'),
+            "medal_type": content_data.get('medalType'),
+            "page_found": page_found,
+            "scraped_at": datetime.now(timezone.utc).isoformat(),
+            "updated": True
+        }
 
-                            competition_rank = content_data.get('competitionRank')
-                            if competition_rank:
-                                # Extract just the number from strings like "2nd", "3rd", "1357th"
-                                rank_match = re.match(r'(\d+)', competition_rank)
-                                if rank_match:
-                                    competition_rank = int(rank_match.group(1))
+    async def _fetch_discussion_content(self, pool: BrowserPool, disc_id: str, disc_url: str, comp_id: str) -> Dict[str, Any]:
+        """extractDiscussionContent() fields: over HTTP when enabled, from a browser page otherwise or on failure"""
+        if self.detail_fetcher:
+            with run_profile.stage("http_fetch", comp_id):
+                content_data = await self.detail_fetcher.fetch(disc_id, disc_url)
+            if content_data:
+                run_profile.count("http_details", competition_id=comp_id)
+                return content_data
+            print(f"Falling back to the browser for discussion {disc_id}")
+            run_profile.count("http_detail_fallbacks", competition_id=comp_id)
 
-                            # Add all the extracted info to the discussion data
-                            discussion_data = {
-                                "id": disc_id,
-                                "competition_id": comp_id,
-                                "title": title,
-                                "url": disc_url,
-                                "author": author.strip(),
-                                "content": content,
-                                "upvotes": upvotes,
-                                "post_date": str_to_utc_iso(content_data.get('posted_datetime')),
-                                "author_competition_rank": competition_rank,
-                                "author_kaggle_rank": content_data.get('kaggleRank'),
-                                "medal_type": content_data.get('medalType'),
-                                "page_found": current_page,
-                                "scraped_at": datetime.now(timezone.utc).isoformat(),
-                                "updated": True
-                            }
+        # Visit the discussion page to get its content
+        async with pool.page() as disc_page:
+            with run_profile.stage("navigation", comp_id):
+                await disc_page.goto(disc_url)
+                await disc_page.wait_for_load_state('networkidle')
 
-                            discussions.append(discussion_data)
+            # Get the discussion content using JavaScript
+            with open(self.js_file_path, 'r') as f:
+                js_code = f.read()
 
-                            # Add a small delay between requests
-                            await asyncio.sleep(random.randint(5, 10)) 
-                    except Exception as e:
-                        print(f"Error processing discussion item {i} on page {current_page}: {e}")
-                    finally:
-                        if disc_page:  # Only close if disc_page was created
-                            await disc_page.close()
-                
-                print(f"Found {items_with_enough_votes} discussions with {minvote}+ upvotes on page {current_page}")
-                
-                # If we didn't find any discussions with enough votes on this page,
-                # and we're past the first page, we might want to stop
-                if items_with_enough_votes == 0 and current_page > 1:
-                    print(f"No discussions with enough votes on page {current_page}. Stopping pagination.")
-                    break
-                    
-                # Check for next page button
-                next_page_button = await page.query_selector("button[aria-label='Go to next page']")
-                if not next_page_button:
-                    next_page_button = await page.query_selector("button.MuiPaginationItem-previousNext[aria-label*='next']")
-                
-                # Check if the button exists and is not disabled
-                is_disabled = await next_page_button.get_attribute("disabled") if next_page_button else "true"
-                is_disabled_class = await next_page_button.get_attribute("class") if next_page_button else ""
-                is_disabled_by_class = "Mui-disabled" in is_disabled_class if is_disabled_class else True
-                
-                if is_disabled == "true" or is_disabled_by_class or not next_page_button:
-                    has_next_page = False
-                    print(f"No more discussion pages available for {comp_id}")
-                else:
-                    current_page += 1
-                    print(f"Going to next discussion page (page {current_page}) for {comp_id}")
-                    
-                    # Click the next page button instead of constructing a new URL
-                    try:
-                        await next_page_button.click()
-                        # Wait for the page to load
-                        await page.wait_for_load_state('networkidle')
-                        await asyncio.sleep(random.randint(5, 10)) 
-                    except Exception as e:
-                        print(f"Error navigating to next discussion page: {e}")
-                        has_next_page = False
-            
-            print(f"Total discussions with {minvote}+ upvotes found for {comp_id}: {total_items_with_enough_votes}")
-            
-        except Exception as e:
-            print(f"Error fetching discussions for {comp_id}: {e}")
-            import traceback
-            traceback.print_exc()
-        
-        finally:
-            await page.close()
-            
-        return discussions
+            with run_profile.stage("js_extraction", comp_id):
+                content_data = await disc_page.evaluate(f"""() => {{
+                    {js_code}
+                    return extractDiscussionContent();
+                }}""")
+            run_profile.count("browser_details", competition_id=comp_id)
+            return content_data
     
 
     def get_existing_competitions(self):
@@ -549,7 +682,8 @@ if __name__ == "__main__":
     # Step 1: Run scraper
     print("\n📊 Step 1: Scraping Kaggle competitions and discussions...")
     scraper = KaggleScraper()
-    asyncio.run(scraper.fetch_competitions(max_pages=5))
+    with run_profile.stage("scrape_total"):
+        asyncio.run(scraper.fetch_competitions(max_pages=5))
     
     scrape_time = time.time()
     scrape_minutes = (scrape_time - start_time) / 60
@@ -557,6 +691,7 @@ if __name__ == "__main__":
     
     # Step 2: Sync to Pinecone
     print("\n🌲 Step 2: Syncing new data to Pinecone...")
+    run_status = "ok"
     try:
         from pinecone_sync_service import PineconeSyncService
         
@@ -564,21 +699,23 @@ if __name__ == "__main__":
         
         # Print stats before sync
         stats = sync_service.get_stats()
-        print(f"📊 Before sync: {stats['pinecone']['total_vectors']} vectors in Pinecone")
+        print(f"📊 Before sync: {stats['pinecone']['live_vectors']} vectors in the live Pinecone target")
         print(f"📋 Pending: {stats['firestore_pending']['discussions']} discussions, {stats['firestore_pending']['competitions']} competitions")
         
         # Run sync
-        sync_service.sync_all_updated()
+        with run_profile.stage("sync_total"):
+            sync_service.sync_all_updated()
         
         # Print stats after sync
         stats = sync_service.get_stats()
-        print(f"📊 After sync: {stats['pinecone']['total_vectors']} vectors in Pinecone")
+        print(f"📊 After sync: {stats['pinecone']['live_vectors']} vectors in the live Pinecone target")
         
         sync_time = time.time()
         sync_minutes = (sync_time - scrape_time) / 60
         print(f"✅ Pinecone sync completed in {sync_minutes:.2f} minutes")
         
     except Exception as e:
+        run_status = "sync_failed"
         print(f"❌ Pinecone sync failed: {str(e)}")
         print("🔄 Scraping was successful, but sync failed. Manual sync may be needed.")
     
@@ -586,4 +723,5 @@ if __name__ == "__main__":
     end_time = time.time()
     total_minutes = (end_time - start_time) / 60
     print(f"\n🎉 Pipeline completed! Total runtime: {total_minutes:.2f} minutes")
+    run_profile.write_report(run_status)
     print("✅ Ready for next scheduled run in 4 hours")
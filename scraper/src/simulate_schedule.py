@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Replay a change log through the refresh scheduler and compare it with crawling
+every active competition on every run.
+
+A run happens every RUN_INTERVAL_HOURS. A crawl picks up every post made
+before it and, when its vote sweep is due, every vote change. Reports page
+loads (listing pages, competition pages and discussion list pages, which are
+the cost the scheduler saves) and freshness (hours from a change to the crawl
+that picked it up):
+
+    python simulate_schedule.py --input change_log.json
+    python simulate_schedule.py --discussions discussions_backup_20250101_000000.json
+    python simulate_schedule.py --firestore
+    python simulate_schedule.py --synthetic 40
+
+A change log is {"competitions": {id: {"deadline": iso}}, "events": [{"competition_id", "time", "kind"}]}
+with kind "post" or "vote". Discussion dumps and Firestore only give post events.
+"""
+import argparse
+import json
+import math
+import random
+import statistics
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from crawl_state import CrawlState, parse_datetime
+from refresh_scheduler import RUN_INTERVAL_HOURS, RefreshScheduler
+
+# Rows per Kaggle listing page
+LISTING_PAGE_SIZE = 20
+
+
+def load_change_log(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def change_log_from_discussions(discussions: List[Dict], competitions: List[Dict] = ()) -> Dict:
+    """Post events from scraped discussions; deadlines from scraped competitions when given"""
+    events = [
+        {"competition_id": disc["competition_id"], "time": disc["post_date"], "kind": "post"}
+        for disc in discussions
+        if disc.get("competition_id") and parse_datetime(disc.get("post_date"))
+    ]
+    return {
+        "competitions": {comp["id"]: {"deadline": comp.get("deadline")} for comp in competitions},
+        "events": events,
+    }
+
+
+def synthetic_change_log(competitions: int, days: int, seed: int = 0) -> Dict:
+    """Competitions with log-uniform activity, busier towards their deadline"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    log = {"competitions": {}, "events": []}
+    for n in range(competitions):
+        comp_id = f"competition-{n:03d}"
+        deadline = start + timedelta(days=rng.uniform(days * 0.3, days * 2))
+        log["competitions"][comp_id] = {"deadline": deadline.isoformat()}
+        posts_per_day = 10 ** rng.uniform(-1.5, 1)
+        hour = start
+        while hour < min(deadline, start + timedelta(days=days)):
+            days_left = (deadline - hour).total_seconds() / 86400
+            rate = posts_per_day / 24 * (1 + 3 * math.exp(-days_left / 7))
+            for kind, kind_rate in (("post", rate), ("vote", rate * 2)):
+                if rng.random() < kind_rate:
+                    log["events"].append({"competition_id": comp_id, "time": hour.isoformat(), "kind": kind})
+            hour += timedelta(hours=1)
+    return log
+
+
+def simulate(log: Dict, policy: str) -> Dict:
+    events = sorted(
+        ({**event, "at": parse_datetime(event["time"])} for event in log["events"]),
+        key=lambda event: event["at"],
+    )
+    by_competition = defaultdict(list)
+    for event in events:
+        by_competition[event["competition_id"]].append(event)
+    deadlines = {comp_id: parse_datetime(info.get("deadline")) for comp_id, info in log.get("competitions", {}).items()}
+    # A competition is listed from its first change until its deadline
+    listed_from = {comp_id: changes[0]["at"] for comp_id, changes in by_competition.items()}
+
+    states: Dict[str, CrawlState] = {}
+    scheduler = RefreshScheduler(states, max_competitions=0)
+    seen = defaultdict(int)  # competition -> changes picked up so far, per kind
+    lags = {"post": [], "vote": []}
+    page_loads = crawls = runs = 0
+
+    now = events[0]["at"].replace(minute=0, second=0, microsecond=0)
+    end = events[-1]["at"] + timedelta(hours=RUN_INTERVAL_HOURS)
+    while now <= end:
+        runs += 1
+        active = [
+            {"id": comp_id} for comp_id, start in listed_from.items()
+            if start <= now and (deadlines.get(comp_id) is None or deadlines[comp_id] > now)
+        ]
+        page_loads += max(1, math.ceil(len(active) / LISTING_PAGE_SIZE))
+        planned = active if policy == "fixed" else scheduler.plan(active, now)
+
+        for row in planned:
+            comp_id = row["id"]
+            state = states.setdefault(comp_id, CrawlState(comp_id))
+            if deadlines.get(comp_id):
+                state.deadline = deadlines[comp_id].isoformat()
+            sweep = state.vote_sweep_due(now)
+
+            picked = {"post": 0, "vote": 0}
+            for kind in (("post", "vote") if sweep else ("post",)):
+                pending = [event for event in by_competition[comp_id] if event["kind"] == kind and event["at"] <= now]
+                for event in pending[seen[comp_id, kind]:]:
+                    lags[kind].append((now - event["at"]).total_seconds() / 3600)
+                picked[kind] = len(pending) - seen[comp_id, kind]
+                seen[comp_id, kind] = len(pending)
+
+            # Competition page, newest-first discussion pages, and the vote-sorted page when sweeping
+            page_loads += 1 + max(1, math.ceil(picked["post"] / LISTING_PAGE_SIZE)) + (1 if sweep else 0)
+            crawls += 1
+            state.record_crawl(picked["post"], now=now)
+            if sweep:
+                state.record_vote_sweep(picked["vote"], now=now)
+        now += timedelta(hours=RUN_INTERVAL_HOURS)
+
+    missed = len(events) - len(lags["post"]) - len(lags["vote"])
+    return {
+        "runs": runs,
+        "crawls": crawls,
+        "page_loads": page_loads,
+        "post_lag_hours": _summary(lags["post"]),
+        "vote_lag_hours": _summary(lags["vote"]),
+        "changes_missed": missed,
+    }
+
+
+def _summary(lags: List[float]) -> Dict:
+    if not lags:
+        return {}
+    lags = sorted(lags)
+    return {
+        "mean": round(statistics.fmean(lags), 2),
+        "p50": round(lags[len(lags) // 2], 2),
+        "p95": round(lags[int(len(lags) * 0.95)], 2),
+        "within_24h": round(sum(lag <= 24 for lag in lags) / len(lags), 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Change log JSON")
+    source.add_argument("--discussions", help="JSON list of discussions (e.g. a discussions_backup_*.json dump)")
+    source.add_argument("--firestore", action="store_true", help="Read discussions and competitions from Firestore")
+    source.add_argument("--synthetic", type=int, metavar="COMPETITIONS", help="Generate a change log")
+    parser.add_argument("--days", type=int, default=60, help="Length of a synthetic change log")
+    parser.add_argument("--competitions", help="JSON list of competitions, for deadlines with --discussions")
+    args = parser.parse_args()
+
+    if args.input:
+        log = load_change_log(args.input)
+    elif args.discussions:
+        with open(args.discussions) as f:
+            discussions = json.load(f)
+        competitions = []
+        if args.competitions:
+            with open(args.competitions) as f:
+                competitions = json.load(f)
+        log = change_log_from_discussions(discussions, competitions)
+    elif args.firestore:
+        from google.cloud import firestore
+        db = firestore.Client()
+        log = change_log_from_discussions(
+            [doc.to_dict() for doc in db.collection('discussions').stream()],
+            [{**doc.to_dict(), "id": doc.id} for doc in db.collection('competitions').stream()],
+        )
+    else:
+        log = synthetic_change_log(args.synthetic, args.days)
+    print(f"🔁 Replaying {len(log['events'])} changes across {len({e['competition_id'] for e in log['events']})} competitions")
+
+    fixed, adaptive = simulate(log, "fixed"), simulate(log, "adaptive")
+    print(json.dumps({
+        "fixed": fixed,
+        "adaptive": adaptive,
+        "page_load_ratio": round(adaptive["page_loads"] / fixed["page_loads"], 3),
+    }, indent=2))